@@ -24,6 +24,23 @@ Attributes:
     DanaRetriever (class): A class for querying dana-8 group and subgroup data. 
     StrunzRetriever (class): A class for querying different types of nickel-strunz-10 data.
     PhotoCountRetriever(class): A class to facilitate the retrieval of photo count data from the Mindat API.
+    GeoRegionIndex (class): An in-process spatial index for point-in-region lookups over georegions.
+    LocalityIndex (class): An in-process grid index for bounding-box, radius and nearest-neighbour queries over localities.
+    GeohashPartitions (class): Reads a geohash-partitioned locality export, opening only the partitions a viewport overlaps.
+    ReferenceRegistry (class): Cached locality_type, locality_status, locality_age and countries tables for id lookups.
+    Enricher (class): Joins locality records with their reference records one record at a time.
+    ClassificationTree (class): The Nickel-Strunz 10 or Dana 8 classification with parent/child links and code lookups.
+    GeomaterialGraph (class): Synonym, variety, polytype and group relations between geomaterials for local lookups.
+    GeomaterialSearchIndex (class): Offline full-text search over geomaterials with prefix, fuzzy and BM25 ranking.
+    FormulaIndex (class): Parsed geomaterial formulas for local element and stoichiometry ratio queries.
+    QueryCache (class): Opt-in, memory-bounded LRU cache of get_dict() results with per-endpoint TTLs.
+    FrozenQuery (class): An immutable, hashable query over any retriever that can be shared between threads.
+    BatchExecutor (class): Runs many queries on a bounded worker pool with a shared rate limit, streaming each to its own sink.
+    RateLimiter (class): A thread-safe token bucket limiting the requests per second of the process.
+    RequestScheduler (class): A rate limiter that serves interactive requests before bulk page fetches.
+    CredentialPool (class): Several API keys shared by one process, balanced by quota with per-key throttling.
+    KeyProvider (class): Finds the API key without prompting: argument, environment, key file or callback.
+    PagePipeline (class): Downloads pages in an I/O thread and transforms them in a pool of worker processes.
     
 
 Todo:
@@ -55,30 +72,78 @@ Examples:
         
 Press q to quit.
 """
-from .mindat_api import MindatApi, MindatApiKeyManeger
-from .minerals_ima import MineralsIMARetriever
-from .minerals_ima import MineralsIdRetriever
-from .geomaterials_search import GeomaterialSearchRetriever
-from .geomaterials import GeomaterialRetriever
-from .geomaterials import GeomaterialIdRetriever
-from .geomaterials import GeomaterialDictRetriever
-from .localities import LocalitiesRetriever
-from .localities import LocalitiesIdRetriever
-from .localities_age import LocalitiesAgeRetriever
-from .localities_age import LocalitiesAgeIdRetriever
-from .localities_status import LocalitiesStatusRetriever
-from .localities_status import LocalitiesStatusIdRetriever
-from .localities_type import LocalitiesTypeRetriever
-from .localities_type import LocalitiesTypeIdRetriever
-from .locgeoregion2 import GeoRegionRetriever
-from .locobject import LocobjectRetriever
-from .countries import CountriesListRetriever
-from .countries import CountriesIdRetriever
-from .dana8 import DanaRetriever
-from .nickel_strunz import StrunzRetriever
-from .photo_count import PhotoCountRetriever
+import importlib
+
+# The public classes are imported on first access so that `import openmindat`
+# stays cheap for short-lived scripts that only touch one or two endpoints.
+_LAZY_ATTRS = {
+    'MindatApi': 'mindat_api',
+    'MindatApiKeyManeger': 'mindat_api',
+    'MineralsIMARetriever': 'minerals_ima',
+    'MineralsIdRetriever': 'minerals_ima',
+    'GeomaterialSearchRetriever': 'geomaterials_search',
+    'GeomaterialRetriever': 'geomaterials',
+    'GeomaterialIdRetriever': 'geomaterials',
+    'GeomaterialDictRetriever': 'geomaterials',
+    'LocalitiesRetriever': 'localities',
+    'LocalitiesIdRetriever': 'localities',
+    'LocalitiesAgeRetriever': 'localities_age',
+    'LocalitiesAgeIdRetriever': 'localities_age',
+    'LocalitiesStatusRetriever': 'localities_status',
+    'LocalitiesStatusIdRetriever': 'localities_status',
+    'LocalitiesTypeRetriever': 'localities_type',
+    'LocalitiesTypeIdRetriever': 'localities_type',
+    'GeoRegionRetriever': 'locgeoregion2',
+    'LocobjectRetriever': 'locobject',
+    'CountriesListRetriever': 'countries',
+    'CountriesIdRetriever': 'countries',
+    'DanaRetriever': 'dana8',
+    'StrunzRetriever': 'nickel_strunz',
+    'PhotoCountRetriever': 'photo_count',
+    'GeoRegionIndex': 'spatial',
+    'LocalityIndex': 'spatial',
+    'GeohashPartitions': 'partitions',
+    'ReferenceRegistry': 'reference',
+    'Enricher': 'reference',
+    'ClassificationTree': 'classification',
+    'GeomaterialGraph': 'relations',
+    'GeomaterialSearchIndex': 'search',
+    'FormulaIndex': 'chemistry',
+    'QueryCache': 'result_cache',
+    'FrozenQuery': 'query',
+    'BatchExecutor': 'batch',
+    'RateLimiter': 'ratelimit',
+    'RequestScheduler': 'ratelimit',
+    'CredentialPool': 'credentials',
+    'KeyProvider': 'credentials',
+    'PagePipeline': 'pipeline',
+}
+
+__all__ = list(_LAZY_ATTRS)
+
+
+def __getattr__(name):
+    '''
+    Imports the module defining a public class the first time the class is accessed.
+    '''
+    try:
+        module_name = _LAZY_ATTRS[name]
+    except KeyError:
+        raise AttributeError(f"module '{__name__}' has no attribute '{name}'") from None
+
+    value = getattr(importlib.import_module('.' + module_name, __name__), name)
+    # cache on the package so later lookups skip __getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
+
 
 if __name__ == "__main__":
+    from openmindat import MineralsIMARetriever, GeomaterialSearchRetriever, GeomaterialRetriever
+
     # --------------------------------------------
     # Use case 1: Search for a geomaterial by name
     
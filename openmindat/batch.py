@@ -0,0 +1,230 @@
+import os
+import json
+import time
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from . import mindat_api
+from . import progress
+from . import ratelimit
+from . import tracing
+from .query import FrozenQuery
+
+
+def _end_point(RETRIEVER):
+    # id and sub-table retrievers keep the variable part of the path in sub_endpoint
+    sub_endpoint = getattr(RETRIEVER, 'sub_endpoint', '')
+    if sub_endpoint:
+        return '/'.join([RETRIEVER.end_point, str(sub_endpoint)])
+    return RETRIEVER.end_point
+
+
+def _records(PAGE):
+    # locgeoregion2 pages are feature collections, single-object endpoints return a dict
+    if isinstance(PAGE, list):
+        return PAGE
+    if isinstance(PAGE, dict) and 'features' in PAGE:
+        return PAGE['features']
+    return [PAGE]
+
+
+class _ListSink:
+    def __init__(self):
+        self.records = []
+
+    def write(self, RECORDS):
+        self.records.extend(RECORDS)
+
+    def close(self, OK):
+        pass
+
+
+class _CallableSink:
+    def __init__(self, CALLBACK):
+        self.callback = CALLBACK
+
+    def write(self, RECORDS):
+        self.callback(RECORDS)
+
+    def close(self, OK):
+        pass
+
+
+class _WriterSink:
+    # objects with write_records(), e.g. a GeohashPartitionWriter or a GeoJSONWriter
+    def __init__(self, WRITER):
+        self.writer = WRITER
+
+    def write(self, RECORDS):
+        self.writer.write_records(RECORDS)
+
+    def close(self, OK):
+        pass
+
+
+class _FileSink:
+    # JSON lines, written under a temporary name and moved into place only when the query succeeded
+    def __init__(self, PATH):
+        self.path = Path(PATH)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.part_path = self.path.with_name(self.path.name + '.part')
+        self.file = open(self.part_path, 'w')
+
+    def write(self, RECORDS):
+        self.file.write(''.join(json.dumps(record, separators=(',', ':')) + '\n' for record in RECORDS))
+
+    def close(self, OK):
+        self.file.close()
+        if OK:
+            os.replace(self.part_path, self.path)
+        else:
+            self.part_path.unlink()
+
+
+def _open_sink(SINK):
+    if SINK is None:
+        return _ListSink()
+    if isinstance(SINK, (str, Path)):
+        return _FileSink(SINK)
+    if hasattr(SINK, 'write_records'):
+        return _WriterSink(SINK)
+    if callable(SINK):
+        return _CallableSink(SINK)
+    raise TypeError(f"Invalid SINK: {SINK!r}\nUse None, a file path, a callable taking a list of records or an object with write_records().")
+
+
+class BatchExecutor:
+    """
+    Runs many retriever queries, across any endpoints, on a bounded pool of worker threads. Every request
+    of the batch shares one rate limit and the pooled connections of mindat_api.get_session(). The pages
+    of each query are streamed to that query's own sink as they arrive, and run() returns a summary with
+    the rows, pages, time and error of every query. A failed query does not stop the others.
+
+    A sink is one of:
+        None: the records are kept and returned in the query's summary entry under 'records'.
+        str or Path: a JSON lines file, written under a temporary name and moved into place on success.
+        an object with write_records(RECORDS), e.g. a GeohashPartitionWriter.
+        a callable, called with the list of records of every page (from a worker thread).
+
+    Args:
+        WORKERS (int): Number of queries run at the same time.
+        RATE_LIMIT (float): Requests per second for the whole batch, None for no limit. It only applies to
+            the batch's own requests, which also still wait on the process-wide limiter, if one is set.
+        BURST (int): Requests that may be sent at once under the rate limit.
+        VERBOSE (int): 0 for no output, otherwise a progress bar over the queries.
+        PRIORITY (str): Priority class of the batch's requests under a ratelimit.RequestScheduler;
+            'bulk' by default, so interactive lookups of the same process go first.
+
+    Usage:
+        >>> batch = BatchExecutor(WORKERS=8, RATE_LIMIT=10)
+        >>> for element in ['Cu', 'Zn', 'Pb']:
+        ...     batch.add(GeomaterialRetriever().elements_inc(element), SINK=f"./mindat_data/{element}.jsonl", NAME=element)
+        >>> summary = batch.run()
+        >>> summary['failed']
+        0
+
+    Press q to quit.
+    """
+
+    def __init__(self, WORKERS = 8, RATE_LIMIT = None, BURST = None, VERBOSE = 1, PRIORITY = 'bulk'):
+        if not isinstance(WORKERS, int) or WORKERS < 1:
+            raise ValueError(f"Invalid WORKERS: {WORKERS}\nPlease retry.")
+        if PRIORITY not in ratelimit.PRIORITIES:
+            raise ValueError(f"Invalid PRIORITY: {PRIORITY}\nPossible options: {ratelimit.PRIORITIES}")
+        self.priority = PRIORITY
+        self.workers = WORKERS
+        self.rate_limiter = ratelimit.RateLimiter(RATE_LIMIT, BURST) if RATE_LIMIT is not None else None
+        self.verbose = VERBOSE
+        self._queries = []
+
+    def add(self, QUERY, SINK = None, NAME = None):
+        '''
+        Adds a query to the batch. A retriever's filters are frozen when it is added, so the retriever
+        can be reused or changed afterwards.
+
+        Args:
+            QUERY (FrozenQuery or retriever): The configured query, e.g. GeomaterialRetriever().ima(True).
+            SINK: Where the records go, see the class docstring.
+            NAME (str): Name of the query in the summary, defaults to its position in the batch.
+        '''
+        query = QUERY if isinstance(QUERY, FrozenQuery) else FrozenQuery(QUERY)
+        name = NAME if NAME is not None else str(len(self._queries))
+        if any(name == entry[0] for entry in self._queries):
+            raise ValueError(f"Duplicate query NAME: {name}")
+        self._queries.append((name, query, SINK))
+        return self
+
+    def extend(self, QUERIES):
+        '''
+        Adds several queries: a dict of NAME -> query, or a list of queries or (query, sink) pairs.
+        '''
+        items = QUERIES.items() if isinstance(QUERIES, dict) else enumerate(QUERIES)
+        for name, item in items:
+            query, sink = item if isinstance(item, tuple) else (item, None)
+            self.add(query, sink, str(name) if isinstance(QUERIES, dict) else None)
+        return self
+
+    def __len__(self):
+        return len(self._queries)
+
+    def _execute(self, NAME, QUERY, SINK):
+        entry = {'name': NAME, 'end_point': None, 'rows': 0, 'pages': 0, 'seconds': 0.0, 'error': None}
+        started = time.perf_counter()
+        with tracing.start_span('BatchExecutor.query', name=NAME) as span, ratelimit.priority(self.priority):
+            sink = None
+            ok = False
+            try:
+                retriever = QUERY.thaw()
+                end_point = _end_point(retriever)
+                entry['end_point'] = end_point
+                span.set_attribute('end_point', end_point)
+                sink = _open_sink(SINK)
+                # the batch's limit applies to its own requests only, on top of any process-wide limiter
+                ma = mindat_api.MindatApi().set_rate_limiter(self.rate_limiter)
+                for page in ma.iter_mindat_pages(dict(retriever._params), end_point, 0):
+                    records = _records(page)
+                    sink.write(records)
+                    entry['rows'] += len(records)
+                    entry['pages'] += 1
+                ok = True
+            except Exception as e:
+                entry['error'] = repr(e)
+                span.set_attribute('error', repr(e))
+            finally:
+                if sink is not None:
+                    sink.close(ok)
+                entry['seconds'] = time.perf_counter() - started
+        if isinstance(sink, _ListSink) and ok:
+            entry['records'] = sink.records
+        return entry
+
+    def run(self):
+        '''
+        Runs every query added so far and returns the summary.
+
+        Returns:
+            dict: 'queries', 'succeeded', 'failed', 'rows' and 'seconds' of the batch, and 'results', one entry
+            per query in the order they were added with 'name', 'end_point', 'rows', 'pages', 'seconds',
+            'error' (None or the exception's repr) and, for queries without a sink, 'records'.
+        '''
+        reporter = progress.get_reporter(self.verbose)
+        reporter.start('batch', len(self._queries), True)
+        started = time.perf_counter()
+        results = {}
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                futures = [executor.submit(self._execute, name, query, sink) for name, query, sink in self._queries]
+                for future in as_completed(futures):
+                    entry = future.result()
+                    results[entry['name']] = entry
+                    if entry['error'] is not None:
+                        reporter.retry('batch', 1, "query " + entry['name'] + " failed: " + entry['error'])
+                    reporter.page('batch', 1, 0, entry['seconds'])
+        finally:
+            reporter.close('batch')
+
+        ordered = [results[name] for name, query, sink in self._queries]
+        failed = sum(1 for entry in ordered if entry['error'] is not None)
+        return {'queries': len(ordered), 'succeeded': len(ordered) - failed, 'failed': failed,
+                'rows': sum(entry['rows'] for entry in ordered), 'seconds': time.perf_counter() - started,
+                'results': ordered}
@@ -0,0 +1,236 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import contextlib
+import subprocess
+import tracemalloc
+
+from . import metrics
+from .mock_server import MockMindatServer, build_fixtures
+
+
+# Budget for a bare `import openmindat` in a fresh interpreter, in seconds
+IMPORT_TIME_BUDGET = 0.1
+
+# Fixture sizes for --quick runs, small enough for a release pipeline
+QUICK_SIZES = {'geomaterials': 1500, 'localities': 3000, 'locgeoregion2': 60, 'minerals_ima': 600}
+
+
+@contextlib.contextmanager
+def mock_environment(SERVER_URL, WORKDIR):
+    '''
+    Points MindatApi at SERVER_URL with a dummy API key and runs inside WORKDIR,
+    so the .apikey.yaml written by the key manager never touches the caller's directory.
+    '''
+    saved_env = {key: os.environ.get(key) for key in ("MINDAT_API_URL", "MINDAT_API_KEY")}
+    saved_cwd = os.getcwd()
+
+    os.environ["MINDAT_API_URL"] = SERVER_URL
+    os.environ["MINDAT_API_KEY"] = "0" * 32
+    os.chdir(WORKDIR)
+    try:
+        yield
+    finally:
+        os.chdir(saved_cwd)
+        for key, value in saved_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+def _rows_received():
+    return sum(metrics.get_registry().rows.samples().values())
+
+
+def measure(FUNC, MEMORY = True):
+    '''
+    Runs FUNC once for wall time and rows received, then once more under tracemalloc for peak memory.
+
+    Returns:
+        dict: seconds, rows, rows_per_s and peak_mb (None when MEMORY is False).
+    '''
+    rows_before = _rows_received()
+    start = time.perf_counter()
+    FUNC()
+    seconds = time.perf_counter() - start
+    rows = int(_rows_received() - rows_before)
+
+    peak_mb = None
+    if MEMORY:
+        tracemalloc.start()
+        try:
+            FUNC()
+            peak_mb = tracemalloc.get_traced_memory()[1] / 2**20
+        finally:
+            tracemalloc.stop()
+
+    return {'seconds': seconds, 'rows': rows, 'rows_per_s': rows / seconds if seconds else None, 'peak_mb': peak_mb}
+
+
+def measure_import_time(REPEAT = 5):
+    '''
+    Returns the best wall time of `import openmindat` over REPEAT fresh interpreters.
+    '''
+    code = "import time; t = time.perf_counter(); import openmindat; print(time.perf_counter() - t)"
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env['PYTHONPATH'] = package_root + os.pathsep + env.get('PYTHONPATH', '')
+
+    timings = []
+    for _ in range(REPEAT):
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env, check=True)
+        timings.append(float(out.stdout.strip()))
+    return min(timings)
+
+
+def _cases(OUTDIR):
+    from . import mindat_api
+    from .geomaterials import GeomaterialRetriever, GeomaterialIdRetriever
+    from .localities import LocalitiesRetriever
+    from .locgeoregion2 import GeoRegionRetriever
+    from .minerals_ima import MineralsIMARetriever
+    from .dana8 import DanaRetriever
+    from .nickel_strunz import StrunzRetriever
+    from .localities_type import LocalitiesTypeRetriever
+    from .localities_status import LocalitiesStatusRetriever
+    from .localities_age import LocalitiesAgeRetriever
+    from .countries import CountriesListRetriever
+    from .photo_count import PhotoCountRetriever
+
+    cases = [
+        ('MindatApi.get_mindat_json geomaterials',
+            lambda: mindat_api.MindatApi().get_mindat_json({'format': 'json', 'page_size': 1500}, 'geomaterials', 0)),
+        ('MindatApi.download_mindat_json localities',
+            lambda: mindat_api.MindatApi().download_mindat_json({'format': 'json', 'page_size': 1500}, 'localities', OUTDIR, '', 0)),
+        ('GeomaterialRetriever.saveto', lambda: GeomaterialRetriever().verbose(0).saveto(OUTDIR)),
+        ('GeomaterialIdRetriever.saveto', lambda: GeomaterialIdRetriever().id(5).verbose(0).saveto(OUTDIR)),
+        ('LocalitiesRetriever.saveto', lambda: LocalitiesRetriever().verbose(0).saveto(OUTDIR)),
+        ('GeoRegionRetriever.saveto', lambda: GeoRegionRetriever().verbose(0).saveto(OUTDIR)),
+        ('MineralsIMARetriever.saveto', lambda: MineralsIMARetriever().verbose(0).saveto(OUTDIR)),
+        ('DanaRetriever.saveto', lambda: DanaRetriever().subgroups().verbose(0).saveto(OUTDIR)),
+        ('StrunzRetriever.saveto', lambda: StrunzRetriever().families().verbose(0).saveto(OUTDIR)),
+        ('LocalitiesTypeRetriever.saveto', lambda: LocalitiesTypeRetriever().verbose(0).saveto(OUTDIR)),
+        ('LocalitiesStatusRetriever.saveto', lambda: LocalitiesStatusRetriever().verbose(0).saveto(OUTDIR)),
+        ('LocalitiesAgeRetriever.saveto', lambda: LocalitiesAgeRetriever().verbose(0).saveto(OUTDIR)),
+        ('CountriesListRetriever.saveto', lambda: CountriesListRetriever().verbose(0).saveto(OUTDIR)),
+        ('PhotoCountRetriever.saveto', lambda: PhotoCountRetriever().verbose(0).saveto(OUTDIR)),
+    ]
+
+    try:
+        import rdflib
+    except ImportError:
+        print("rdflib is not installed, skipping the ttl benchmarks")
+    else:
+        cases += [
+            ('MindatApi.get_mindat_ttl geomaterials',
+                lambda: mindat_api.MindatApi().get_mindat_ttl({'format': 'json', 'page_size': 1500}, 'geomaterials', 0)),
+            ('GeomaterialRetriever.saveto_ttl', lambda: GeomaterialRetriever().verbose(0).saveto_ttl(OUTDIR)),
+        ]
+    return cases
+
+
+def run_benchmarks(SIZES = None, LATENCY = 0.0, ERROR_RATE = 0.0, MEMORY = True, SELECT = None):
+    '''
+    Starts a MockMindatServer and measures every benchmark case against it.
+
+    Args:
+        SIZES (dict): Fixture sizes, see mock_server.DEFAULT_SIZES.
+        LATENCY (float): Per-request server latency in seconds.
+        ERROR_RATE (float): Probability of a failed follow-up page. Two failures in a row
+            trigger the client's 5 second back-off, so keep this small.
+        MEMORY (bool): Also measure peak memory with tracemalloc (runs each case twice).
+        SELECT (str): Only run cases whose name contains this string.
+
+    Returns:
+        list of dict: name, seconds, rows, rows_per_s and peak_mb per case.
+    '''
+    fixtures = build_fixtures(SIZES)
+    results = []
+
+    with tempfile.TemporaryDirectory() as workdir, \
+            MockMindatServer(FIXTURES=fixtures, LATENCY=LATENCY, ERROR_RATE=ERROR_RATE) as server, \
+            mock_environment(server.url, workdir):
+        for name, func in _cases(os.path.join(workdir, 'out')):
+            if SELECT and SELECT not in name:
+                continue
+            result = measure(func, MEMORY)
+            result['name'] = name
+            results.append(result)
+
+    return results
+
+
+def compare(RESULTS, BASELINE, TOLERANCE = 0.25):
+    '''
+    Compares results with a baseline saved by --save and returns a message per regression:
+    throughput lower, or peak memory higher, than the baseline by more than TOLERANCE.
+    '''
+    baseline = {entry['name']: entry for entry in BASELINE}
+    regressions = []
+
+    for result in RESULTS:
+        base = baseline.get(result['name'])
+        if base is None:
+            continue
+        if base.get('rows_per_s') and result['rows_per_s'] is not None:
+            if result['rows_per_s'] < base['rows_per_s'] * (1 - TOLERANCE):
+                regressions.append(f"{result['name']}: {result['rows_per_s']:.0f} rows/s, baseline {base['rows_per_s']:.0f}")
+        if base.get('peak_mb') and result['peak_mb'] is not None:
+            if result['peak_mb'] > base['peak_mb'] * (1 + TOLERANCE):
+                regressions.append(f"{result['name']}: peak {result['peak_mb']:.1f} MB, baseline {base['peak_mb']:.1f} MB")
+
+    return regressions
+
+
+def _print_table(RESULTS):
+    print(f"{'benchmark':<45} {'rows':>8} {'seconds':>9} {'rows/s':>10} {'peak MB':>9}")
+    for r in RESULTS:
+        rows_per_s = f"{r['rows_per_s']:.0f}" if r['rows_per_s'] else '-'
+        peak = f"{r['peak_mb']:.1f}" if r['peak_mb'] is not None else '-'
+        print(f"{r['name']:<45} {r['rows']:>8} {r['seconds']:>9.3f} {rows_per_s:>10} {peak:>9}")
+
+
+def main(ARGV = None):
+    parser = argparse.ArgumentParser(prog='python -m openmindat.benchmark',
+                                     description='Offline benchmarks for openmindat against a local mock Mindat API.')
+    parser.add_argument('--quick', action='store_true', help='use small fixtures')
+    parser.add_argument('--latency', type=float, default=0.0, help='server latency per request in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='probability of a failed follow-up page')
+    parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc peak memory pass')
+    parser.add_argument('--select', default=None, help='only run benchmarks whose name contains this text')
+    parser.add_argument('--save', default=None, help='write the results to this JSON file')
+    parser.add_argument('--baseline', default=None, help='fail on regressions against this JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative regression (default 0.25)')
+    parser.add_argument('--import-budget', type=float, default=IMPORT_TIME_BUDGET, help='seconds allowed for `import openmindat`')
+    args = parser.parse_args(ARGV)
+
+    failures = []
+
+    import_time = measure_import_time()
+    print(f"import openmindat: {import_time * 1000:.1f} ms (budget {args.import_budget * 1000:.0f} ms)")
+    if import_time > args.import_budget:
+        failures.append(f"import openmindat took {import_time:.3f}s, budget {args.import_budget:.3f}s")
+
+    results = run_benchmarks(QUICK_SIZES if args.quick else None, args.latency, args.error_rate,
+                             not args.no_memory, args.select)
+    _print_table(results)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=4)
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            failures += compare(results, json.load(f), args.tolerance)
+
+    for failure in failures:
+        print("REGRESSION: " + failure)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,371 @@
+import re
+import pickle
+from array import array
+
+
+# Element symbols by atomic number; an element's position is its column in the stoichiometry vectors
+ELEMENTS = (
+    'H', 'He', 'Li', 'Be', 'B', 'C', 'N', 'O', 'F', 'Ne', 'Na', 'Mg', 'Al', 'Si', 'P', 'S', 'Cl', 'Ar',
+    'K', 'Ca', 'Sc', 'Ti', 'V', 'Cr', 'Mn', 'Fe', 'Co', 'Ni', 'Cu', 'Zn', 'Ga', 'Ge', 'As', 'Se', 'Br', 'Kr',
+    'Rb', 'Sr', 'Y', 'Zr', 'Nb', 'Mo', 'Tc', 'Ru', 'Rh', 'Pd', 'Ag', 'Cd', 'In', 'Sn', 'Sb', 'Te', 'I', 'Xe',
+    'Cs', 'Ba', 'La', 'Ce', 'Pr', 'Nd', 'Pm', 'Sm', 'Eu', 'Gd', 'Tb', 'Dy', 'Ho', 'Er', 'Tm', 'Yb', 'Lu',
+    'Hf', 'Ta', 'W', 'Re', 'Os', 'Ir', 'Pt', 'Au', 'Hg', 'Tl', 'Pb', 'Bi', 'Po', 'At', 'Rn',
+    'Fr', 'Ra', 'Ac', 'Th', 'Pa', 'U', 'Np', 'Pu', 'Am', 'Cm', 'Bk', 'Cf', 'Es', 'Fm', 'Md', 'No', 'Lr',
+    'Rf', 'Db', 'Sg', 'Bh', 'Hs', 'Mt', 'Ds', 'Rg', 'Cn', 'Nh', 'Fl', 'Mc', 'Lv', 'Ts', 'Og',
+)
+_ELEMENT_INDEX = {symbol: i for i, symbol in enumerate(ELEMENTS)}
+
+# Geomaterial fields holding a formula, in the order they are tried
+FORMULA_FIELDS = ('mindat_formula', 'ima_formula')
+
+_SUPERSCRIPT = re.compile(r'<sup>.*?</sup>', re.IGNORECASE | re.DOTALL)
+_TAG = re.compile(r'<[^>]+>')
+# hydrate and adduct separators, e.g. CaSO4·2H2O
+_SEPARATOR = re.compile(r'[·•∙⋅*]')
+_TOKEN = re.compile(r'[A-Z][a-z]?|\d+(?:\.\d+)?|[()\[\]{},]')
+_LEADING_NUMBER = re.compile(r'\s*(\d+(?:\.\d+)?)')
+_OPENING = {'(': ')', '[': ']', '{': '}'}
+
+
+def _element(token):
+    # a capital and a lowercase letter that are no symbol (e.g. the "Ox" of a typo) fall back to the
+    # capital's element; unknown symbols such as the R and E of REE are skipped
+    if token in _ELEMENT_INDEX:
+        return [token]
+    if len(token) == 2 and token[0] in _ELEMENT_INDEX:
+        return [token[0]]
+    return []
+
+
+def _tokens(text):
+    tokens = []
+    for token in _TOKEN.findall(text):
+        if token[0].isalpha():
+            tokens.extend(_element(token))
+        else:
+            tokens.append(token)
+    return tokens
+
+
+def _add(target, source, factor):
+    for element, amount in source.items():
+        target[element] = target.get(element, 0.0) + amount * factor
+
+
+def _parse_group(tokens, position, closing):
+    # returns the composition of one bracketed group and the position after its closing bracket;
+    # comma separated alternatives share the site, e.g. (Fe,Mg) counts half Fe and half Mg
+    alternatives = [{}]
+    while position < len(tokens):
+        token = tokens[position]
+        if token == closing:
+            position += 1
+            break
+        if token in _OPENING:
+            part, position = _parse_group(tokens, position + 1, _OPENING[token])
+        elif token == ',':
+            alternatives.append({})
+            position += 1
+            continue
+        elif token in (')', ']', '}'):
+            raise ValueError(f"Unbalanced bracket {token!r}")
+        elif token[0].isalpha():
+            part = {token: 1.0}
+            position += 1
+        else:
+            # a stray number, e.g. the charge of an ion left after the tags were removed
+            position += 1
+            continue
+        count = 1.0
+        if position < len(tokens) and tokens[position][0].isdigit():
+            count = float(tokens[position])
+            position += 1
+        _add(alternatives[-1], part, count)
+    else:
+        if closing is not None:
+            raise ValueError(f"Missing {closing!r}")
+
+    alternatives = [a for a in alternatives if a]
+    composition = {}
+    for alternative in alternatives:
+        _add(composition, alternative, 1.0 / len(alternatives))
+    return composition, position
+
+
+def parse_formula(FORMULA):
+    '''
+    Parses a Mindat or IMA formula into an element -> amount dictionary. HTML tags are removed,
+    superscripts (charges) are dropped, bracketed groups are multiplied out, a site shared by
+    comma separated elements is split evenly between them and hydrate parts such as ·2H2O are added.
+    Variables such as x or n count as 1 and unknown symbols such as REE are skipped.
+
+    Args:
+        FORMULA (str): The formula, e.g. 'CaSO<sub>4</sub>·2H<sub>2</sub>O'.
+
+    Returns:
+        dict: Element symbol -> number of atoms per formula unit.
+
+    Example:
+        >>> parse_formula('(Fe,Mg)<sub>2</sub>SiO<sub>4</sub>')
+        {'Fe': 1.0, 'Mg': 1.0, 'Si': 1.0, 'O': 4.0}
+    '''
+    if not isinstance(FORMULA, str):
+        raise TypeError(f"FORMULA must be a string, got {type(FORMULA).__name__}")
+    text = _TAG.sub('', _SUPERSCRIPT.sub('', FORMULA))
+    composition = {}
+    for segment in _SEPARATOR.split(text):
+        factor = 1.0
+        leading = _LEADING_NUMBER.match(segment)
+        if leading:
+            factor = float(leading.group(1))
+            segment = segment[leading.end():]
+        tokens = _tokens(segment)
+        if not tokens:
+            continue
+        part, position = _parse_group(tokens, 0, None)
+        _add(composition, part, factor)
+    return composition
+
+
+def _composition(FORMULA_OR_ELEMENTS):
+    if isinstance(FORMULA_OR_ELEMENTS, dict):
+        composition = {}
+        for element, amount in FORMULA_OR_ELEMENTS.items():
+            if element not in _ELEMENT_INDEX:
+                raise ValueError(f"Unknown element: {element}")
+            composition[element] = float(amount)
+        return composition
+    return parse_formula(FORMULA_OR_ELEMENTS)
+
+
+def _element_set(ELEMENTS_ARG):
+    if isinstance(ELEMENTS_ARG, str):
+        ELEMENTS_ARG = [e.strip() for e in ELEMENTS_ARG.split(',') if e.strip()]
+    indexes = []
+    for element in ELEMENTS_ARG:
+        if element not in _ELEMENT_INDEX:
+            raise ValueError(f"Unknown element: {element}")
+        indexes.append(_ELEMENT_INDEX[element])
+    return sorted(set(indexes))
+
+
+class FormulaIndex:
+    """
+    Compiled stoichiometry of geomaterial formulas for local chemistry queries. Each formula is parsed
+    once into a sparse vector of atoms per formula unit; the vectors are stored CSR-style in compact
+    arrays (row offsets, element numbers, amounts) with a per-element list of rows, so element and ratio
+    queries over the whole catalogue are array scans instead of requests.
+
+    Args:
+        RECORDS (iterable of dict): Geomaterial records with 'id', 'name' and a formula field.
+        FIELDS (tuple of str): The formula fields to use, the first non-empty one wins.
+
+    Usage:
+        >>> index = GeomaterialRetriever().get_formula_index()
+        >>> index.ratio('CuS', TOLERANCE=0.05)
+        [2545, 917, ...]
+        >>> index.contains('Fe,Mn,Ni', AT_LEAST=2)
+
+    Press q to quit.
+    """
+
+    def __init__(self, RECORDS = (), FIELDS = FORMULA_FIELDS):
+        self.fields = tuple(FIELDS)
+        self._ids = array('q')
+        self._names = []
+        self._formulas = []
+        self._offsets = array('i', [0])
+        self._elements = array('B')
+        self._amounts = array('d')
+        self._index = {}
+        self._by_name = {}
+        self._postings = None
+        self.failed = []
+        self.add_records(RECORDS)
+
+    def add_records(self, RECORDS):
+        '''
+        Parses and adds geomaterial records. Records whose formula cannot be parsed are listed in .failed
+        as (id, formula, error) and left out.
+        '''
+        for record in RECORDS:
+            try:
+                record_id = int(record['id'])
+            except (KeyError, TypeError, ValueError):
+                continue
+            if record_id in self._index:
+                continue
+            formula = next((record[f] for f in self.fields if record.get(f)), None)
+            if not formula:
+                continue
+            try:
+                composition = parse_formula(formula)
+            except ValueError as e:
+                self.failed.append((record_id, formula, str(e)))
+                continue
+            if not composition:
+                continue
+
+            self._index[record_id] = len(self._ids)
+            self._ids.append(record_id)
+            name = record.get('name')
+            self._names.append(name)
+            if name:
+                self._by_name.setdefault(name.lower(), record_id)
+            self._formulas.append(formula)
+            for element in sorted(composition, key=_ELEMENT_INDEX.get):
+                self._elements.append(_ELEMENT_INDEX[element])
+                self._amounts.append(composition[element])
+            self._offsets.append(len(self._elements))
+        self._postings = None
+        return self
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _element_rows(self):
+        # element number -> rows containing it, built on first use
+        if self._postings is None:
+            postings = [array('i') for _ in ELEMENTS]
+            offsets, elements = self._offsets, self._elements
+            for row in range(len(self._ids)):
+                for p in range(offsets[row], offsets[row + 1]):
+                    postings[elements[p]].append(row)
+            self._postings = postings
+        return self._postings
+
+    def _row(self, ID_OR_NAME):
+        if isinstance(ID_OR_NAME, str) and not ID_OR_NAME.strip().isdigit():
+            record_id = self._by_name.get(ID_OR_NAME.strip().lower())
+        else:
+            record_id = int(ID_OR_NAME)
+        row = self._index.get(record_id)
+        if row is None:
+            raise KeyError(f"Unknown geomaterial: {ID_OR_NAME}")
+        return row
+
+    def _amount(self, row, element):
+        for p in range(self._offsets[row], self._offsets[row + 1]):
+            if self._elements[p] == element:
+                return self._amounts[p]
+        return 0.0
+
+    def composition(self, ID_OR_NAME):
+        '''
+        Returns the parsed element -> amount dictionary of a geomaterial id or name.
+        '''
+        row = self._row(ID_OR_NAME)
+        return {ELEMENTS[self._elements[p]]: self._amounts[p] for p in range(self._offsets[row], self._offsets[row + 1])}
+
+    def formula(self, ID_OR_NAME):
+        return self._formulas[self._row(ID_OR_NAME)]
+
+    def name(self, ID):
+        row = self._index.get(int(ID))
+        return self._names[row] if row is not None else None
+
+    def contains(self, ELEMENTS_ARG, AT_LEAST = None, EXCLUDE = ()):
+        '''
+        Returns the ids of geomaterials containing at least AT_LEAST of the given elements.
+
+        Args:
+            ELEMENTS_ARG (str or list of str): Element symbols, e.g. 'Fe,Mn,Ni' or ['Fe', 'Mn', 'Ni'].
+            AT_LEAST (int): How many of the elements must be present; all of them by default.
+            EXCLUDE (str or list of str): Elements that must not be present.
+
+        Example:
+            >>> index.contains('Fe,Mn,Ni', AT_LEAST=2, EXCLUDE='S')
+        '''
+        wanted = _element_set(ELEMENTS_ARG)
+        excluded = _element_set(EXCLUDE)
+        if not wanted:
+            raise ValueError("At least one element is required.")
+        at_least = len(wanted) if AT_LEAST is None else AT_LEAST
+        if not 1 <= at_least <= len(wanted):
+            raise ValueError(f"Invalid AT_LEAST: {AT_LEAST}\nIt must be between 1 and the number of elements ({len(wanted)}).")
+
+        postings = self._element_rows()
+        counts = bytearray(len(self._ids))
+        for element in wanted:
+            for row in postings[element]:
+                counts[row] += 1
+        for element in excluded:
+            for row in postings[element]:
+                counts[row] = 0
+        ids = self._ids
+        return [ids[row] for row, count in enumerate(counts) if count >= at_least]
+
+    def ratio(self, FORMULA_OR_ELEMENTS, TOLERANCE = 0.1, ONLY = False):
+        '''
+        Returns the ids of geomaterials whose amounts of the given elements stand in the given ratio,
+        closest match first. Other elements may be present unless ONLY is set.
+
+        Args:
+            FORMULA_OR_ELEMENTS (str or dict): A formula such as 'CuS' or 'Cu:S' ratios as {'Cu': 1, 'S': 1}.
+            TOLERANCE (float): Largest relative deviation of each element's ratio, e.g. 0.1 for 10%.
+            ONLY (bool): Require the geomaterial to contain no other elements.
+
+        Example:
+            >>> index.ratio({'Cu': 1, 'S': 1}, TOLERANCE=0.05)
+        '''
+        target = _composition(FORMULA_OR_ELEMENTS)
+        target = {_ELEMENT_INDEX[e]: a for e, a in target.items() if a > 0}
+        if len(target) < 2:
+            raise ValueError("A ratio needs at least two elements.")
+        if TOLERANCE < 0:
+            raise ValueError(f"Invalid TOLERANCE: {TOLERANCE}")
+
+        postings = self._element_rows()
+        # candidates are the rows of the rarest element, narrowed by the others' row lists
+        order = sorted(target, key=lambda e: len(postings[e]))
+        rows = postings[order[0]]
+        for element in order[1:]:
+            present = set(postings[element])
+            rows = [row for row in rows if row in present]
+
+        base = order[0]
+        expected = [(e, target[e] / target[base]) for e in order[1:]]
+        offsets, elements, amounts = self._offsets, self._elements, self._amounts
+        matches = []
+        for row in rows:
+            start, end = offsets[row], offsets[row + 1]
+            if ONLY and end - start != len(target):
+                continue
+            vector = {elements[p]: amounts[p] for p in range(start, end)}
+            base_amount = vector[base]
+            deviation = 0.0
+            for element, wanted in expected:
+                deviation = max(deviation, abs(vector[element] / base_amount / wanted - 1.0))
+                if deviation > TOLERANCE:
+                    break
+            else:
+                matches.append((deviation, row))
+        matches.sort()
+        return [self._ids[row] for _, row in matches]
+
+    def save(self, PATH):
+        with open(PATH, 'wb') as f:
+            pickle.dump({'fields': self.fields, 'ids': self._ids, 'names': self._names, 'formulas': self._formulas,
+                         'offsets': self._offsets, 'elements': self._elements, 'amounts': self._amounts,
+                         'failed': self.failed}, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, PATH):
+        '''
+        Loads an index written by save(). Only load files you created, pickle can run arbitrary code.
+        '''
+        with open(PATH, 'rb') as f:
+            state = pickle.load(f)
+        index = cls(FIELDS=state['fields'])
+        index._ids = state['ids']
+        index._names = state['names']
+        index._formulas = state['formulas']
+        index._offsets = state['offsets']
+        index._elements = state['elements']
+        index._amounts = state['amounts']
+        index.failed = state['failed']
+        index._index = {record_id: row for row, record_id in enumerate(index._ids)}
+        for record_id, name in zip(index._ids, index._names):
+            if name:
+                index._by_name.setdefault(name.lower(), record_id)
+        return index
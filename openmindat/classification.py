@@ -0,0 +1,374 @@
+import os
+import re
+import json
+import time
+import threading
+from pathlib import Path
+from operator import itemgetter
+from concurrent.futures import ThreadPoolExecutor
+
+from . import mindat_api
+from . import tracing
+from .reference import DEFAULT_TTL
+
+
+# Classification endpoint -> its levels, broadest first
+SYSTEMS = {
+    'nickel-strunz-10': ('classes', 'subclasses', 'families'),
+    'dana-8': ('groups', 'subgroups'),
+}
+
+DEFAULT_CACHE_DIR = './mindat_data/classification/'
+
+_TOKEN = re.compile(r'\d+|[A-Za-z]')
+
+
+def code_tokens(CODE):
+    '''
+    Splits a Strunz or Dana code into its hierarchy tokens: numbers and single letters, with leading zeros
+    dropped so that '01.AA.05', '1.AA.5' and ('1', 'A', 'A', '05') compare equal.
+
+    Example:
+        >>> code_tokens('1.AA.05')
+        ('1', 'A', 'A', '5')
+        >>> code_tokens('2.1.3')
+        ('2', '1', '3')
+    '''
+    if CODE is None:
+        return ()
+    if isinstance(CODE, (list, tuple)):
+        CODE = '.'.join(str(part) for part in CODE if part not in (None, ''))
+    return tuple(str(int(t)) if t.isdigit() else t.upper() for t in _TOKEN.findall(str(CODE)))
+
+
+def _label(record):
+    for key in ('name', 'description', 'title', 'text'):
+        if record.get(key):
+            return record[key]
+    return None
+
+
+class ClassificationNode:
+    """
+    One entry of a classification tree.
+
+    Attributes:
+        code (str): The code as given by the API, e.g. '1.AA'.
+        tokens (tuple): The normalized code tokens, see code_tokens().
+        level (str): The level it was downloaded from, e.g. 'families'.
+        name (str or None): The entry's name or description.
+        record (dict): The full API record.
+        parent (ClassificationNode or None): The closest broader entry.
+        children (list of ClassificationNode): The entries directly below it.
+    """
+
+    __slots__ = ('code', 'tokens', 'level', 'name', 'record', 'parent', 'children')
+
+    def __init__(self, CODE, TOKENS, LEVEL, RECORD):
+        self.code = CODE
+        self.tokens = TOKENS
+        self.level = LEVEL
+        self.name = _label(RECORD)
+        self.record = RECORD
+        self.parent = None
+        self.children = []
+
+    def path(self):
+        '''
+        Returns the nodes from the top level down to this one.
+        '''
+        nodes = []
+        node = self
+        while node is not None:
+            nodes.append(node)
+            node = node.parent
+        return nodes[::-1]
+
+    def __repr__(self):
+        return f"ClassificationNode({self.code!r}, {self.level!r}, {self.name!r})"
+
+
+class ClassificationTree:
+    """
+    A materialized Nickel-Strunz 10 or Dana 8 classification: every level in one tree with parent/child
+    links, an O(1) code index and a token trie for prefix and deepest-match lookups.
+
+    Build it with ClassificationTree.build(), which downloads all levels concurrently and caches them on
+    disk, or from StrunzRetriever().get_tree() / DanaRetriever().get_tree().
+
+    Args:
+        SYSTEM (str): 'nickel-strunz-10' or 'dana-8'.
+        LEVELS (dict): level name -> list of API records with a 'code' field.
+        FETCHED_AT (float): time.time() when the levels were downloaded.
+
+    Usage:
+        >>> tree = ClassificationTree.build('nickel-strunz-10')
+        >>> tree.classify('1.AA.05')
+        ClassificationNode('1.AA', 'families', 'Cu-cupalite family')
+        >>> [node.code for node in tree.path('1.AA.05')]
+        ['1', '1.A', '1.AA']
+
+    Press q to quit.
+    """
+
+    def __init__(self, SYSTEM, LEVELS, FETCHED_AT = None):
+        if SYSTEM not in SYSTEMS:
+            raise ValueError(f"Unknown classification: {SYSTEM}\nPossible options: {tuple(SYSTEMS)}")
+        self.system = SYSTEM
+        self.levels = {level: list(LEVELS.get(level, [])) for level in SYSTEMS[SYSTEM]}
+        self.fetched_at = FETCHED_AT if FETCHED_AT is not None else time.time()
+
+        self._nodes = {}
+        self._trie = {}
+        for level in SYSTEMS[SYSTEM]:
+            for record in self.levels[level]:
+                tokens = code_tokens(record.get('code'))
+                if not tokens or tokens in self._nodes:
+                    continue
+                node = ClassificationNode(record.get('code'), tokens, level, record)
+                self._nodes[tokens] = node
+                trie = self._trie
+                for token in tokens:
+                    trie = trie.setdefault(token, {})
+                trie[None] = node
+
+        # levels are inserted broadest first, but the links are made afterwards so that
+        # entries whose parent level is listed out of order are still attached
+        for tokens, node in self._nodes.items():
+            parent = self._deepest(tokens[:-1])
+            if parent is not None:
+                node.parent = parent
+                parent.children.append(node)
+
+    def _deepest(self, tokens):
+        trie = self._trie
+        found = None
+        for token in tokens:
+            trie = trie.get(token)
+            if trie is None:
+                break
+            found = trie.get(None, found)
+        return found
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def __contains__(self, CODE):
+        return code_tokens(CODE) in self._nodes
+
+    def __iter__(self):
+        return iter(self._nodes.values())
+
+    def roots(self):
+        return [node for node in self._nodes.values() if node.parent is None]
+
+    def node(self, CODE):
+        '''
+        Returns the node with exactly this code, or None. O(1).
+        '''
+        return self._nodes.get(code_tokens(CODE))
+
+    def classify(self, CODE):
+        '''
+        Returns the most specific node whose code is a prefix of CODE, e.g. the family of a full
+        mineral code such as '1.AA.05', or None. O(depth).
+        '''
+        return self._deepest(code_tokens(CODE))
+
+    def path(self, CODE):
+        '''
+        Returns the nodes from the top level down to classify(CODE), or an empty list.
+        '''
+        node = self.classify(CODE)
+        return node.path() if node is not None else []
+
+    def parent(self, CODE):
+        node = self.node(CODE)
+        return node.parent if node is not None else None
+
+    def children(self, CODE):
+        node = self.node(CODE)
+        return list(node.children) if node is not None else []
+
+    def find_prefix(self, PREFIX):
+        '''
+        Returns every node whose code starts with PREFIX, e.g. find_prefix('1.A') for all of subclass 1.A.
+        '''
+        trie = self._trie
+        for token in code_tokens(PREFIX):
+            trie = trie.get(token)
+            if trie is None:
+                return []
+        nodes = []
+        stack = [trie]
+        while stack:
+            trie = stack.pop()
+            for token, child in trie.items():
+                if token is None:
+                    nodes.append(child)
+                else:
+                    stack.append(child)
+        return sorted(nodes, key=lambda node: node.tokens)
+
+    def save(self, PATH):
+        '''
+        Writes the downloaded levels to a json file; the indexes are rebuilt by load().
+        '''
+        path = Path(PATH)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        part_path = path.with_name(path.name + '.part')
+        with open(part_path, 'w') as f:
+            json.dump({'system': self.system, 'fetched_at': self.fetched_at, 'levels': self.levels}, f, separators=(',', ':'))
+        os.replace(part_path, path)
+
+    @classmethod
+    def load(cls, PATH):
+        with open(PATH, 'r') as f:
+            data = json.load(f)
+        return cls(data['system'], data['levels'], data['fetched_at'])
+
+    @classmethod
+    def download(cls, SYSTEM, WORKERS = None):
+        '''
+        Downloads every level of a classification at the same time and builds the tree.
+        '''
+        if SYSTEM not in SYSTEMS:
+            raise ValueError(f"Unknown classification: {SYSTEM}\nPossible options: {tuple(SYSTEMS)}")
+        levels = SYSTEMS[SYSTEM]
+
+        with tracing.start_span('ClassificationTree.download', end_point=SYSTEM):
+            ma = mindat_api.MindatApi()
+
+            def fetch(level):
+                json_data = ma.get_mindat_json({'format': 'json', 'page_size': 1500}, SYSTEM + '/' + level, 0)
+                return json_data.get('results', [])
+
+            with ThreadPoolExecutor(max_workers=WORKERS or len(levels)) as executor:
+                results = dict(zip(levels, executor.map(fetch, levels)))
+
+        return cls(SYSTEM, results)
+
+    @classmethod
+    def build(cls, SYSTEM, CACHE_DIR = DEFAULT_CACHE_DIR, TTL = DEFAULT_TTL, REFRESH = False):
+        '''
+        Returns the tree for a classification from the disk cache when it is younger than TTL seconds,
+        otherwise downloads it and updates the cache.
+
+        Args:
+            SYSTEM (str): 'nickel-strunz-10' or 'dana-8'.
+            CACHE_DIR (str): Directory of the cached trees. None disables the disk cache.
+            TTL (float): Seconds before a cached tree is downloaded again.
+            REFRESH (bool): Ignore the cache.
+        '''
+        path = Path(CACHE_DIR, SYSTEM + '.json') if CACHE_DIR is not None else None
+
+        if path is not None and not REFRESH and path.exists():
+            try:
+                tree = cls.load(path)
+                if TTL is None or time.time() - tree.fetched_at < TTL:
+                    return tree
+            except (OSError, ValueError, KeyError):
+                pass
+
+        tree = cls.download(SYSTEM)
+        if path is not None:
+            tree.save(path)
+        return tree
+
+
+_trees = {}
+_trees_lock = threading.Lock()
+
+def get_tree(SYSTEM):
+    '''
+    Returns the process-wide tree for a classification, built with ClassificationTree.build() on first use.
+    '''
+    tree = _trees.get(SYSTEM)
+    if tree is None:
+        with _trees_lock:
+            tree = _trees.get(SYSTEM)
+            if tree is None:
+                tree = ClassificationTree.build(SYSTEM)
+                _trees[SYSTEM] = tree
+    return tree
+
+
+# Classification -> the geomaterial fields holding its code, broadest first, and the prefix of the added fields
+GEOMATERIAL_FIELDS = {
+    'nickel-strunz-10': (('strunz10ed1', 'strunz10ed2', 'strunz10ed3', 'strunz10ed4'), 'strunz10'),
+    'dana-8': (('dana8ed1', 'dana8ed2', 'dana8ed3', 'dana8ed4'), 'dana8'),
+}
+
+
+def geomaterial_code(SYSTEM, RECORD):
+    '''
+    Assembles the code of a geomaterial record in a classification, e.g. '1.AA.05' from strunz10ed1..4,
+    or None when the record is not classified.
+    '''
+    fields, _ = GEOMATERIAL_FIELDS[SYSTEM]
+    parts = [str(RECORD.get(field) or '').strip() for field in fields]
+    if not parts[0] or parts[0] == '0':
+        return None
+    if SYSTEM == 'nickel-strunz-10':
+        code = parts[0] + '.' + parts[1] + parts[2]
+        return code + '.' + parts[3] if parts[3] else code.rstrip('.')
+    return '.'.join(part for part in parts if part)
+
+
+class ClassificationJoiner:
+    """
+    Attaches classification paths to geomaterial records: for each classification, '<prefix>_code'
+    (e.g. strunz10_code '1.AA.05') and '<prefix>_path', the list of {'code', 'level', 'name'} entries from the
+    top level down to the deepest matching node. Tens of thousands of minerals share a few thousand codes,
+    so each distinct code is resolved against the tree once and the path list is reused; treat the path
+    lists as read-only.
+
+    Args:
+        SYSTEMS (tuple of str): The classifications to attach, defaults to both.
+        TREES (dict): Optional system -> ClassificationTree, otherwise get_tree() is used.
+
+    Usage:
+        >>> joiner = ClassificationJoiner()
+        >>> minerals = joiner.join(GeomaterialRetriever().get_dict()['results'])
+        >>> minerals[0]['strunz10_path']
+    """
+
+    def __init__(self, SYSTEMS = tuple(GEOMATERIAL_FIELDS), TREES = None):
+        systems = (SYSTEMS,) if isinstance(SYSTEMS, str) else tuple(SYSTEMS)
+        for system in systems:
+            if system not in GEOMATERIAL_FIELDS:
+                raise ValueError(f"Unknown classification: {system}\nPossible options: {tuple(GEOMATERIAL_FIELDS)}")
+        trees = TREES or {}
+        self._systems = [(system, GEOMATERIAL_FIELDS[system][0], GEOMATERIAL_FIELDS[system][1],
+                          trees.get(system) or get_tree(system), {}) for system in systems]
+
+    def required_fields(self):
+        '''
+        Returns the geomaterial fields the join reads, to be added to a fields() selection.
+        '''
+        return [field for _, fields, _, _, _ in self._systems for field in fields]
+
+    def join(self, RECORDS, INPLACE = False):
+        '''
+        Returns RECORDS with the classification fields added, as copies unless INPLACE is True.
+        '''
+        systems = [(system, fields, itemgetter(*fields), prefix + '_code', prefix + '_path', tree, memo)
+                   for system, fields, prefix, tree, memo in self._systems]
+        joined = []
+        for record in RECORDS:
+            if not INPLACE:
+                record = dict(record)
+            for system, fields, getter, code_field, path_field, tree, memo in systems:
+                # the raw field values are the memo key, so each distinct code is only resolved once
+                try:
+                    key = getter(record)
+                except KeyError:
+                    key = tuple(record.get(field) for field in fields)
+                cached = memo.get(key)
+                if cached is None:
+                    code = geomaterial_code(system, record)
+                    path = [{'code': node.code, 'level': node.level, 'name': node.name} for node in tree.path(code)] if code else []
+                    cached = memo[key] = (code, path)
+                record[code_field], record[path_field] = cached
+            joined.append(record)
+        return joined
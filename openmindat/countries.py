@@ -1,4 +1,5 @@
 from . import mindat_api
+from .tracing import traced
 
 
 class CountriesListRetriever:
@@ -102,6 +103,7 @@ class CountriesListRetriever:
         
         return self
     
+    @traced
     def saveto(self, OUTDIR = '', FILE_NAME = ''):
         '''
             Executes the query to retrieve the countries with keywords and saves the results to a specified directory.
@@ -148,6 +150,7 @@ class CountriesListRetriever:
         
         self.saveto('', file_name)
         
+    @traced
     def get_dict(self):
         '''
         Executes the query to retrieve the country data as a dictionary.
@@ -168,7 +171,7 @@ class CountriesListRetriever:
         ma = mindat_api.MindatApi()        
         #clears params for next get statement     
 
-        results = ma.get_mindat_json(params, end_point, verbose)
+        results = ma.get_cached_mindat_json(params, end_point, verbose)
            
         self._init_params()
         return results
@@ -280,6 +283,7 @@ class CountriesIdRetriever:
         
         return self
     
+    @traced
     def saveto(self, OUTDIR = '', FILE_NAME = ''):
         '''
             Executes the query to retrieve the countries with keywords and saves the results to a specified directory.
@@ -326,6 +330,7 @@ class CountriesIdRetriever:
         
         self.saveto('', file_name)
         
+    @traced
     def get_dict(self):
         '''
         Executes the query to retrieve the country data as a dictionary.
@@ -344,7 +349,7 @@ class CountriesIdRetriever:
         verbose = self.verbose_flag 
         
         ma = mindat_api.MindatApi()
-        results = ma.get_mindat_json(params, end_point, verbose)
+        results = ma.get_cached_mindat_json(params, end_point, verbose)
         
         self._init_params()
         return results
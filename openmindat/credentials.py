@@ -0,0 +1,424 @@
+import os
+import re
+import time
+import threading
+import multiprocessing
+
+import yaml
+
+from .ratelimit import RateLimiter
+
+
+# Environment variable of the single API key, and of the file it is stored in
+API_KEY_ENV = 'MINDAT_API_KEY'
+API_KEY_FILE_ENV = 'MINDAT_API_KEY_FILE'
+DEFAULT_API_KEY_FILE = './.apikey.yaml'
+
+# Set (to anything but '' or '0') in services and batch jobs that must fail instead of asking for a key
+NONINTERACTIVE_ENV = 'MINDAT_NONINTERACTIVE'
+
+
+# Environment variable listing the keys of a pool: "KEY1,KEY2:2.5,..." with an optional requests-per-second quota per key
+POOL_ENV = 'MINDAT_API_KEYS'
+
+# Seconds a key rests after a 429 response without a Retry-After header, doubled on every further 429
+THROTTLE_BACKOFF = 5.0
+MAX_BACKOFF = 300.0
+
+# Seconds a key rests after a server error or a failed connection
+ERROR_BACKOFF = 1.0
+
+_KEY_FORMAT = re.compile(r'^[A-Za-z0-9]{32}$')
+
+
+class ApiKey:
+    """
+    One key of a CredentialPool with its quota and health. The key itself is left out of repr() and stats().
+
+    Attributes:
+        name (str): A label for logs and stats, e.g. 'key1' or 'team-a'.
+        rate (float): Requests per second allowed for the key, None for no quota.
+        requests (int): Requests sent with the key.
+        throttled (int): 429 responses received.
+        errors (int): Server errors and failed connections.
+        disabled (bool): Set after a 401/403 response; the key is not used again.
+    """
+
+    def __init__(self, KEY, RATE = None, NAME = None, BURST = None):
+        if not _KEY_FORMAT.match(KEY):
+            raise ValueError(f"Invalid API key for {NAME or 'the pool'}: an OpenMindat API key is a 32-character string of letters and digits.")
+        self.key = KEY
+        self.name = NAME
+        self.rate = RATE
+        self.limiter = RateLimiter(RATE, BURST) if RATE is not None else None
+        self.in_flight = 0
+        self.requests = 0
+        self.throttled = 0
+        self.errors = 0
+        self.disabled = False
+        self.resting_until = 0.0
+        self._backoff = THROTTLE_BACKOFF
+
+    @property
+    def headers(self):
+        return {'Authorization': 'Token ' + self.key}
+
+    def __repr__(self):
+        return f"ApiKey({self.name!r}, rate={self.rate})"
+
+
+def _parse_spec(SPEC):
+    # "KEY", "KEY:RATE" or "NAME=KEY:RATE"
+    name = None
+    if '=' in SPEC:
+        name, SPEC = SPEC.split('=', 1)
+    key, _, rate = SPEC.partition(':')
+    return key.strip(), (float(rate) if rate.strip() else None), (name.strip() if name else None)
+
+
+class CredentialPool:
+    """
+    Several Mindat API keys used by one process. Every request borrows the key with the most room left
+    under its quota, so the load is spread across the keys in proportion to their rates and independent
+    pipelines don't queue on one key's budget. Responses are reported back to the pool: a 429 rests the
+    key for its Retry-After (or an exponential backoff), server errors rest it briefly, and a 401/403
+    disables it. When every key is resting, acquire() waits for the first one to come back.
+
+    Args:
+        KEYS: A list of keys or (key, rate) pairs, a dict of key -> rate, or ApiKey objects. A rate of
+            None means the key has no quota; such keys are balanced by the requests in flight.
+        BURST (int): Requests a key with a quota may send at once.
+
+    Usage:
+        >>> set_pool(CredentialPool({KEY_A: 5, KEY_B: 5, KEY_C: 2}))
+        >>> export MINDAT_API_KEYS="team-a=KEY_A:5,team-b=KEY_B:5"      # or from the environment
+        >>> get_pool().stats()
+
+    Press q to quit.
+    """
+
+    def __init__(self, KEYS, BURST = None):
+        if isinstance(KEYS, dict):
+            KEYS = list(KEYS.items())
+        keys = []
+        for i, item in enumerate(KEYS):
+            if isinstance(item, ApiKey):
+                api_key = item
+            elif isinstance(item, (tuple, list)):
+                api_key = ApiKey(item[0], item[1], 'key' + str(i + 1), BURST)
+            else:
+                api_key = ApiKey(item, None, 'key' + str(i + 1), BURST)
+            if api_key.name is None:
+                api_key.name = 'key' + str(i + 1)
+            keys.append(api_key)
+        if not keys:
+            raise ValueError("A CredentialPool needs at least one API key.")
+        if len({k.key for k in keys}) != len(keys):
+            raise ValueError("The same API key is listed more than once.")
+        self.keys = keys
+        self._condition = threading.Condition()
+
+    @classmethod
+    def from_env(cls, VARIABLE = POOL_ENV, BURST = None):
+        '''
+        Builds a pool from an environment variable of comma separated "KEY", "KEY:RATE" or "NAME=KEY:RATE" entries.
+        Returns None when the variable is not set.
+        '''
+        value = os.environ.get(VARIABLE, '').strip()
+        if not value:
+            return None
+        keys = []
+        for i, spec in enumerate(s for s in re.split(r'[,\s]+', value) if s):
+            key, rate, name = _parse_spec(spec)
+            keys.append(ApiKey(key, rate, name or 'key' + str(i + 1), BURST))
+        return cls(keys, BURST)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _pick(self, now):
+        # the usable key with the most unused quota; keys without a quota by fewest requests in flight
+        best = None
+        best_score = None
+        wait = None
+        for api_key in self.keys:
+            if api_key.disabled:
+                continue
+            if api_key.resting_until > now:
+                wait = min(wait, api_key.resting_until - now) if wait is not None else api_key.resting_until - now
+                continue
+            if api_key.limiter is not None:
+                limiter = api_key.limiter
+                tokens = limiter.available()
+                if tokens < 1:
+                    until = (1 - tokens) / limiter.rate
+                    wait = min(wait, until) if wait is not None else until
+                    continue
+                score = (0, -tokens / limiter.burst, api_key.in_flight / api_key.rate)
+            else:
+                score = (1, api_key.in_flight, api_key.requests)
+            if best_score is None or score < best_score:
+                best, best_score = api_key, score
+        return best, wait
+
+    def acquire(self):
+        '''
+        Borrows a key for one request, waiting while every key is resting or out of quota.
+        Give it back with release().
+        '''
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                api_key, wait = self._pick(now)
+                if api_key is not None:
+                    if api_key.limiter is not None:
+                        api_key.limiter.try_acquire()
+                    api_key.in_flight += 1
+                    api_key.requests += 1
+                    return api_key
+                if wait is None:
+                    raise RuntimeError("Every API key of the pool was rejected by the server (401/403), please check them.")
+                # woken early when a request finishes, since that may free a key
+                self._condition.wait(wait)
+
+    def release(self, API_KEY, STATUS_CODE = None, RETRY_AFTER = None):
+        '''
+        Returns a key after its request and records the outcome.
+
+        Args:
+            API_KEY (ApiKey): The key from acquire().
+            STATUS_CODE (int): The response status, None if the request failed without one.
+            RETRY_AFTER (str): The Retry-After header of a 429 response, if any.
+        '''
+        with self._condition:
+            API_KEY.in_flight -= 1
+            now = time.monotonic()
+            if STATUS_CODE == 429:
+                API_KEY.throttled += 1
+                try:
+                    rest = float(RETRY_AFTER)
+                except (TypeError, ValueError):
+                    rest = API_KEY._backoff
+                    API_KEY._backoff = min(API_KEY._backoff * 2, MAX_BACKOFF)
+                API_KEY.resting_until = now + rest
+            elif STATUS_CODE in (401, 403):
+                API_KEY.disabled = True
+            elif STATUS_CODE is None or STATUS_CODE >= 500:
+                API_KEY.errors += 1
+                API_KEY.resting_until = now + ERROR_BACKOFF
+            else:
+                API_KEY._backoff = THROTTLE_BACKOFF
+            self._condition.notify_all()
+
+    def usable(self):
+        '''
+        Returns the number of keys that are neither disabled nor resting.
+        '''
+        now = time.monotonic()
+        with self._condition:
+            return sum(1 for k in self.keys if not k.disabled and k.resting_until <= now)
+
+    def stats(self):
+        '''
+        Returns per-key counters and state, by key name.
+        '''
+        now = time.monotonic()
+        with self._condition:
+            return {k.name: {'rate': k.rate, 'requests': k.requests, 'in_flight': k.in_flight,
+                             'throttled': k.throttled, 'errors': k.errors, 'disabled': k.disabled,
+                             'resting': max(0.0, k.resting_until - now)} for k in self.keys}
+
+
+_pool = None
+_pool_loaded = False
+_pool_lock = threading.Lock()
+
+def get_pool():
+    '''
+    Returns the process-wide CredentialPool, read from MINDAT_API_KEYS on first use, or None when no pool is configured.
+    '''
+    global _pool, _pool_loaded
+    if not _pool_loaded:
+        with _pool_lock:
+            if not _pool_loaded:
+                _pool = CredentialPool.from_env()
+                _pool_loaded = True
+    return _pool
+
+
+def set_pool(POOL):
+    '''
+    Replaces the process-wide pool. Pass None to go back to the single key of MindatApiKeyManeger.
+    '''
+    global _pool, _pool_loaded
+    with _pool_lock:
+        _pool = POOL
+        _pool_loaded = True
+
+
+def prompt_allowed():
+    '''
+    Returns False in worker processes and when MINDAT_NONINTERACTIVE is set, where no one can answer a key prompt.
+    '''
+    if os.environ.get(NONINTERACTIVE_ENV, '') not in ('', '0'):
+        return False
+    return multiprocessing.parent_process() is None
+
+
+def get_api_key_path():
+    '''
+    Path of the stored API key: MINDAT_API_KEY_FILE if set, else ./.apikey.yaml in the working directory.
+    '''
+    return os.environ.get(API_KEY_FILE_ENV) or DEFAULT_API_KEY_FILE
+
+
+def read_api_key_file(PATH):
+    '''
+    Returns the key stored in a YAML file with an 'api_key' entry, or None if the file does not exist.
+    '''
+    try:
+        with open(os.path.expanduser(str(PATH)), 'r') as f:
+            data = yaml.safe_load(f)
+    except FileNotFoundError:
+        return None
+    return data.get('api_key') if isinstance(data, dict) else None
+
+
+class KeyProvider:
+    """
+    A non-interactive chain of places to find the API key, tried in this order: the explicit API_KEY, the
+    ENV environment variable, the YAML file at PATH, and CALLBACK (e.g. a keyring or secrets manager lookup).
+    The first source giving a well-formed key wins; nothing prompts and nothing is written.
+
+    Args:
+        API_KEY (str): An explicit key.
+        PATH (str): A YAML file with an 'api_key' entry. Defaults to get_api_key_path().
+        CALLBACK (callable): Called without arguments, returns a key or None.
+        ENV (str): The environment variable to read.
+
+    Usage:
+        >>> key, source = KeyProvider(CALLBACK=lambda: keyring.get_password('mindat', 'api')).resolve()
+    """
+
+    def __init__(self, API_KEY = None, PATH = None, CALLBACK = None, ENV = API_KEY_ENV):
+        self.api_key = API_KEY
+        self.path = PATH
+        self.callback = CALLBACK
+        self.env = ENV
+
+    def _sources(self):
+        yield 'argument', lambda: self.api_key
+        yield 'environment variable ' + self.env, lambda: os.environ.get(self.env)
+        path = self.path if self.path is not None else get_api_key_path()
+        yield 'file ' + str(path), lambda: read_api_key_file(path)
+        if self.callback is not None:
+            yield 'callback', self.callback
+
+    def resolve(self):
+        '''
+        Returns (key, source) for the first source with a well-formed key. Raises RuntimeError if none has one.
+        '''
+        tried = []
+        for source, read in self._sources():
+            key = read()
+            if not key:
+                tried.append(source)
+                continue
+            key = str(key).strip()
+            if not _KEY_FORMAT.match(key):
+                raise ValueError(f"Invalid API key from {source}: an OpenMindat API key is a 32-character string of letters and digits.")
+            return key, source
+        raise RuntimeError(f"No Mindat API key found, tried: {', '.join(tried)}. Get one at https://www.mindat.org/a/how_to_get_my_mindat_api_key")
+
+
+# the key of this process once it has been validated, shared by every MindatApi instance
+_api_key = None
+
+def get_api_key():
+    '''
+    Returns the validated API key of this process, or None when none has been configured yet.
+    '''
+    return _api_key
+
+
+def set_api_key(API_KEY):
+    '''
+    Sets the process-wide key without validating it, e.g. in a worker whose parent validated it. Pass None to clear it.
+    '''
+    global _api_key
+    _api_key = API_KEY
+
+
+def configure_api_key(API_KEY = None, PATH = None, CALLBACK = None, VALIDATE = True):
+    '''
+    Finds the API key with a KeyProvider, checks it against the API once and makes it the key of every
+    MindatApi in this process, so no instance reads files, sends a validation request or prompts.
+    Call it once in the parent before starting workers; see worker_initializer for passing it on.
+
+    Args:
+        API_KEY (str), PATH (str), CALLBACK (callable): The KeyProvider sources.
+        VALIDATE (bool): Send one request to check the key.
+
+    Returns:
+        str: The source the key came from.
+
+    Example:
+        >>> configure_api_key(PATH='/etc/mindat/apikey.yaml')
+        'file /etc/mindat/apikey.yaml'
+    '''
+    key, source = KeyProvider(API_KEY, PATH, CALLBACK).resolve()
+    if VALIDATE:
+        from .mindat_api import MindatApiKeyManeger
+        status_code = MindatApiKeyManeger().get_api_key_status(key)
+        if status_code in (401, 403):
+            raise ValueError(f"The Mindat API rejected the key from {source}.")
+        if status_code != 200:
+            raise RuntimeError(f"Could not validate the Mindat API key, the server answered {status_code}.")
+    set_api_key(key)
+    return source
+
+
+def worker_initializer(API_KEY, POOL_KEYS = None, API_URL = None):
+    '''
+    Initializes a worker process with the parent's validated key (and credential pool and API url), without
+    any file access, validation request or prompt. Use the pair from worker_init_args():
+
+    Each worker gets its own CredentialPool: quotas are enforced per process, and a key's health (a 429 rest
+    or a 401 disabling it) is only known to the process that saw the response. worker_init_args() therefore
+    gives every worker its share of each key's rate and burst, and leaves out keys the parent has disabled.
+
+    Example:
+        >>> initializer, initargs = worker_init_args(WORKERS=8)
+        >>> ProcessPoolExecutor(8, initializer=initializer, initargs=initargs)
+    '''
+    set_api_key(API_KEY)
+    if POOL_KEYS:
+        set_pool(CredentialPool([ApiKey(key, rate, name, burst) for key, rate, name, burst in POOL_KEYS]))
+    if API_URL:
+        os.environ['MINDAT_API_URL'] = API_URL
+
+
+def worker_init_args(WORKERS = 1):
+    '''
+    Returns (worker_initializer, initargs) carrying this process's key, pool and API url to worker processes.
+    Configures the key with configure_api_key() first if that has not been done.
+
+    Args:
+        WORKERS (int): Number of worker processes sending requests at the same time. Every pool key's rate
+            and burst are divided between them, so together they stay within the key's quota. Requests the
+            parent keeps sending itself are not counted; include the parent in WORKERS if it does.
+    '''
+    if not isinstance(WORKERS, int) or WORKERS < 1:
+        raise ValueError(f"Invalid WORKERS: {WORKERS}\nPlease retry.")
+    pool = get_pool()
+    if get_api_key() is None and pool is None:
+        configure_api_key()
+    pool_keys = None
+    if pool is not None:
+        pool_keys = [(k.key, k.rate / WORKERS if k.rate is not None else None, k.name,
+                      max(1.0, k.limiter.burst / WORKERS) if k.limiter is not None else None)
+                     for k in pool.keys if not k.disabled]
+        if not pool_keys:
+            raise RuntimeError("Every API key of the pool was rejected by the server (401/403), please check them.")
+    from .mindat_api import get_api_url
+    return worker_initializer, (get_api_key(), pool_keys, get_api_url())
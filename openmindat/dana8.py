@@ -1,4 +1,6 @@
 from . import mindat_api
+from .tracing import traced
+from . import classification
 
 #todo: Check back in when retrieve and id functions are implemented
 
@@ -14,6 +16,7 @@ class DanaRetriever:
         id: N/A
         groups: returns group information
         subgroups: returns subgroup information
+        get_tree: returns the whole classification as a ClassificationTree
 
     Usage:
         >>> dr = DanaRetriever()
@@ -163,6 +166,7 @@ class DanaRetriever:
         
         return self
     
+    @traced
     def saveto(self, OUTDIR = '', FILE_NAME = ''):
         '''
             Executes the query to retrieve the dana-8 data with keywords and saves the results to a specified directory.
@@ -213,6 +217,7 @@ class DanaRetriever:
         
         self.saveto('', file_name)
         
+    @traced
     def get_dict(self):
         '''
         Executes the query to retrieve the dana-8 data as a dictionary.
@@ -234,11 +239,34 @@ class DanaRetriever:
             end_point = '/'.join(['dana-8', self.sub_endpoint])
         
         ma = mindat_api.MindatApi()
-        results = ma.get_mindat_json(params, end_point, verbose)
+        results = ma.get_cached_mindat_json(params, end_point, verbose)
         
         self._init_params()
         return results
     
+    @traced
+    def get_tree(self, REFRESH = False):
+        '''
+        Returns the whole dana-8 classification as a ClassificationTree, with all levels downloaded
+        concurrently and cached under ./mindat_data/classification/ for later calls and sessions.
+        Codes can then be classified locally, e.g. tree.classify('2.1.3.1') or tree.path('2.1.3.1').
+
+        Args:
+            REFRESH (bool): Download the classification again even if the cached copy is still fresh.
+
+        Returns:
+            ClassificationTree: The classification tree.
+
+        Example:
+            >>> dr = DanaRetriever()
+            >>> tree = dr.get_tree()
+            >>> tree.path('2.1.3.1')
+        '''
+        tree = classification.ClassificationTree.build(self.end_point, REFRESH=REFRESH)
+
+        self._init_params()
+        return tree
+
     def available_methods(self):
         '''
         Prints the available methods of the class.
@@ -1,4 +1,9 @@
 from . import mindat_api
+from .tracing import traced
+from . import classification
+from . import relations
+from . import search
+from . import chemistry
 from datetime import datetime
 
 class GeomaterialRetriever:
@@ -1300,6 +1305,7 @@ class GeomaterialRetriever:
         
         return self
 
+    @traced
     def saveto(self, OUTDIR = '', FILE_NAME = ''):
         '''
         Executes the query to retrieve the list of geomaterials and saves the results to a specified directory.
@@ -1348,13 +1354,15 @@ class GeomaterialRetriever:
         
         self.saveto('', file_name)
     
-    def saveto_ttl(self, OUTDIR = '', FILE_NAME = ''):
+    @traced
+    def saveto_ttl(self, OUTDIR = '', FILE_NAME = '', WORKERS = 0):
         '''
             Executes the query to retrieve the Geomaterials with keywords and saves the results to a specified directory as a ttl file.
 
             Args:
                 OUTDIR (str): The directory path where the retrieved Geomaterials will be saved. If not provided, the current directory will be used.
                 FILE_NAME (str): An optional file name, if no input is given it uses the end point as a name
+                WORKERS (int): Worker processes converting the pages to RDF while the next ones download; 0 converts them in this process.
 
             Returns:
                 None
@@ -1371,7 +1379,7 @@ class GeomaterialRetriever:
         verbose = self.verbose_flag
 
         ma = mindat_api.MindatApi()
-        ma.download_mindat_ttl(params, end_point, outdir, file_name, verbose)
+        ma.download_mindat_ttl(params, end_point, outdir, file_name, verbose, WORKERS)
 
         # reset the query parameters in case the user wants to make another query
         self._init_params()
@@ -1394,6 +1402,7 @@ class GeomaterialRetriever:
         
         self.saveto_ttl('', file_name)
             
+    @traced
     def get_ttl(self):
         '''
             Executes the query to retrieve the Geomaterials with keywords and saves the results to a specified directory as a ttl file.
@@ -1421,6 +1430,7 @@ class GeomaterialRetriever:
         self._init_params()
         return g.serialize(format='turtle')
 
+    @traced
     def terse_IMA_ttl(self, OUTDIR = '', FILE_NAME = ''):
         '''
             Executes the query to retrieve the Geomaterials with IMA approved status and saves the results to a specified directory as a ttl file. There is
@@ -1448,6 +1458,7 @@ class GeomaterialRetriever:
         # reset the query parameters in case the user wants to make another query
         self._init_params()
 
+    @traced
     def get_dict(self):
         '''
         Executes the query to retrieve the list of geomaterials and returns the json object.
@@ -1466,11 +1477,114 @@ class GeomaterialRetriever:
         verbose = self.verbose_flag
         
         ma = mindat_api.MindatApi()
-        results = ma.get_mindat_json(params, end_point, verbose)
+        results = ma.get_cached_mindat_json(params, end_point, verbose)
         
         self._init_params()
         return results
     
+    @traced
+    def get_classified_dict(self, SYSTEMS = ('nickel-strunz-10', 'dana-8')):
+        '''
+        Executes the query like get_dict() and attaches the Nickel-Strunz and/or Dana classification of every
+        geomaterial as '<prefix>_code' and '<prefix>_path' (prefixes strunz10 and dana8), resolved locally
+        against the cached classification trees. If fields() was used, the strunz10ed*/dana8ed* fields are added to it.
+
+        Args:
+            SYSTEMS (tuple of str): 'nickel-strunz-10', 'dana-8' or both.
+
+        Returns:
+            dict: The json object with classified results.
+
+        Example:
+            >>> gr = GeomaterialRetriever()
+            >>> minerals = gr.ima(True).get_classified_dict()
+            >>> minerals['results'][0]['strunz10_path']
+        '''
+        joiner = classification.ClassificationJoiner(SYSTEMS)
+
+        mindat_api.add_fields(self._params, joiner.required_fields())
+
+        results = self.get_dict()
+        if isinstance(results.get('results'), list):
+            joiner.join(results['results'], INPLACE=True)
+        return results
+    
+    @traced
+    def get_graph(self):
+        '''
+        Executes the query and builds a GeomaterialGraph over the synid, varietyof, polytypeof and groupid
+        relations, for local variety/synonym/group lookups and transitive closures. Unless fields() was used,
+        only id, name and the relation fields are requested; otherwise they are added to the selection.
+
+        Returns:
+            GeomaterialGraph: The relation graph, which can be saved with .save(PATH) and reloaded with GeomaterialGraph.load(PATH).
+
+        Example:
+            >>> gr = GeomaterialRetriever()
+            >>> graph = gr.get_graph()
+            >>> graph.closure('Quartz')
+        '''
+        mindat_api.add_fields(self._params, ['id', 'name'] + list(relations.RELATIONS), RESTRICT=True)
+
+        ma = mindat_api.MindatApi()
+        graph = relations.GeomaterialGraph()
+        for page_results in ma.iter_mindat_pages(self._params, self.end_point, self.verbose_flag):
+            graph.add_records(page_results if isinstance(page_results, list) else [page_results])
+
+        self._init_params()
+        return graph
+    
+    @traced
+    def get_search_index(self):
+        '''
+        Executes the query and builds a GeomaterialSearchIndex over name, formulas, colour, streak,
+        crystal system and short description, for offline keyword, prefix and fuzzy search with BM25 ranking.
+        If fields() was used, the indexed fields are added to the selection.
+
+        Returns:
+            GeomaterialSearchIndex: The index, which can be saved with .save(PATH) and reloaded with GeomaterialSearchIndex.load(PATH).
+
+        Example:
+            >>> gr = GeomaterialRetriever()
+            >>> index = gr.get_search_index()
+            >>> index.search("quartz, green, hexa")
+        '''
+        mindat_api.add_fields(self._params, ['id'] + list(search.SEARCH_FIELDS))
+
+        ma = mindat_api.MindatApi()
+        index = search.GeomaterialSearchIndex()
+        for page_results in ma.iter_mindat_pages(self._params, self.end_point, self.verbose_flag):
+            index.add_records(page_results if isinstance(page_results, list) else [page_results])
+
+        self._init_params()
+        return index
+    
+    @traced
+    def get_formula_index(self):
+        '''
+        Executes the query and compiles every formula into a FormulaIndex, for local element and
+        stoichiometry queries such as a Cu:S ratio near 1:1 or at least two of Fe, Mn and Ni.
+        Unless fields() was used, only id, name and the formula fields are requested; otherwise they are
+        added to the selection.
+
+        Returns:
+            FormulaIndex: The index, which can be saved with .save(PATH) and reloaded with FormulaIndex.load(PATH).
+
+        Example:
+            >>> gr = GeomaterialRetriever()
+            >>> index = gr.ima(True).get_formula_index()
+            >>> index.ratio('CuS', TOLERANCE=0.05)
+        '''
+        mindat_api.add_fields(self._params, ['id', 'name'] + list(chemistry.FORMULA_FIELDS), RESTRICT=True)
+
+        ma = mindat_api.MindatApi()
+        index = chemistry.FormulaIndex()
+        for page_results in ma.iter_mindat_pages(self._params, self.end_point, self.verbose_flag):
+            index.add_records(page_results if isinstance(page_results, list) else [page_results])
+
+        self._init_params()
+        return index
+    
     def available_methods(self):
         '''
         Prints the available methods of the class.
@@ -1626,6 +1740,7 @@ class GeomaterialIdRetriever:
         
         return self
     
+    @traced
     def saveto(self, OUTDIR = '', FILE_NAME = ''):
         '''
             Executes the query to retrieve the Geomaterials with keywords and saves the results to a specified directory.
@@ -1679,6 +1794,7 @@ class GeomaterialIdRetriever:
         
         self.saveto('', file_name)
         
+    @traced
     def get_dict(self):
         '''
         Executes the query to retrieve geomaterial with a corresponding id and returns a dictionary.
@@ -1697,7 +1813,7 @@ class GeomaterialIdRetriever:
         end_point = '/'.join([self.end_point, self.sub_endpoint])
         
         ma = mindat_api.MindatApi()
-        results = ma.get_mindat_json(params, end_point, verbose)
+        results = ma.get_cached_mindat_json(params, end_point, verbose)
         
         self._init_params()
         return results
@@ -1800,6 +1916,7 @@ class GeomaterialDictRetriever:
         
         return self
     
+    @traced
     def saveto(self, OUTDIR = '', FILE_NAME = ''):
         '''
             Executes the query to retrieve the Geomaterials with keywords and saves the results to a specified directory.
@@ -1846,6 +1963,7 @@ class GeomaterialDictRetriever:
         
         self.saveto('', file_name)   
         
+    @traced
     def get_dict(self):
         '''
         Executes the query to retrieve the dictionary of geomaterials.
@@ -1864,7 +1982,7 @@ class GeomaterialDictRetriever:
         verbose = self.verbose_flag
 
         ma = mindat_api.MindatApi()
-        results = ma.get_mindat_json(params, end_point, verbose)
+        results = ma.get_cached_mindat_json(params, end_point, verbose)
         
         self._init_params()
         return results
@@ -1,4 +1,5 @@
 from . import mindat_api
+from .tracing import traced
 
 class GeomaterialSearchRetriever:
     """
@@ -9,6 +10,7 @@ class GeomaterialSearchRetriever:
         geomaterials_search(KEYWORDS): Updates the search query with specified keywords.
         saveto(OUTDIR): Executes the search query and saves the data to a specified directory.
         save(): Executes the search query and saves the data to the current directory.
+        search_local(INDEX, LIMIT): Answers the search query from a local GeomaterialSearchIndex instead of the server.
 
     Usage:
         >>> gsr = GeomaterialSearchRetriever()
@@ -93,6 +95,7 @@ class GeomaterialSearchRetriever:
         
         return self
     
+    @traced
     def saveto(self, OUTDIR = '', FILE_NAME = ''):
         '''
             Executes the query to retrieve the geomaterials with keywords and saves the results to a specified directory.
@@ -131,6 +134,7 @@ class GeomaterialSearchRetriever:
         
         self.saveto('', file_name)
         
+    @traced
     def get_dict(self):
         '''
         Executes the query to retrieve the geomaterial search data as a dictionary.
@@ -149,11 +153,36 @@ class GeomaterialSearchRetriever:
         verbose = self.verbose_flag
         
         ma = mindat_api.MindatApi()
-        results = ma.get_mindat_json(params, end_point, verbose)
+        results = ma.get_cached_mindat_json(params, end_point, verbose)
         
         self._init_params()
         return results
     
+    def search_local(self, INDEX, LIMIT = 10):
+        '''
+        Answers the keywords set with geomaterials_search() from a local GeomaterialSearchIndex, without a request.
+        The last keyword also matches as a prefix and misspelt keywords match within one edit, which suits
+        typeahead boxes that search on every keystroke.
+
+        Args:
+            INDEX (GeomaterialSearchIndex): Built with GeomaterialRetriever().get_search_index().
+            LIMIT (int): Maximum number of results.
+
+        Returns:
+            list of dictionaries, best match first.
+
+        Example:
+            >>> index = GeomaterialRetriever().get_search_index()
+            >>> gsr = GeomaterialSearchRetriever()
+            >>> gsr.geomaterials_search("quartz, gre").search_local(index)
+        '''
+        keywords = self._params.get('q', '')
+
+        results = [record for _, record in INDEX.search(keywords, LIMIT)]
+
+        self._init_params()
+        return results
+
     def available_methods(self):
         '''
         Prints the available methods of the class.
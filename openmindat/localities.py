@@ -1,5 +1,21 @@
 from . import mindat_api
+from .tracing import traced
+from . import spatial
+from . import partitions
+from . import progress
+from . import reference
+from . import ratelimit
 from datetime import datetime
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import os
+import json
+import time
+
+
+# Country/region names accepted by the localities country filter
+VALID_COUNTRIES = ["162173 Ryugu","Abkhazia","Aegean Sea Plate","Afghanistan","Africa","African Plate","Akrotiri and Dhekelia","Albania","Algeria","Altiplano Plate","Amur Plate","Anatolia Plate","Andorra","Angola","Anguilla","Antarctic Meteorites","Antarctic Plate","Antarctica","Antigua and Barbuda","Arabian Peninsula","Arabian Plate","Arctic Ocean","Argentina","Argentina/Chile","Armenia","Asia","Asia/Europe","Atlantic Ocean","Australia","Australian Plate","Austria","Azerbaijan","Bahamas","Bailiwick of Guernsey","Balmoral Reef Plate","Baltic Sea","Baltic Shield (Fennoscandian Shield)","Banda Sea Plate","Bangladesh","Barbados","Belarus","Belgium","Belize","Belize/Guatemala","Benin","Bermuda","Bhutan","Birds Head Plate","Bolivia","Borneo","Bosnia and Herzegovina","Botswana","Brazil","British Virgin Islands","British and Irish Isles","Brunei","Bulgaria","Burkina Faso","Burma Plate","Burundi","Cambodia","Cameroon","Canada","Cape Verde","Caribbean Plate","Caroline Plate","Cayman Islands","Central Africa","Central African Republic","Central America","Central Asia","Ceres","Chad","Channel Islands","Charon","Chile","China","Cocos Plate","Colombia","Comoro Islands","Comoros","Conway Reef Plate","Cook Islands","Costa Rica","Croatia","Cuba","Cyprus","Czech Republic","Czech Republic/Germany/Poland","Czech Republic/Poland","Czechoslovakia","DR Congo","Denmark","Djibouti","Dominica","Dominican Republic","Earth","East Timor","Easter Plate","Ecuador","Egypt","El Salvador","Equatorial Guinea","Eritrea","Estonia","Eswatini","Ethiopia","Eurasian Plate","Europa","Europe","Falkland Islands","Faroe Islands","Federated States of Micronesia","Fiji","Finland","Finland/Russia","France","French Polynesia","French Southern and Antarctic Lands","Futuna Plate","Gabon","Galapagos Plate","Gambia","Georgia","Germany","Germany/Belgium","Germany/Czech Republic","Germany/Poland","Ghana","Gibraltar","Greece","Greenland","Grenada","Guatemala","Guinea","Guinea-Bissau","Guyana","Haiti","Hans Island","Honduras","Hungary","Iberian Peninsula","Iceland","Ilemi Triangle","India","Indian Ocean","Indian Plate (India Plate)","Indonesia","Io","Iran","Iraq","Ireland","Ireland (island)","Island of Cyprus","Isle of Man","Israel","Italy","Ivory Coast","Jamaica","Japan","Jersey","Jordan","Juan Fernandez Plate","Juan de Fuca Plate","Kazakhstan","Kazakhstan/Russia","Kenya","Kiribati","Korea","Korean Peninsula","Kosovo","Kuwait","Kyrgyzstan","Laos","Latvia","Lebanon","Lesotho","Liberia","Libya","Liechtenstein","Lithuania","Luxembourg","Madagascar","Malawi","Malawi/Mozambique/Tanzania","Malaysia","Maldives","Mali","Malta","Manus Plate","Maoke Plate","Mariana Plate","Mars","Marshall Islands","Mauritania","Mauritius","Mercury","Mexico","Middle East","Mimas","Moldova","Molucca Sea Plate","Monaco","Mongolia","Montenegro","Montserrat","Morocco","Mozambique","Myanmar","Namibia","Nauru","Nazca Plate","Nepal","Netherlands","Netherlands Antilles","New Guinea","New Hebrides Plate","New Zealand","Nicaragua","Niger","Nigeria","Niuafo'ou Plate","Niue","North Africa","North America","North America Plate","North Andes plate","North Atlantic Igneous Province","North Bismarck Plate","North Korea","North Macedonia","North Sea","Northern Cyprus","Northern Mariana Islands","Northwest Africa","Northwest Africa Meteorites","Norway","Okhotsk Plate","Okinawa Plate","Oman","Outer Space","Pacific Ocean","Pacific Plate","Pakistan","Palau","Palestine","Panama","Panama Plate","Papua New Guinea","Paraguay","Persian Gulf","Peru","Philippine Sea Plate","Philippines","Phobos","Pitcairn Islands","Pluto","Poland","Portugal","Puerto Rico","Qatar","Red Sea","Republic of the Congo","Rivera Plate","Romania","Russia","Rwanda","Réunion Island","Saint Helena","Saint Helena， Ascension and Tristan da Cunha","Saint Kitts and Nevis","Saint Lucia","Saint Martin","Saint Vincent and the Grenadines","Samoa","Samoan Islands","San Marino","Sandwich Plate","Saudi Arabia","Scandinavia","Scotia Plate","Senegal","Serbia","Serbia and Montenegro","Seychelles","Shetland Plate","Sierra Leone","Singapore","Slovakia","Slovenia","Solomon Islands","Solomon Sea Plate","Somali Plate","Somalia","Somaliland","South Africa","South America","South America Plate","South Bismarck Plate","South China Sea","South Georgia and the South Sandwich Islands","South Kordofan Sudan","South Korea","South Ossetia","South Sudan","Southern Africa","Soviet Union (1922-1991)","Spain","Sri Lanka","Sudan","Sunda Plate","Suriname","Swaziland","Sweden","Switzerland","Syria","São Tomé and Príncipe","Taiwan","Tajikistan","Tanzania","Thailand","The Caribbean","The Moon","Timor Plate","Togo","Tonga","Tonga Plate","Trinidad and Tobago","Triton","Tunisia","Turkestan","Turkey","Turkmenistan","Turks and Caicos Islands","Tuvalu","U.S. Virgin Islands","UK","USA","Uganda","Ukraine","United Arab Emirates","United States Minor Outlying Islands","Uruguay","Uzbekistan","Vanuatu","Venezuela","Venus","Vermont","Vietnam","West Africa","Western Sahara","Woodlark Plate","Yangtze Plate","Yellow Sea","Yemen","Zambia","Zimbabwe"]
+
 
 class LocalitiesRetriever:
     """
@@ -28,6 +44,11 @@ class LocalitiesRetriever:
         updated_at(DATE_STR): Sets the last updated datetime for the query.
         saveto(OUTDIR): Executes the query and saves the results to the specified directory.
         save(): Executes the query and saves the results to the current directory.
+        get_spatial_index(CELL_SIZE): Executes the query and builds a LocalityIndex for bbox, radius and nearest queries.
+        saveto_partitioned(OUTDIR, DIR_NAME, PRECISION, FORMAT): Executes the query and saves the results partitioned by geohash.
+        saveto_sharded(OUTDIR, FILE_NAME, COUNTRIES, WORKERS, RESUME): Runs the query as parallel, resumable per-country shards and merges them.
+        iter_enriched(JOINS, REGISTRY): Streams the results joined with their type, status, age and country records.
+        saveto_enriched(OUTDIR, FILE_NAME, JOINS, REGISTRY, SEQUENCE): Streams the enriched results to a file.
 
     Press q to quit.
     """
@@ -62,7 +83,7 @@ class LocalitiesRetriever:
             >>> lr.country("USA")
             >>> lr.saveto()
         '''
-        valid_options = ["162173 Ryugu","Abkhazia","Aegean Sea Plate","Afghanistan","Africa","African Plate","Akrotiri and Dhekelia","Albania","Algeria","Altiplano Plate","Amur Plate","Anatolia Plate","Andorra","Angola","Anguilla","Antarctic Meteorites","Antarctic Plate","Antarctica","Antigua and Barbuda","Arabian Peninsula","Arabian Plate","Arctic Ocean","Argentina","Argentina/Chile","Armenia","Asia","Asia/Europe","Atlantic Ocean","Australia","Australian Plate","Austria","Azerbaijan","Bahamas","Bailiwick of Guernsey","Balmoral Reef Plate","Baltic Sea","Baltic Shield (Fennoscandian Shield)","Banda Sea Plate","Bangladesh","Barbados","Belarus","Belgium","Belize","Belize/Guatemala","Benin","Bermuda","Bhutan","Birds Head Plate","Bolivia","Borneo","Bosnia and Herzegovina","Botswana","Brazil","British Virgin Islands","British and Irish Isles","Brunei","Bulgaria","Burkina Faso","Burma Plate","Burundi","Cambodia","Cameroon","Canada","Cape Verde","Caribbean Plate","Caroline Plate","Cayman Islands","Central Africa","Central African Republic","Central America","Central Asia","Ceres","Chad","Channel Islands","Charon","Chile","China","Cocos Plate","Colombia","Comoro Islands","Comoros","Conway Reef Plate","Cook Islands","Costa Rica","Croatia","Cuba","Cyprus","Czech Republic","Czech Republic/Germany/Poland","Czech Republic/Poland","Czechoslovakia","DR Congo","Denmark","Djibouti","Dominica","Dominican Republic","Earth","East Timor","Easter Plate","Ecuador","Egypt","El Salvador","Equatorial Guinea","Eritrea","Estonia","Eswatini","Ethiopia","Eurasian Plate","Europa","Europe","Falkland Islands","Faroe Islands","Federated States of Micronesia","Fiji","Finland","Finland/Russia","France","French Polynesia","French Southern and Antarctic Lands","Futuna Plate","Gabon","Galapagos Plate","Gambia","Georgia","Germany","Germany/Belgium","Germany/Czech Republic","Germany/Poland","Ghana","Gibraltar","Greece","Greenland","Grenada","Guatemala","Guinea","Guinea-Bissau","Guyana","Haiti","Hans Island","Honduras","Hungary","Iberian Peninsula","Iceland","Ilemi Triangle","India","Indian Ocean","Indian Plate (India Plate)","Indonesia","Io","Iran","Iraq","Ireland","Ireland (island)","Island of Cyprus","Isle of Man","Israel","Italy","Ivory Coast","Jamaica","Japan","Jersey","Jordan","Juan Fernandez Plate","Juan de Fuca Plate","Kazakhstan","Kazakhstan/Russia","Kenya","Kiribati","Korea","Korean Peninsula","Kosovo","Kuwait","Kyrgyzstan","Laos","Latvia","Lebanon","Lesotho","Liberia","Libya","Liechtenstein","Lithuania","Luxembourg","Madagascar","Malawi","Malawi/Mozambique/Tanzania","Malaysia","Maldives","Mali","Malta","Manus Plate","Maoke Plate","Mariana Plate","Mars","Marshall Islands","Mauritania","Mauritius","Mercury","Mexico","Middle East","Mimas","Moldova","Molucca Sea Plate","Monaco","Mongolia","Montenegro","Montserrat","Morocco","Mozambique","Myanmar","Namibia","Nauru","Nazca Plate","Nepal","Netherlands","Netherlands Antilles","New Guinea","New Hebrides Plate","New Zealand","Nicaragua","Niger","Nigeria","Niuafo'ou Plate","Niue","North Africa","North America","North America Plate","North Andes plate","North Atlantic Igneous Province","North Bismarck Plate","North Korea","North Macedonia","North Sea","Northern Cyprus","Northern Mariana Islands","Northwest Africa","Northwest Africa Meteorites","Norway","Okhotsk Plate","Okinawa Plate","Oman","Outer Space","Pacific Ocean","Pacific Plate","Pakistan","Palau","Palestine","Panama","Panama Plate","Papua New Guinea","Paraguay","Persian Gulf","Peru","Philippine Sea Plate","Philippines","Phobos","Pitcairn Islands","Pluto","Poland","Portugal","Puerto Rico","Qatar","Red Sea","Republic of the Congo","Rivera Plate","Romania","Russia","Rwanda","Réunion Island","Saint Helena","Saint Helena， Ascension and Tristan da Cunha","Saint Kitts and Nevis","Saint Lucia","Saint Martin","Saint Vincent and the Grenadines","Samoa","Samoan Islands","San Marino","Sandwich Plate","Saudi Arabia","Scandinavia","Scotia Plate","Senegal","Serbia","Serbia and Montenegro","Seychelles","Shetland Plate","Sierra Leone","Singapore","Slovakia","Slovenia","Solomon Islands","Solomon Sea Plate","Somali Plate","Somalia","Somaliland","South Africa","South America","South America Plate","South Bismarck Plate","South China Sea","South Georgia and the South Sandwich Islands","South Kordofan Sudan","South Korea","South Ossetia","South Sudan","Southern Africa","Soviet Union (1922-1991)","Spain","Sri Lanka","Sudan","Sunda Plate","Suriname","Swaziland","Sweden","Switzerland","Syria","São Tomé and Príncipe","Taiwan","Tajikistan","Tanzania","Thailand","The Caribbean","The Moon","Timor Plate","Togo","Tonga","Tonga Plate","Trinidad and Tobago","Triton","Tunisia","Turkestan","Turkey","Turkmenistan","Turks and Caicos Islands","Tuvalu","U.S. Virgin Islands","UK","USA","Uganda","Ukraine","United Arab Emirates","United States Minor Outlying Islands","Uruguay","Uzbekistan","Vanuatu","Venezuela","Venus","Vermont","Vietnam","West Africa","Western Sahara","Woodlark Plate","Yangtze Plate","Yellow Sea","Yemen","Zambia","Zimbabwe"]
+        valid_options = VALID_COUNTRIES
         
         if COUNTRY_STR is not None:
             if isinstance(COUNTRY_STR, str):
@@ -376,6 +397,7 @@ class LocalitiesRetriever:
         
         return self
     
+    @traced
     def saveto(self, OUTDIR = '', FILE_NAME = ''):
         '''
             Executes the query to retrieve the localities with keywords and saves the results to a specified directory.
@@ -423,13 +445,312 @@ class LocalitiesRetriever:
         self.saveto('', file_name)
         
     
-    def saveto_ttl(self, OUTDIR = '', FILE_NAME = ''):
+    @traced
+    def saveto_partitioned(self, OUTDIR = '', DIR_NAME = '', PRECISION = 3, FORMAT = 'jsonl'):
+        '''
+            Executes the query and saves the localities partitioned by the geohash prefix of their coordinates:
+            one compact file per partition plus a manifest.json listing each partition's cell and row count.
+            A map viewport then only needs to read the partitions it overlaps, see GeohashPartitions.
+            Pages are partitioned as they arrive, so the full result is never held in memory.
+
+            Args:
+                OUTDIR (str): The parent directory. If not provided, ./mindat_data/ will be used.
+                DIR_NAME (str): The partition directory name, defaults to '<end point>_geohash'.
+                PRECISION (int): Geohash prefix length; 3 gives cells of about 156 x 156 km.
+                FORMAT (str): 'jsonl' or 'parquet' (requires pyarrow).
+
+            Returns:
+                None
+
+            Example:
+                >>> lr = LocalitiesRetriever()
+                >>> lr.country("USA").saveto_partitioned("/path/to/directory", PRECISION=4)
+        '''
+        mindat_api.add_fields(self._params, ['latitude', 'longitude'])
+
+        dir_name = DIR_NAME if DIR_NAME else self.end_point + '_geohash'
+        verbose = self.verbose_flag
+
+        ma = mindat_api.MindatApi()
+        directory = ma.get_file_path(OUTDIR, dir_name, '')
+
+        with partitions.GeohashPartitionWriter(directory, PRECISION, FORMAT, self.end_point) as writer:
+            for page_results in ma.iter_mindat_pages(self._params, self.end_point, verbose):
+                writer.write_records(page_results if isinstance(page_results, list) else [page_results])
+
+        if verbose > 0:
+            print("Successfully saved " + str(writer.count) + " entries to " + str(directory.resolve()))
+
+        # reset the query parameters in case the user wants to make another query
+        self._init_params()
+
+    def _shard_query(self, COUNTRY):
+        # every shard runs the same filters, only the country differs
+        params = dict(self._params)
+        params['country'] = COUNTRY
+        params.pop('page', None)
+        return params
+
+    def _read_shard(self, SHARD_PATH, FINGERPRINT):
+        # the first line of a shard file holds its country and query, the records follow one per line;
+        # returns the number of records of a shard made by the same query, else None
+        try:
+            with open(SHARD_PATH, 'r') as f:
+                header = json.loads(f.readline())
+                if not isinstance(header, dict) or header.get('query') != FINGERPRINT:
+                    return None
+                return sum(1 for _ in f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _iter_shard(self, SHARD_PATH):
+        with open(SHARD_PATH, 'r') as f:
+            f.readline()
+            for line in f:
+                yield json.loads(line)
+
+    def _fetch_shard(self, ma, COUNTRY, SHARD_PATH, FINGERPRINT, RESUME, PRIORITY = 'bulk'):
+        if RESUME:
+            count = self._read_shard(SHARD_PATH, FINGERPRINT)
+            if count is not None:
+                return count, True
+
+        # streamed to disk page by page under a temporary name, so a large shard is never held in memory
+        # and an interrupted crawl never leaves a truncated shard behind
+        part_path = SHARD_PATH.with_name(SHARD_PATH.name + '.part')
+        count = 0
+        try:
+            with open(part_path, 'w') as f:
+                f.write(json.dumps({'country': COUNTRY, 'query': FINGERPRINT}, separators=(',', ':')) + '\n')
+                with ratelimit.priority(PRIORITY):
+                    for page_results in ma.iter_mindat_pages(self._shard_query(COUNTRY), self.end_point, 0):
+                        records = page_results if isinstance(page_results, list) else [page_results]
+                        f.write(''.join(json.dumps(record, separators=(',', ':')) + '\n' for record in records))
+                        count += len(records)
+        except BaseException:
+            if part_path.exists():
+                part_path.unlink()
+            raise
+        os.replace(part_path, SHARD_PATH)
+        return count, False
+
+    @traced
+    def saveto_sharded(self, OUTDIR = '', FILE_NAME = '', COUNTRIES = None, WORKERS = 4, RESUME = True):
+        '''
+            Executes the query as one sub-query per country/region, runs the shards in parallel and merges them
+            into a single file with duplicates (localities listed under overlapping regions) removed by id.
+            Every shard is streamed to its own file under <FILE_NAME>_shards/ as its pages arrive, and the shards
+            are then streamed into the merged file, so only the ids of the localities are held in memory.
+            The shard files double as a cache: an interrupted or partly failed crawl only fetches the missing
+            shards when it is run again. The other filters of the query apply to every shard.
+
+            Only localities whose country is one of the shards are fetched, so choose COUNTRIES to cover the table.
+
+            Args:
+                OUTDIR (str): The directory path where the merged file and the shard cache will be saved. If not provided, ./mindat_data/ will be used.
+                FILE_NAME (str): An optional file name, if no input is given it uses the end point as a name
+                COUNTRIES (list of str): The shards. Defaults to every country from the countries endpoint.
+                WORKERS (int): Number of shards fetched at the same time.
+                RESUME (bool): Reuse shards cached by an earlier run of the same query.
+
+            Returns:
+                dict: Crawl summary with 'shards', 'cached', 'failed', 'rows', 'duplicates' and 'unique' counts.
+
+            Example:
+                >>> lr = LocalitiesRetriever()
+                >>> lr.elements_inc("Cu").saveto_sharded("/path/to/directory", WORKERS=8)
+        '''
+        if 'country' in self._params:
+            raise ValueError("saveto_sharded() sets the country of each shard, please do not combine it with country().")
+        if not isinstance(WORKERS, int) or WORKERS < 1:
+            raise ValueError(f"Invalid WORKERS: {WORKERS}\nPlease retry.")
+
+        mindat_api.add_fields(self._params, ['id'])
+
+        if COUNTRIES is None:
+            from .countries import CountriesListRetriever
+            countries = [c['text'] for c in CountriesListRetriever().verbose(0).get_dict()['results'] if c.get('text')]
+        else:
+            countries = [COUNTRIES] if isinstance(COUNTRIES, str) else list(COUNTRIES)
+        countries = list(dict.fromkeys(countries))
+
+        file_name = FILE_NAME if FILE_NAME else self.end_point
+        verbose = self.verbose_flag
+        fingerprint = {k: v for k, v in self._params.items() if k not in ('country', 'page')}
+
+        ma = mindat_api.MindatApi()
+        shard_dir = ma.get_file_path(OUTDIR, file_name + '_shards', '')
+        shard_dir.mkdir(parents=True, exist_ok=True)
+
+        reporter = progress.get_reporter(verbose)
+        reporter.start(self.end_point, None, True)
+
+        # the shards are bulk requests unless the caller set a priority class; worker threads don't inherit it
+        priority = ratelimit.current_priority() or 'bulk'
+        shard_paths = {}
+        failed = {}
+        cached = 0
+        try:
+            with ThreadPoolExecutor(max_workers=WORKERS) as executor:
+                futures = {}
+                for country in countries:
+                    shard_path = ma.get_file_path(shard_dir, country, '.jsonl')
+                    shard_paths[country] = shard_path
+                    futures[executor.submit(self._fetch_shard, ma, country, shard_path, fingerprint, RESUME, priority)] = (country, time.perf_counter())
+
+                for future in as_completed(futures):
+                    country, started = futures[future]
+                    try:
+                        count, from_cache = future.result()
+                    except Exception as e:
+                        failed[country] = repr(e)
+                        reporter.retry(self.end_point, 1, "shard " + country + " failed: " + repr(e))
+                        continue
+                    cached += from_cache
+                    reporter.page(self.end_point, count, 0, time.perf_counter() - started)
+        finally:
+            reporter.close(self.end_point)
+
+        if failed:
+            self._init_params()
+            raise RuntimeError(f"{len(failed)} of {len(countries)} shards failed, run the crawl again to retry them: {failed}")
+
+        # the shards are streamed from their files into the output in shard order, so the output does not
+        # depend on which shard finished first; only the ids seen so far are kept in memory
+        file_path = ma.get_file_path(OUTDIR, file_name)
+        part_path = file_path.with_name(file_path.name + '.part')
+        seen = set()
+        rows = 0
+        unique = 0
+        try:
+            with open(part_path, 'w') as f:
+                f.write('{"results": [\n')
+                for country in countries:
+                    for record in self._iter_shard(shard_paths[country]):
+                        rows += 1
+                        record_id = record.get('id')
+                        if record_id is not None:
+                            if record_id in seen:
+                                continue
+                            seen.add(record_id)
+                        if unique:
+                            f.write(',\n')
+                        f.write(json.dumps(record))
+                        unique += 1
+                f.write('\n], "count": ' + str(unique) + '}\n')
+        except BaseException:
+            if part_path.exists():
+                part_path.unlink()
+            raise
+        os.replace(part_path, file_path)
+
+        summary = {'shards': len(countries), 'cached': cached, 'failed': len(failed),
+                   'rows': rows, 'duplicates': rows - unique, 'unique': unique}
+
+        if verbose > 0:
+            print("Successfully saved " + str(unique) + " entries to " + str(file_path.resolve()))
+            print(f"Shards: {summary['shards']} ({summary['cached']} from cache), duplicates removed: {summary['duplicates']}")
+
+        # reset the query parameters in case the user wants to make another query
+        self._init_params()
+        return summary
+
+    def iter_enriched(self, JOINS = None, REGISTRY = None):
+        '''
+        Executes the query and yields the localities one at a time, each joined with its reference records
+        (locality_status, locality_type, locality_age and countries by default) as '<field>_detail' entries.
+        The reference tables come from a cached ReferenceRegistry, so no request is made per locality.
+        If fields() was used, the joined fields are added to the requested fields.
+
+        Args:
+            JOINS (dict): Locality field -> (reference table, table field), defaults to reference.DEFAULT_JOINS.
+            REGISTRY (ReferenceRegistry): Defaults to the process-wide registry.
+
+        Returns:
+            generator of dictionaries.
+
+        Example:
+            >>> lr = LocalitiesRetriever()
+            >>> for locality in lr.country("France").iter_enriched():
+            ...     print(locality['txt'], locality['loctype_detail'])
+        '''
+        enricher = reference.Enricher(REGISTRY, JOINS)
+        # with fields(), the joined fields have to be selected too
+        params = mindat_api.add_fields(dict(self._params), list(enricher.joins))
+        end_point = self.end_point
+        verbose = self.verbose_flag
+
+        # reset the query parameters in case the user wants to make another query
+        self._init_params()
+
+        def records():
+            ma = mindat_api.MindatApi()
+            for page_results in ma.iter_mindat_pages(params, end_point, verbose):
+                yield from enricher.enrich_many(page_results if isinstance(page_results, list) else [page_results])
+
+        return records()
+
+    @traced
+    def saveto_enriched(self, OUTDIR = '', FILE_NAME = '', JOINS = None, REGISTRY = None, SEQUENCE = False):
+        '''
+            Executes the query and writes the enriched localities (see iter_enriched) to a file as the pages arrive,
+            so neither the localities nor the joined result are held in memory.
+
+            Args:
+                OUTDIR (str): The directory path where the file will be saved. If not provided, ./mindat_data/ will be used.
+                FILE_NAME (str): An optional file name, if no input is given it uses '<end point>_enriched' as a name
+                JOINS (dict): Locality field -> (reference table, table field), defaults to reference.DEFAULT_JOINS.
+                REGISTRY (ReferenceRegistry): Defaults to the process-wide registry.
+                SEQUENCE (bool): Write JSON lines (.jsonl, one locality per line) instead of a json file with a results list.
+
+            Returns:
+                None
+
+            Example:
+                >>> lr = LocalitiesRetriever()
+                >>> lr.country("France").saveto_enriched("/path/to/directory", SEQUENCE=True)
+        '''
+        file_name = FILE_NAME if FILE_NAME else self.end_point + '_enriched'
+        verbose = self.verbose_flag
+
+        ma = mindat_api.MindatApi()
+        file_path = ma.get_file_path(OUTDIR, file_name, '.jsonl' if SEQUENCE else '.json')
+
+        # written under a temporary name, so an interrupted download never leaves a truncated file behind
+        part_path = file_path.with_name(file_path.name + '.part')
+        count = 0
+        try:
+            with open(part_path, 'w') as f:
+                if not SEQUENCE:
+                    f.write('{"results": [\n')
+                for record in self.iter_enriched(JOINS, REGISTRY):
+                    if SEQUENCE:
+                        f.write(json.dumps(record, separators=(',', ':')) + '\n')
+                    else:
+                        if count:
+                            f.write(',\n')
+                        f.write(json.dumps(record))
+                    count += 1
+                if not SEQUENCE:
+                    f.write('\n], "count": ' + str(count) + '}\n')
+        except BaseException:
+            if part_path.exists():
+                part_path.unlink()
+            raise
+        os.replace(part_path, file_path)
+
+        if verbose > 0:
+            print("Successfully saved " + str(count) + " entries to " + str(file_path.resolve()))
+
+    @traced
+    def saveto_ttl(self, OUTDIR = '', FILE_NAME = '', WORKERS = 0):
         '''
             Executes the query to retrieve the Geomaterials with keywords and saves the results to a specified directory as a ttl file.
 
             Args:
                 OUTDIR (str): The directory path where the retrieved Geomaterials will be saved. If not provided, the current directory will be used.
                 FILE_NAME (str): An optional file name, if no input is given it uses the end point as a name
+                WORKERS (int): Worker processes converting the pages to RDF while the next ones download; 0 converts them in this process.
 
             Returns:
                 None
@@ -446,7 +767,7 @@ class LocalitiesRetriever:
         verbose = self.verbose_flag
 
         ma = mindat_api.MindatApi()
-        ma.download_mindat_ttl(params, end_point, outdir, file_name, verbose)
+        ma.download_mindat_ttl(params, end_point, outdir, file_name, verbose, WORKERS)
 
         # reset the query parameters in case the user wants to make another query
         self._init_params()
@@ -470,6 +791,7 @@ class LocalitiesRetriever:
         
         self.saveto_ttl('', file_name)
             
+    @traced
     def get_ttl(self):
         '''
             Executes the query to retrieve the Geomaterials with keywords and saves the results to a specified directory as a ttl file.
@@ -497,6 +819,7 @@ class LocalitiesRetriever:
         self._init_params()
         return g.serialize(format='turtle')
         
+    @traced
     def get_dict(self):
         '''
         Executes the query to retrieve the list of localities and returns the json object.
@@ -515,10 +838,38 @@ class LocalitiesRetriever:
         verbose = self.verbose_flag
         
         ma = mindat_api.MindatApi()
-        results = ma.get_mindat_json(params, end_point, verbose)
+        results = ma.get_cached_mindat_json(params, end_point, verbose)
         
         self._init_params()
         return results
+
+    @traced
+    def get_spatial_index(self, CELL_SIZE = 0.25):
+        '''
+        Executes the query and builds a LocalityIndex over the latitude/longitude of the results,
+        for local bounding-box, radius and k-nearest queries. Pages are added to the index as they arrive.
+        If fields() was used, latitude and longitude are added to the requested fields.
+
+        Args:
+            CELL_SIZE (float): Grid cell size of the index in degrees.
+
+        Returns:
+            LocalityIndex: The index, which can be saved with .save(PATH) and reloaded with LocalityIndex.load(PATH).
+
+        Example:
+            >>> lr = LocalitiesRetriever()
+            >>> index = lr.country("USA").get_spatial_index()
+            >>> index.radius(-116.99, 46.73, 25)
+        '''
+        mindat_api.add_fields(self._params, ['latitude', 'longitude'])
+
+        ma = mindat_api.MindatApi()
+        index = spatial.LocalityIndex(CELL_SIZE=CELL_SIZE)
+        for page_results in ma.iter_mindat_pages(self._params, self.end_point, self.verbose_flag):
+            index.add_records(page_results if isinstance(page_results, list) else [page_results])
+
+        self._init_params()
+        return index
         
     def available_methods(self):
         '''
@@ -641,6 +992,7 @@ class LocalitiesIdRetriever:
         
         return self
     
+    @traced
     def saveto(self, OUTDIR = '', FILE_NAME = ''):
         '''
             Executes the query to retrieve the localities with keywords and saves the results to a specified directory.
@@ -687,6 +1039,7 @@ class LocalitiesIdRetriever:
         
         self.saveto('', file_name)
         
+    @traced
     def get_dict(self):
         '''
         Executes the query to retrieve locality with a corresponding id and returns a dictionary.
@@ -705,7 +1058,7 @@ class LocalitiesIdRetriever:
         end_point = '/'.join([self.end_point, self.sub_endpoint])
         
         ma = mindat_api.MindatApi()
-        results = ma.get_mindat_json(params, end_point, verbose)
+        results = ma.get_cached_mindat_json(params, end_point, verbose)
         
         self._init_params()
         return results
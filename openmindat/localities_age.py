@@ -1,4 +1,5 @@
 from . import mindat_api
+from .tracing import traced
 
 
 class LocalitiesAgeRetriever:
@@ -101,6 +102,7 @@ class LocalitiesAgeRetriever:
         
         return self
     
+    @traced
     def saveto(self, OUTDIR = '', FILE_NAME = ''):
         '''
             Executes the query to retrieve the localities with keywords and saves the results to a specified directory.
@@ -148,6 +150,7 @@ class LocalitiesAgeRetriever:
         
         self.saveto('', file_name)
         
+    @traced
     def get_dict(self):
         '''
         Executes the query to retrieve the locality age data as a list of dictionaries.
@@ -166,7 +169,7 @@ class LocalitiesAgeRetriever:
         verbose = self.verbose_flag
         
         ma = mindat_api.MindatApi()
-        results = ma.get_mindat_json(params, end_point, verbose)
+        results = ma.get_cached_mindat_json(params, end_point, verbose)
             
         self._init_params()
         return results
@@ -299,6 +302,7 @@ class LocalitiesAgeIdRetriever:
         
         return self
     
+    @traced
     def saveto(self, OUTDIR = '', FILE_NAME = ''):
         '''
             Executes the query to retrieve the localities with keywords and saves the results to a specified directory.
@@ -345,6 +349,7 @@ class LocalitiesAgeIdRetriever:
         
         self.saveto('', file_name)
         
+    @traced
     def get_dict(self):
         '''
         Executes the query to retrieve locality with a corresponding id and returns a dictionary.
@@ -363,7 +368,7 @@ class LocalitiesAgeIdRetriever:
         end_point = '/'.join([self.end_point, self.sub_endpoint])
         
         ma = mindat_api.MindatApi()
-        results = ma.get_mindat_json(params, end_point, verbose)
+        results = ma.get_cached_mindat_json(params, end_point, verbose)
         
         self._init_params()
         return results
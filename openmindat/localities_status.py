@@ -1,4 +1,5 @@
 from . import mindat_api
+from .tracing import traced
 
 
 class LocalitiesStatusRetriever:
@@ -101,6 +102,7 @@ class LocalitiesStatusRetriever:
         
         return self
     
+    @traced
     def saveto(self, OUTDIR = '', FILE_NAME = ''):
         '''
             Executes the query to retrieve the localities with keywords and saves the results to a specified directory.
@@ -152,6 +154,7 @@ class LocalitiesStatusRetriever:
         
         self.saveto('', file_name)
         
+    @traced
     def get_dict(self):
         '''
         Executes the query to retrieve the locality status data as a list of dictionaries.
@@ -170,7 +173,7 @@ class LocalitiesStatusRetriever:
         verbose = self.verbose_flag
         
         ma = mindat_api.MindatApi()
-        results = ma.get_mindat_json(params, end_point, verbose)
+        results = ma.get_cached_mindat_json(params, end_point, verbose)
             
         self._init_params()
         return results
@@ -302,6 +305,7 @@ class LocalitiesStatusIdRetriever:
         
         return self
     
+    @traced
     def saveto(self, OUTDIR = '', FILE_NAME = ''):
         '''
             Executes the query to retrieve the localities with keywords and saves the results to a specified directory.
@@ -348,6 +352,7 @@ class LocalitiesStatusIdRetriever:
         
         self.saveto('', file_name)
         
+    @traced
     def get_dict(self):
         '''
         Executes the query to retrieve locality status with a corresponding id and returns a dictionary.
@@ -366,7 +371,7 @@ class LocalitiesStatusIdRetriever:
         end_point = '/'.join([self.end_point, self.sub_endpoint])
         
         ma = mindat_api.MindatApi()
-        results = ma.get_mindat_json(params, end_point, verbose)
+        results = ma.get_cached_mindat_json(params, end_point, verbose)
         
         self._init_params()
         return results
@@ -1,4 +1,5 @@
 from . import mindat_api
+from .tracing import traced
 
 
 class LocalitiesTypeRetriever:
@@ -101,6 +102,7 @@ class LocalitiesTypeRetriever:
         
         return self
     
+    @traced
     def saveto(self, OUTDIR = '', FILE_NAME = ''):
         '''
             Executes the query to retrieve the localities with keywords and saves the results to a specified directory.
@@ -152,6 +154,7 @@ class LocalitiesTypeRetriever:
         
         self.saveto('', file_name)
         
+    @traced
     def get_dict(self):
         '''
         Executes the query to retrieve the locality type data as a list of dictionaries.
@@ -169,7 +172,7 @@ class LocalitiesTypeRetriever:
         end_point = self.end_point
         
         ma = mindat_api.MindatApi()
-        results = ma.get_mindat_json(params, end_point, verbose)
+        results = ma.get_cached_mindat_json(params, end_point, verbose)
             
         self._init_params()
         return results
@@ -300,6 +303,7 @@ class LocalitiesTypeIdRetriever:
         
         return self    
     
+    @traced
     def saveto(self, OUTDIR = '', FILE_NAME = ''):
         '''
             Executes the query to retrieve the localities with keywords and saves the results to a specified directory.
@@ -346,6 +350,7 @@ class LocalitiesTypeIdRetriever:
         
         self.saveto('', file_name)
         
+    @traced
     def get_dict(self):
         '''
         Executes the query to retrieve locality type with a corresponding id and returns a dictionary.
@@ -364,7 +369,7 @@ class LocalitiesTypeIdRetriever:
         end_point = '/'.join([self.end_point, self.sub_endpoint])
         
         ma = mindat_api.MindatApi()
-        results = ma.get_mindat_json(params, end_point, verbose)
+        results = ma.get_cached_mindat_json(params, end_point, verbose)
         
         self._init_params()
         return results
@@ -1,4 +1,6 @@
 from . import mindat_api
+from .tracing import traced
+from . import spatial
 
 
 class GeoRegionRetriever:
@@ -10,10 +12,15 @@ class GeoRegionRetriever:
         page(INT): returns a page of localities.
         saveto(OUTDIR, FILENAME): Executes the search query and saves the data to a specified directory.
         save(FILENAME): Executes the search query and saves the data to the current directory.
+        simplify(TOLERANCES, PRECISION): Also saves simplified, lower precision copies of the regions.
+        saveto_geojson(OUTDIR, FILENAME, SEQUENCE): Streams the features to a GeoJSON file as the pages arrive.
+        get_index(): Builds a GeoRegionIndex for local point-in-region lookups.
 
     Usage:
         >>> grr = GeoRegionRetriever()
         >>> grr.page(2).save()
+        >>> grr.simplify([0.01, 0.1]).saveto_geojson()
+        >>> index = GeoRegionRetriever().get_index()
 
     Press q to quit.
     """
@@ -30,6 +37,7 @@ class GeoRegionRetriever:
         self.verbose_flag = 2
         self._params.clear()
         self._params = {'format': 'json'}
+        self._resolutions = []
         self.page_size(1500)
         
     def page_size(self, PAGE_SIZE):
@@ -101,6 +109,41 @@ class GeoRegionRetriever:
         
         return self
     
+    def simplify(self, TOLERANCES, PRECISION = None):
+        '''
+        Adds simplified outputs to the next save. Next to the full resolution file, one file per tolerance
+        is written (named <FILE_NAME>_t<TOLERANCE>), with the boundaries simplified by Douglas-Peucker
+        and the coordinates rounded, which shrinks the files by an order of magnitude for web maps.
+
+        Args:
+            TOLERANCES (float or list of floats): Simplification tolerances in degrees, e.g. [0.001, 0.01, 0.1].
+            PRECISION (int): Decimals kept in the simplified outputs. Defaults to one decimal finer than each tolerance.
+
+        Returns:
+            self: The GeoRegionRetriever object.
+
+        Example:
+            >>> grr = GeoRegionRetriever()
+            >>> grr.simplify([0.01, 0.1]).saveto("/path/to/directory")
+        '''
+        tolerances = TOLERANCES if isinstance(TOLERANCES, (list, tuple)) else [TOLERANCES]
+
+        for tolerance in tolerances:
+            if isinstance(tolerance, bool) or not isinstance(tolerance, (int, float)) or tolerance <= 0:
+                raise ValueError(f"Invalid TOLERANCE: {tolerance}\nTolerances must be positive numbers of degrees.")
+        if PRECISION is not None and (not isinstance(PRECISION, int) or PRECISION < 0):
+            raise ValueError(f"Invalid PRECISION: {PRECISION}\nPlease retry.")
+
+        for tolerance in tolerances:
+            precision = PRECISION if PRECISION is not None else spatial.default_precision(tolerance)
+            self._resolutions.append((tolerance, precision))
+
+        return self
+
+    def _resolution_name(self, FILE_NAME, TOLERANCE):
+        return f"{FILE_NAME}_t{TOLERANCE:g}"
+
+    @traced
     def saveto(self, OUTDIR = '', FILE_NAME = ''):
         '''
             Executes the query to retrieve the localities with keywords and saves the results to a specified directory.
@@ -125,11 +168,22 @@ class GeoRegionRetriever:
         
         ma = mindat_api.MindatApi()
         
-        if "page" in params:
+        if not self._resolutions:
             ma.download_mindat_json(params, end_point, outdir, file_name, verbose)
         else:
-            ma.download_mindat_json(params, end_point, outdir, file_name, verbose)
-            
+            json_data = ma.get_mindat_json(params, end_point, verbose)
+            ma.save_mindat_json(json_data, end_point, outdir, file_name, verbose)
+
+            base_name = file_name if file_name else end_point
+            results = json_data.get('results')
+            for tolerance, precision in self._resolutions:
+                if isinstance(results, dict):
+                    features = [spatial.simplify_feature(f, tolerance, precision) for f in results.get('features', [])]
+                    simplified = dict(json_data, results=dict(results, features=features))
+                else:
+                    simplified = dict(json_data, results=[spatial.simplify_feature(f, tolerance, precision) for f in results or []])
+                ma.save_mindat_json(simplified, end_point, outdir, self._resolution_name(base_name, tolerance), verbose, None)
+
 
         # Reset the query parameters in case the user wants to make another query.
         self._init_params()
@@ -151,7 +205,91 @@ class GeoRegionRetriever:
         file_name = FILE_NAME
         
         self.saveto('', file_name)
-        
+
+    def _iter_features(self, ma):
+        # locgeoregion2 pages are feature collections, streamed one page at a time
+        for page_results in ma.iter_mindat_pages(self._params, self.end_point, self.verbose_flag):
+            if isinstance(page_results, dict):
+                yield from page_results.get('features', [])
+            else:
+                yield from page_results
+
+    @traced
+    def saveto_geojson(self, OUTDIR = '', FILE_NAME = '', SEQUENCE = False):
+        '''
+            Executes the query and streams the georegion features to a GeoJSON file as the pages arrive,
+            so the full feature collection is never held in memory. With simplify(), every simplified
+            resolution is written alongside in the same pass.
+
+            Args:
+                OUTDIR (str): The directory path where the file will be saved. If not provided, ./mindat_data/ will be used.
+                FILE_NAME (str): An optional file name, if no input is given it uses the end point as a name
+                SEQUENCE (bool): Write newline-delimited GeoJSON (.geojsonl, one feature per line) instead of a FeatureCollection (.geojson).
+
+            Returns:
+                None
+
+            Example:
+                >>> grr = GeoRegionRetriever()
+                >>> grr.saveto_geojson("/path/to/directory", SEQUENCE=True)
+        '''
+        file_name = FILE_NAME if FILE_NAME else self.end_point
+        extension = '.geojsonl' if SEQUENCE else '.geojson'
+        verbose = self.verbose_flag
+
+        ma = mindat_api.MindatApi()
+        file_path = ma.get_file_path(OUTDIR, file_name, extension)
+
+        resolutions = [(tolerance, precision, ma.get_file_path(OUTDIR, self._resolution_name(file_name, tolerance), extension))
+                       for tolerance, precision in self._resolutions]
+
+        writer = spatial.GeoJSONWriter(file_path, SEQUENCE)
+        simplified_writers = [spatial.GeoJSONWriter(path, SEQUENCE) for _, _, path in resolutions]
+        # the writers fill .part files, moved into place only once every page has been written
+        try:
+            for w in [writer] + simplified_writers:
+                w.open()
+            for feature in self._iter_features(ma):
+                writer.write_feature(feature)
+                for (tolerance, precision, _), w in zip(resolutions, simplified_writers):
+                    w.write_feature(spatial.simplify_feature(feature, tolerance, precision))
+        except BaseException:
+            for w in [writer] + simplified_writers:
+                w.abort()
+            raise
+        for w in [writer] + simplified_writers:
+            w.close()
+
+        if verbose > 0:
+            print("Successfully saved " + str(writer.count) + " features to " + str(file_path.resolve()))
+            for _, _, path in resolutions:
+                print("Successfully saved " + str(writer.count) + " simplified features to " + str(path.resolve()))
+
+        # Reset the query parameters in case the user wants to make another query.
+        self._init_params()
+
+    @traced
+    def get_index(self):
+        '''
+            Executes the query and builds a GeoRegionIndex for local point-in-region lookups.
+            Pages are added to the index as they arrive instead of being merged into one collection first.
+
+            Returns:
+                GeoRegionIndex: The spatial index, which can be saved with .save(PATH) and reloaded with GeoRegionIndex.load(PATH).
+
+            Example:
+                >>> grr = GeoRegionRetriever()
+                >>> index = grr.get_index()
+                >>> index.lookup(-116.99, 46.73)
+        '''
+        ma = mindat_api.MindatApi()
+        index = spatial.GeoRegionIndex()
+        index.add_features(self._iter_features(ma))
+
+        self._init_params()
+        return index
+
+    @traced
     def get_dict(self):
         '''
         Executes the query to retrieve the geoRegion data as a list of dictionaries.
@@ -169,7 +307,7 @@ class GeoRegionRetriever:
         end_point = self.end_point
         
         ma = mindat_api.MindatApi()
-        results = ma.get_mindat_json(params, end_point, verbose)
+        results = ma.get_cached_mindat_json(params, end_point, verbose)
             
         self._init_params()
         return results
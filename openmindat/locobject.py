@@ -1,4 +1,5 @@
 from . import mindat_api
+from .tracing import traced
 
 
 class LocobjectRetriever:
@@ -84,6 +85,7 @@ class LocobjectRetriever:
         
         return self
     
+    @traced
     def saveto(self, OUTDIR = '', FILE_NAME = ''):
         '''
             Executes the query to retrieve the loc object with keywords and saves the results to a specified directory.
@@ -130,6 +132,7 @@ class LocobjectRetriever:
         
         self.saveto('', file_name)
         
+    @traced
     def get_dict(self):
         '''
         Executes the query to retrieve locobject with a corresponding id and returns a dictionary.
@@ -149,7 +152,7 @@ class LocobjectRetriever:
         end_point = '/'.join([self.end_point, self.sub_endpoint])
         
         ma = mindat_api.MindatApi()
-        results = ma.get_mindat_json(params, end_point, verbose)
+        results = ma.get_cached_mindat_json(params, end_point, verbose)
         
         self._init_params()
         return results
@@ -0,0 +1,262 @@
+import re
+import math
+import threading
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, math.inf)
+
+
+def normalize_endpoint(END_POINT):
+    '''
+    Replaces numeric path segments with {id} so that id lookups share one label, e.g. geomaterials/5 -> geomaterials/{id}.
+    '''
+    return re.sub(r'(^|/)\d+(?=/|$)', r'\1{id}', str(END_POINT).strip('/'))
+
+
+def _format_labels(LABELS):
+    if not LABELS:
+        return ''
+    parts = []
+    for key, value in LABELS:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{key}="{value}"')
+    return '{' + ','.join(parts) + '}'
+
+
+def _format_value(VALUE):
+    if VALUE == math.inf:
+        return '+Inf'
+    if float(VALUE).is_integer():
+        return str(int(VALUE))
+    return repr(float(VALUE))
+
+
+class Counter:
+    """
+    A monotonically increasing value per label set.
+
+    Usage:
+        >>> c = Counter('mindat_requests_total', 'Requests sent.', ('endpoint',))
+        >>> c.inc(endpoint='geomaterials')
+        >>> c.value(endpoint='geomaterials')
+        1.0
+    """
+
+    def __init__(self, NAME, HELP, LABEL_NAMES = ()):
+        self.name = NAME
+        self.help = HELP
+        self.label_names = tuple(LABEL_NAMES)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}, got {tuple(labels)}")
+        return tuple((name, labels[name]) for name in self.label_names)
+
+    def inc(self, AMOUNT = 1, **labels):
+        if AMOUNT < 0:
+            raise ValueError("Counters can only be increased.")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + AMOUNT
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self):
+        with self._lock:
+            return dict(self._values)
+
+    def to_prometheus(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        for key, value in sorted(self.samples().items()):
+            lines.append(f'{self.name}{_format_labels(key)} {_format_value(value)}')
+        return lines
+
+
+class Histogram:
+    """
+    Counts observations into cumulative buckets per label set, and estimates percentiles from them.
+
+    Usage:
+        >>> h = Histogram('mindat_request_duration_seconds', 'Request latency.', ('endpoint',))
+        >>> h.observe(0.2, endpoint='geomaterials')
+        >>> h.percentile(0.95, endpoint='geomaterials')
+    """
+
+    def __init__(self, NAME, HELP, LABEL_NAMES = (), BUCKETS = DEFAULT_BUCKETS):
+        buckets = sorted(float(b) for b in BUCKETS)
+        if not buckets or buckets[-1] != math.inf:
+            buckets.append(math.inf)
+
+        self.name = NAME
+        self.help = HELP
+        self.label_names = tuple(LABEL_NAMES)
+        self.buckets = tuple(buckets)
+        # label key -> [bucket counts..., sum, count]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}, got {tuple(labels)}")
+        return tuple((name, labels[name]) for name in self.label_names)
+
+    def observe(self, VALUE, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if VALUE <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += VALUE
+            state[-1] += 1
+
+    def count(self, **labels):
+        state = self._values.get(self._key(labels))
+        return state[-1] if state else 0
+
+    def sum(self, **labels):
+        state = self._values.get(self._key(labels))
+        return state[-2] if state else 0.0
+
+    def percentile(self, Q, **labels):
+        '''
+        Estimates the Q-th quantile (0 < Q <= 1) by linear interpolation inside the matching bucket.
+        Returns None when nothing was observed.
+        '''
+        if not 0 < Q <= 1:
+            raise ValueError("Q must be in (0, 1].")
+
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            state = list(state) if state else None
+        if not state or not state[-1]:
+            return None
+
+        rank = Q * state[-1]
+        seen = 0
+        lower = 0.0
+        for i, bound in enumerate(self.buckets):
+            in_bucket = state[i]
+            if seen + in_bucket >= rank and in_bucket:
+                if bound == math.inf:
+                    # nothing to interpolate against, report the largest finite bound
+                    return lower
+                return lower + (bound - lower) * (rank - seen) / in_bucket
+            seen += in_bucket
+            if bound != math.inf:
+                lower = bound
+        return lower
+
+    def samples(self):
+        with self._lock:
+            return {key: list(state) for key, state in self._values.items()}
+
+    def to_prometheus(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for key, state in sorted(self.samples().items()):
+            cumulative = 0
+            for i, bound in enumerate(self.buckets):
+                cumulative += state[i]
+                labels = key + (('le', _format_value(bound)),)
+                lines.append(f'{self.name}_bucket{_format_labels(labels)} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(key)} {_format_value(state[-2])}')
+            lines.append(f'{self.name}_count{_format_labels(key)} {state[-1]}')
+        return lines
+
+
+class MetricsRegistry:
+    """
+    The instrumentation surface of MindatApi. Every request records into the process-wide registry
+    returned by get_registry(), labelled by endpoint (numeric ids collapsed to {id}).
+
+    Attributes:
+        requests (Counter): HTTP requests sent, by endpoint and status code.
+        response_bytes (Counter): Response body bytes received, by endpoint.
+        rows (Counter): Result rows received, by endpoint.
+        retries (Counter): Retried page requests, by endpoint.
+        page_size_reductions (Counter): Times the page size was halved after a failed first page, by endpoint.
+        request_duration (Histogram): Wall time of each HTTP request, by endpoint.
+        phase_duration (Histogram): Time spent per phase, by endpoint and phase:
+            ttfb (request sent until headers parsed, includes DNS and connect), download (body transfer),
+            decode (JSON parsing), merge (appending the page to the result), write (saving to disk).
+
+    Usage:
+        >>> from openmindat.metrics import get_registry
+        >>> registry = get_registry()
+        >>> registry.request_duration.percentile(0.99, endpoint='localities')
+        >>> print(registry.to_prometheus())
+
+    Press q to quit.
+    """
+
+    def __init__(self):
+        self.requests = Counter('mindat_requests_total', 'HTTP requests sent to the Mindat API.', ('endpoint', 'status'))
+        self.response_bytes = Counter('mindat_response_bytes_total', 'Response body bytes received from the Mindat API.', ('endpoint',))
+        self.rows = Counter('mindat_rows_total', 'Result rows received from the Mindat API.', ('endpoint',))
+        self.retries = Counter('mindat_retries_total', 'Page requests retried after a failure.', ('endpoint',))
+        self.page_size_reductions = Counter('mindat_page_size_reductions_total', 'Times the page size was reduced after a failed request.', ('endpoint',))
+        self.coalesced = Counter('mindat_coalesced_queries_total', 'Queries answered by an identical query already in flight.', ('endpoint',))
+        self.request_duration = Histogram('mindat_request_duration_seconds', 'Wall time of HTTP requests to the Mindat API.', ('endpoint',))
+        self.phase_duration = Histogram('mindat_phase_duration_seconds', 'Time spent per processing phase.', ('endpoint', 'phase'))
+
+    def metrics(self):
+        return [self.requests, self.response_bytes, self.rows, self.retries,
+                self.page_size_reductions, self.coalesced, self.request_duration, self.phase_duration]
+
+    def record_request(self, END_POINT, RESPONSE, TOTAL_SECONDS):
+        '''
+        Records one HTTP response: counters, total latency, and the ttfb/download split
+        derived from requests' elapsed time (time until the headers were parsed).
+        '''
+        endpoint = normalize_endpoint(END_POINT)
+        body_bytes = len(RESPONSE.content)
+        ttfb = RESPONSE.elapsed.total_seconds() if RESPONSE.elapsed is not None else TOTAL_SECONDS
+
+        self.requests.inc(endpoint=endpoint, status=str(RESPONSE.status_code))
+        self.response_bytes.inc(body_bytes, endpoint=endpoint)
+        self.request_duration.observe(TOTAL_SECONDS, endpoint=endpoint)
+        self.phase_duration.observe(ttfb, endpoint=endpoint, phase='ttfb')
+        self.phase_duration.observe(max(TOTAL_SECONDS - ttfb, 0.0), endpoint=endpoint, phase='download')
+
+    def record_phase(self, END_POINT, PHASE, SECONDS):
+        self.phase_duration.observe(SECONDS, endpoint=normalize_endpoint(END_POINT), phase=PHASE)
+
+    def count(self, NAME, END_POINT, AMOUNT = 1):
+        '''
+        Increases one of the endpoint counters (rows, retries, page_size_reductions, coalesced) by AMOUNT.
+        '''
+        getattr(self, NAME).inc(AMOUNT, endpoint=normalize_endpoint(END_POINT))
+
+    def snapshot(self):
+        '''
+        Returns the current values as a plain dict: {metric name: {label tuple: value}}.
+        Histogram values are [bucket counts..., sum, count].
+        '''
+        return {metric.name: metric.samples() for metric in self.metrics()}
+
+    def reset(self):
+        self.__init__()
+
+    def to_prometheus(self):
+        '''
+        Returns all metrics in the Prometheus text exposition format.
+        '''
+        lines = []
+        for metric in self.metrics():
+            lines.extend(metric.to_prometheus())
+        return '\n'.join(lines) + '\n'
+
+
+_registry = MetricsRegistry()
+
+def get_registry():
+    '''
+    Returns the process-wide registry that MindatApi records into.
+    '''
+    return _registry
@@ -5,12 +5,18 @@ import json
 import yaml
 import requests
 import time
+import pickle
+import threading
 from pathlib import Path
 from datetime import datetime
 from json import JSONDecodeError
 import getpass
-from rdflib import Graph, Namespace, URIRef, Literal
-from rdflib.namespace import RDF, RDFS, OWL
+from . import progress
+from . import metrics
+from . import tracing
+from . import result_cache
+from . import ratelimit
+from . import credentials
 
 
 def in_notebook():
@@ -26,16 +32,188 @@ def in_notebook():
         return False
     return True
 
-if in_notebook():
-    from tqdm.notebook import tqdm
-else:
-    from tqdm import tqdm
+def get_api_url():
+    '''
+        Base url of the Mindat API, the MINDAT_API_URL environment variable overrides it
+        e.g. to point the package at openmindat.mock_server for offline runs
+    '''
+    return os.environ.get("MINDAT_API_URL", "https://api.mindat.org").rstrip('/')
+
+_tqdm = None
+
+def get_tqdm():
+    '''
+        Return the tqdm class suited to the running environment.
+        tqdm and IPython are only imported the first time a progress bar is needed.
+    '''
+    global _tqdm
+    if _tqdm is None:
+        if in_notebook():
+            from tqdm.notebook import tqdm
+        else:
+            from tqdm import tqdm
+        _tqdm = tqdm
+    return _tqdm
+
+
+# Connections kept open per host by the shared session, enough for the batch and sharded crawlers' threads
+POOL_SIZE = 32
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    '''
+        The requests.Session shared by every MindatApi instance and thread, so requests reuse
+        open connections to the API instead of a new TCP/TLS handshake per page
+    '''
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
+
+
+class _InFlightQuery:
+    # one running get_mindat_json call that identical calls wait on
+    __slots__ = ('done', 'result', 'error', 'followers')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+def _normalize_param(VALUE):
+    # list values are the multiple choice (OR) filters, e.g. crystal_system or cleavagetype, so their order
+    # doesn't matter; they stay a tuple, since requests sends them as repeated parameters and not as the
+    # single comma separated value of a string
+    if isinstance(VALUE, (list, tuple, set, frozenset)):
+        return tuple(sorted(str(v) for v in VALUE if v is not None))
+    return str(VALUE)
+
+def query_key(PARAM_DICT, END_POINT):
+    '''
+        Canonical form of a query: the endpoint and its parameters sorted by name, list values sorted
+        e.g. {'csystem': ['Trigonal', 'Hexagonal']} and {'csystem': ['Hexagonal', 'Trigonal']} give the same key,
+        but {'id__in': [1, 2]} and {'id__in': '1,2'} do not
+    '''
+    params = tuple(sorted(((str(k), _normalize_param(v)) for k, v in PARAM_DICT.items() if v is not None),
+                          key=lambda item: item[0]))
+    return (str(END_POINT).strip('/'), params)
+
+# fields() selections that already return every field
+FIELD_WILDCARDS = ('*', '~all')
+
+def add_fields(PARAMS, FIELDS, RESTRICT = False):
+    '''
+        Makes sure a query returns FIELDS, for methods that need some fields of every record (e.g. coordinates)
+        a fields() selection gets the missing ones appended; a wildcard selection ('*', '~all') is left alone
+        without a selection (or after fields(None)) every field is returned anyway, unless RESTRICT asks for
+        only FIELDS to be requested
+        returns PARAMS, which is changed in place
+    '''
+    selected = PARAMS.get('fields')
+    if selected is None:
+        if RESTRICT:
+            PARAMS['fields'] = ','.join(FIELDS)
+        return PARAMS
+    if isinstance(selected, (list, tuple)):
+        fields = [str(f).strip() for f in selected]
+    else:
+        fields = [f.strip() for f in str(selected).split(',')]
+    fields = [f for f in fields if f]
+    if any(f in FIELD_WILDCARDS for f in fields):
+        return PARAMS
+    PARAMS['fields'] = ','.join(fields + [f for f in FIELDS if f not in fields])
+    return PARAMS
+
+def build_ttl_graph(RECORDS, END_POINT, HEADER = True):
+    '''
+        Builds the rdflib Graph of a list of records, as saved by the saveto_ttl() methods
+        HEADER adds the class definitions of the endpoint; the pipeline leaves them out of all pages but the first
+    '''
+    # rdflib is slow to import, so it is only loaded when ttl output is requested
+    from rdflib import Graph, Namespace, URIRef, Literal
+    from rdflib.namespace import RDF, RDFS
+
+    ttl_endpoint = END_POINT
+    ttl_subendpoint = ''
+
+    #I would like to abstract this to work for dana-8 as well, but thinking about how I would automate the shortening of names like 'strunz'
+    if 'nickel-strunz-10' in ttl_endpoint:
+        ttl_subendpoint = ttl_endpoint.split("/",1)[1] if '/' in ttl_endpoint else 'strunz'
+        ttl_endpoint = ttl_endpoint.split("/",1)[0]
+
+
+    #defines a custome namespace for the graph
+    mindatNamespace = Namespace(f"https://www.mindat.org/{ttl_endpoint}/")
+
+    #creates graph and initial URI
+    g = Graph()
+    g.bind(ttl_endpoint, mindatNamespace)
+
+    #Defines the proper property based on the namespace            
+    uriDict = {'geomaterials': URIRef(f'https://www.mindat.org/geomaterials/geo'),
+            'localities': URIRef(f'https://www.mindat.org/localities/loc'),
+            'nickel-strunz-10': URIRef(f'https://www.mindat.org/nickel-strunz-10/{ttl_subendpoint}'),
+            'minerals_ima': URIRef(f'https://www.mindat.org/ima_minerals/min')}
+
+    if HEADER:
+        #initialized class info for endpoint, look into ways of adding more info here?
+        g.add((uriDict[ttl_endpoint], RDF.type, RDFS.Class))
+        g.add((uriDict[ttl_endpoint], RDFS.label, Literal(ttl_endpoint)))
+
+        #Preps the file to have minerals and IMA approved items.
+        if 'geomaterials' in ttl_endpoint or 'minerals_ima' in ttl_endpoint:
+            g.add((URIRef(f'https://www.mindat.org/geomaterials/Mineral'), RDF.type, RDFS.Class))
+            g.add((URIRef(f'https://www.mindat.org/geomaterials/Mineral'), RDFS.label, Literal("Mineral Species")))
+
+    #loop for creating the rdf graph
+    for dict in RECORDS:
+        #parses the empty values out of the data, may be too harsh since it 
+        #removes values of 0 from ints, which could be intentional or a placeholder value
+        parseddict = {k: v for k, v in dict.items() if v}
+
+        itemName = getattr(mindatNamespace, str(parseddict['id']))
+        #itemname is based on id
+
+        if "ima_status" in parseddict and ("APPROVED" in parseddict["ima_status"]):
+            g.add((itemName, RDF.type, RDFS.Class))
+            g.add((itemName, RDFS.subClassOf, URIRef(f'https://www.mindat.org/geomaterials/Mineral')))
+        else:
+            #creates the first entry by defining itemname as it's type, ex: 1023 a mineral:min
+            g.add((itemName, RDF.type, uriDict[ttl_endpoint]))
+
+        #iterates through the rest of the attributes and assigns them
+        for keys in parseddict:
+            if keys != 'id':
+                #creates the object value to be assigned
+                rdfObject = Literal(parseddict[keys])
+                #creates the predicate for the rdf statement
+                rdfPredicate = URIRef(f'https://www.mindat.org/{ttl_endpoint}/{keys}')
+                g.add((itemName, rdfPredicate, rdfObject))
+
+    return g
+
 
 class MindatApiKeyManeger:
     def __init__(self):
         pass
 
     def inspect_stored_api_key(self):
+        with tracing.start_span('MindatApiKeyManeger.inspect_stored_api_key'):
+            return self._inspect_stored_api_key()
+
+    def _inspect_stored_api_key(self):
         try:
             env_api_key = os.environ["MINDAT_API_KEY"]
             status_code = self.get_api_key_status(env_api_key)
@@ -46,7 +224,7 @@ class MindatApiKeyManeger:
             pass
 
         try:
-            with open('./.apikey.yaml', 'r') as f:
+            with open(credentials.get_api_key_path(), 'r') as f:
                 yaml_api_key = yaml.safe_load(f)['api_key']
             
             status_code = self.get_api_key_status(yaml_api_key)
@@ -59,6 +237,11 @@ class MindatApiKeyManeger:
         return False
     
     def get_api_key_input(self):
+        # a worker process or a service (MINDAT_NONINTERACTIVE) has no one to answer the prompt, so fail instead of waiting on stdin
+        if not credentials.prompt_allowed():
+            raise RuntimeError("No valid Mindat API key found and prompting is disabled in worker processes and with "
+                               "MINDAT_NONINTERACTIVE. Set MINDAT_API_KEY or MINDAT_API_KEY_FILE, or call "
+                               "openmindat.credentials.configure_api_key() in the parent process.")
         api_key = getpass.getpass("Input or get your Mindat API key at https://www.mindat.org/a/how_to_get_my_mindat_api_key: ")
 
         while False == self.is_valid_key_format(api_key):
@@ -71,7 +254,8 @@ class MindatApiKeyManeger:
             status_code = self.get_api_key_status(api_key)
 
         if 200 == status_code:
-            self._save_valid_api_key(api_key)
+            # only a key typed in here is stored, so the next session does not have to ask again
+            self._save_valid_api_key(api_key, WRITE_FILE=True)
         else:
             raise ValueError("Mindat server error, please try again later.")
         
@@ -88,11 +272,13 @@ class MindatApiKeyManeger:
         pattern = r'^[A-Za-z0-9]{32}$'
         return bool(re.match(pattern, KEY_INPUT))
         
-    def _save_valid_api_key(self, VALID_KEY):
+    def _save_valid_api_key(self, VALID_KEY, WRITE_FILE = False):
         os.environ["MINDAT_API_KEY"] = VALID_KEY
 
-        with open('./.apikey.yaml', 'w') as f:
-            yaml.dump({'api_key': VALID_KEY}, f)
+        # a key file set with MINDAT_API_KEY_FILE belongs to the user (e.g. a shared or read-only secret) and is never written
+        if WRITE_FILE and not os.environ.get(credentials.API_KEY_FILE_ENV):
+            with open(credentials.DEFAULT_API_KEY_FILE, 'w') as f:
+                yaml.dump({'api_key': VALID_KEY}, f)
         
         return True
     
@@ -100,31 +286,35 @@ class MindatApiKeyManeger:
         if os.environ.get("MINDAT_API_KEY"):
             api_key = os.environ.get("MINDAT_API_KEY")
         else:
-            with open('./.apikey.yaml', 'r') as f:
+            with open(credentials.get_api_key_path(), 'r') as f:
                 api_key = yaml.safe_load(f)['api_key']
         return api_key
     
     def reset_api_key(self):
+        credentials.set_api_key(None)
         try:
             del os.environ["MINDAT_API_KEY"]
         except KeyError:
             pass
         
-        try:
-            os.remove('./.apikey.yaml')
-        except FileNotFoundError:
-            pass
+        if not os.environ.get(credentials.API_KEY_FILE_ENV):
+            try:
+                os.remove(credentials.DEFAULT_API_KEY_FILE)
+            except FileNotFoundError:
+                pass
         return True
 
     def get_api_key_status(self, API_KEY):
         # test if api key is valid
         test_api_key = API_KEY
-        MINDAT_API_URL = "https://api.mindat.org"
+        MINDAT_API_URL = get_api_url()
         test_headers = {'Authorization': 'Token '+ test_api_key}
         test_params = {'format': 'json'}
-        test_response = requests.get(MINDAT_API_URL+"/geomaterials/",
-                                params=test_params,
-                                headers=test_headers)
+        with tracing.start_span('MindatApiKeyManeger.get_api_key_status') as span:
+            test_response = get_session().get(MINDAT_API_URL+"/geomaterials/",
+                                    params=test_params,
+                                    headers=test_headers)
+            span.set_attribute('status', test_response.status_code)
         
         return test_response.status_code
 
@@ -133,9 +323,23 @@ class MindatApi:
     '''The main class for openmindat API'''
     def __init__(self):
         self._api_key = None
-        self._prepare_api_key()
+        self._progress_reporter = None
+        self._metrics = metrics.get_registry()
+        # priority class of this instance's requests under a ratelimit.RequestScheduler, see set_priority
+        self._priority = None
+        # an extra limiter for this instance's requests only, waited on before the process-wide one, see set_rate_limiter
+        self._rate_limiter = None
+        # with a credential pool (MINDAT_API_KEYS) every request borrows a key from it, see _request_page
+        self._pool = credentials.get_pool()
+        if self._pool is not None:
+            self._api_key = self._pool.keys[0].key
+        elif credentials.get_api_key() is not None:
+            # validated earlier in this process (or by the parent of a worker), no file access or request needed
+            self._api_key = credentials.get_api_key()
+        else:
+            self._prepare_api_key()
 
-        self.MINDAT_API_URL = "https://api.mindat.org"
+        self.MINDAT_API_URL = get_api_url()
         self._headers = {'Authorization': 'Token '+ self._api_key}
         self.params = {'format': 'json'}
         self.data_dir = './mindat_data/'
@@ -147,6 +351,8 @@ class MindatApi:
             mam.get_api_key_input()
 
         self._api_key = mam.load_api_key()
+        # validated once, later instances in this process reuse it
+        credentials.set_api_key(self._api_key)
     
     def set_params(self, PARAMS_DICT):
         self.params = PARAMS_DICT
@@ -160,7 +366,7 @@ class MindatApi:
     def get_headers(self):
         return self._headers
     
-    def get_file_path(self, OUTDIR, FILE_NAME):
+    def get_file_path(self, OUTDIR, FILE_NAME, EXTENSION = '.json'):
         '''
             Reads an End_point
         '''
@@ -178,7 +384,7 @@ class MindatApi:
             out_dir = Path(OUTDIR)
         
         out_dir.mkdir(parents=True, exist_ok=True)
-        return Path(out_dir, file_name.replace('/', '_') + '.json')
+        return Path(out_dir, file_name.replace('/', '_') + EXTENSION)
     
     def get_ttl_file_path(self, OUTDIR, FILE_NAME):
         '''
@@ -207,45 +413,226 @@ class MindatApi:
         dt_string = now.strftime("%m%d%Y%H%M%S")
         return dt_string
     
-    def get_results(self, URL, json_data, pbar, VERBOSE = 2):
-        url = URL        
-        
+    def set_progress_reporter(self, REPORTER):
+        '''
+            Sets the progress reporter for this instance, overriding the verbose based default.
+            See openmindat.progress for the available events.
+        '''
+        self._progress_reporter = REPORTER
+
+    def set_priority(self, PRIORITY):
+        '''
+            Sets the priority class ('interactive' or 'bulk') of this instance's requests, used when
+            a ratelimit.RequestScheduler is installed. By default a request takes the class set with
+            ratelimit.priority(), else follow-up pages of multipage queries are 'bulk' and the rest 'interactive'.
+        '''
+        if PRIORITY is not None and PRIORITY not in ratelimit.PRIORITIES:
+            raise ValueError(f"Invalid PRIORITY: {PRIORITY}\nPossible options: {ratelimit.PRIORITIES}")
+        self._priority = PRIORITY
+        return self
+
+    def set_rate_limiter(self, LIMITER):
+        '''
+            Sets a ratelimit.RateLimiter for this instance's requests only, e.g. the shared limit of a batch.
+            It is waited on in addition to the process-wide limiter, which is left in place. Pass None to remove it.
+        '''
+        self._rate_limiter = LIMITER
+        return self
+
+    def _get_reporter(self, VERBOSE):
+        if self._progress_reporter is not None:
+            return self._progress_reporter
+        return progress.get_reporter(VERBOSE)
+
+    def _count_rows(self, RESULT_DATA):
+        # locgeoregion2 returns a feature collection instead of a list
+        if isinstance(RESULT_DATA, dict) and "features" in RESULT_DATA:
+            return len(RESULT_DATA["features"])
+        return len(RESULT_DATA)
+
+    def _request_page(self, URL, PARAMS, END_POINT, FOLLOW_UP = False):
+        '''
+            Sends one page request inside a 'page' span and records its metrics
+            waits for this instance's rate limiter and then the process-wide one, if set (see openmindat.ratelimit)
+            with a credential pool, the request is sent with the key that has the most quota left and
+            is sent again with another key after a 429/401/403, while the pool has usable keys
+            returns the response and its wall time in seconds
+        '''
+        priority = self._priority or ratelimit.current_priority() or ('bulk' if FOLLOW_UP else None)
+        waited = 0.0
+        for limiter in (self._rate_limiter, ratelimit.get_rate_limiter()):
+            if limiter is not None:
+                waited += limiter.acquire(PRIORITY=priority)
+        if waited:
+            self._metrics.record_phase(END_POINT, 'throttle', waited)
+
+        pool = self._pool
+        for attempt in range(len(pool) if pool is not None else 1):
+            api_key = pool.acquire() if pool is not None else None
+            response = None
+            try:
+                with tracing.start_span('page', end_point=END_POINT, url=URL) as span:
+                    start_time = time.perf_counter()
+                    response = get_session().get(URL, params=PARAMS, headers=api_key.headers if api_key else self._headers)
+                    latency = time.perf_counter() - start_time
+                    span.set_attribute('status', response.status_code)
+                    span.set_attribute('bytes', len(response.content))
+                    if api_key is not None:
+                        span.set_attribute('api_key', api_key.name)
+            finally:
+                # the key is given back whatever happened, or the pool would count it as busy for good
+                if api_key is not None:
+                    if response is not None:
+                        pool.release(api_key, response.status_code, response.headers.get('Retry-After'))
+                    else:
+                        pool.release(api_key)
+
+            self._metrics.record_request(END_POINT, response, latency)
+            if api_key is None:
+                break
+            if response.status_code not in (401, 403, 429) or pool.usable() == 0:
+                break
+            self._metrics.count('retries', END_POINT)
+        return response, latency
+
+    def _get_page(self, URL, reporter, END_POINT = ''):
+        '''
+            Fetches and decodes a follow-up page
+        '''
+        response, latency = self._request_page(URL, None, END_POINT, FOLLOW_UP=True)
+
+        decode_start = time.perf_counter()
+        page_json = response.json()
+        self._metrics.record_phase(END_POINT, 'decode', time.perf_counter() - decode_start)
+
+        rows = self._count_rows(page_json['results'])
+        self._metrics.count('rows', END_POINT, rows)
+        reporter.page(END_POINT, rows, len(response.content), latency)
+
+        return page_json
+
+    def _merge_results(self, json_data, new_results, END_POINT = ''):
+        merge_start = time.perf_counter()
         try:
-            response = requests.get(url, headers=self._headers)
-            new_results = response.json()['results']
             json_data["results"] += new_results
-            if VERBOSE == 2:
-                pbar.update(len(new_results))
         except TypeError: #special case for locgeoregion2
             json_data["results"]["features"] += new_results["features"]
-            if VERBOSE == 2:
-                pbar.update(len(new_results))
-        #except JSONDecodeError:
-        #    raise
+        self._metrics.record_phase(END_POINT, 'merge', time.perf_counter() - merge_start)
+
+    def get_results(self, URL, json_data, reporter, END_POINT = ''):
+        '''
+            Fetches a follow-up page, appends its results to json_data and returns the decoded page
+        '''
+        page_json = self._get_page(URL, reporter, END_POINT)
+        self._merge_results(json_data, page_json['results'], END_POINT)
             
-        return response
+        return page_json
     
         
+    # identical concurrent get_mindat_json calls share one download, see get_mindat_json
+    coalesce_requests = True
+
     def get_mindat_json(self, PARAM_DICT, END_POINT, VERBOSE = 2):
         '''
             get all items in a list
             Since this API has a limit of 1500 items per page,
             we need to loop through all pages and save them to a single json file
+
+            Identical queries (same server, key, endpoint and normalized parameters) made from
+            several threads at the same time are coalesced: the first one downloads, the others
+            wait for it and receive their own copy of its result, or its exception.
+            Set MindatApi.coalesce_requests = False to send every query.
+        '''
+        with tracing.start_span('MindatApi.get_mindat_json', end_point=END_POINT) as span:
+            if not self.coalesce_requests:
+                return self._fetch_mindat_json(PARAM_DICT, END_POINT, VERBOSE)
+
+            key = (self.MINDAT_API_URL, self._api_key) + query_key(PARAM_DICT, END_POINT)
+            with _in_flight_lock:
+                call = _in_flight.get(key)
+                leader = call is None
+                if leader:
+                    call = _in_flight[key] = _InFlightQuery()
+                else:
+                    call.followers += 1
+
+            if not leader:
+                span.set_attribute('coalesced', True)
+                self._metrics.count('coalesced', END_POINT)
+                call.done.wait()
+                if call.error is not None:
+                    raise call.error
+                # callers may modify their results, so every follower unpickles its own copy
+                return pickle.loads(call.result)
+
+            result = None
+            try:
+                result = self._fetch_mindat_json(PARAM_DICT, END_POINT, VERBOSE)
+                return result
+            except BaseException as e:
+                call.error = e
+                raise
+            finally:
+                with _in_flight_lock:
+                    del _in_flight[key]
+                # the snapshot is taken before the leader's caller gets the result and can change it
+                if call.error is None and call.followers:
+                    call.result = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+                call.done.set()
+
+    def get_cached_mindat_json(self, PARAM_DICT, END_POINT, VERBOSE = 2):
+        '''
+            get_mindat_json through the process-wide result cache, if one is installed (see openmindat.result_cache):
+            a repeated query within its endpoint's TTL is answered from memory without a request, so the result
+            may be up to that TTL old; without a cache (the default) this is get_mindat_json
+            the key is the canonical query, so the order of the parameters doesn't matter
+        '''
+        cache = result_cache.get_cache()
+        if cache is None:
+            return self.get_mindat_json(PARAM_DICT, END_POINT, VERBOSE)
+        key = (self.MINDAT_API_URL, self._api_key) + query_key(PARAM_DICT, END_POINT)
+        result = cache.get(key)
+        if result is not None:
+            return result
+
+        result = self.get_mindat_json(PARAM_DICT, END_POINT, VERBOSE)
+        if result is not None:
+            cache.put(key, END_POINT, result)
+        return result
+
+    def _fetch_mindat_json(self, PARAM_DICT, END_POINT, VERBOSE = 2):
+        json_data = None
+
+        for page_results in self.iter_mindat_pages(PARAM_DICT, END_POINT, VERBOSE):
+            if json_data is None:
+                # Format the obtained data in a JSON dict
+                json_data = {"results": page_results}
+            else:
+                self._merge_results(json_data, page_results, END_POINT)
+
+        return json_data
+
+    def iter_mindat_pages(self, PARAM_DICT, END_POINT, VERBOSE = 2):
+        '''
+            Yields the results of every page as soon as it arrives, so large queries can be
+            processed or written out without holding all pages in memory.
+            Each item is a list of records, or a feature collection dict for locgeoregion2.
         '''
         params = PARAM_DICT
         end_point = END_POINT
+        reporter = self._get_reporter(VERBOSE)
 
         # Retrieve the first page of data
         for i in range(4):
-            response = requests.get(self.MINDAT_API_URL+ "/" + end_point + "/",
-                            params=params,
-                            headers=self._headers)
+            response, latency = self._request_page(self.MINDAT_API_URL+ "/" + end_point + "/", params, end_point)
             
             if len(response.url) > 4097:
                 raise ValueError("Search query to big, reduce the size of the search and try again.")
             
             try:
+                decode_start = time.perf_counter()
                 response_json = response.json()
+                self._metrics.record_phase(end_point, 'decode', time.perf_counter() - decode_start)
                 result_data = response_json["results"]
                 break
             except KeyError:
@@ -262,55 +649,51 @@ class MindatApi:
                 if(params['page_size'] < 150):
                     raise ValueError(str(response.reason))
                 params['page_size'] = int(params['page_size']/2)
+                self._metrics.count('page_size_reductions', end_point)
+                reporter.retry(end_point, i + 1, "page_size reduced to " + str(params['page_size']))
                 print("page size too big, reducing and trying again. New size: ", params['page_size'])
             except:
                 raise ValueError(str(response.reason))
         else:
             raise ValueError(str(response.reason))
-        
-        # Format the obtained data in a JSON dict
-        json_data = {"results": result_data}
 
         # Check if the query involves multiple pages
-        multipage_flag = self._is_multipage_query(params, response.json())
-        
-        if True == multipage_flag:
-            # Create the progress bar
-            total_item = response.json().get("count", None)
-            item_per_request = len(response.json()["results"])
-            if VERBOSE == 2:
-                pbar = tqdm(total=total_item, desc="Fetching data") if total_item is not None else tqdm(desc="Fetching data")
-                pbar.update(item_per_request)
-            else:
-                pbar = None
-
-            # Try if multipage download is needed
-            while True:
-                
-                next_url = response.json()["next"]
-                
-                if next_url:
-                    for server_fail_count in range(4):
-                        try:
-                            response = self.get_results(next_url, json_data, pbar, VERBOSE)
-                            if VERBOSE == 2:
-                                pbar.set_postfix()
-                            break
-                        except JSONDecodeError as e:
-                            if VERBOSE == 2:
-                                pbar.set_postfix({'retry attempt': server_fail_count})
-                            time.sleep(5*server_fail_count)
-                    else:
-                        raise JSONDecodeError("\nServer was not able to resolve the search, please try again.", next_url, 0)
-                else:
-                    break    
-                
-            # Close the progress bar
-            
-            if VERBOSE == 2:
-                pbar.close()
+        multipage_flag = self._is_multipage_query(params, response_json)
+        total_item = response_json.get("count", None) if multipage_flag else None
+
+        rows = self._count_rows(result_data)
+        self._metrics.count('rows', end_point, rows)
+        reporter.start(end_point, total_item, multipage_flag)
+        reporter.page(end_point, rows, len(response.content), latency)
+
+        try:
+            yield result_data
             
-        return json_data
+            if True == multipage_flag:
+                page_json = response_json
+
+                # Try if multipage download is needed
+                while True:
+                    
+                    next_url = page_json["next"]
+                    
+                    if next_url:
+                        for server_fail_count in range(4):
+                            try:
+                                page_json = self._get_page(next_url, reporter, end_point)
+                                break
+                            except JSONDecodeError as e:
+                                self._metrics.count('retries', end_point)
+                                reporter.retry(end_point, server_fail_count, "invalid JSON response")
+                                time.sleep(5*server_fail_count)
+                        else:
+                            raise JSONDecodeError("\nServer was not able to resolve the search, please try again.", next_url, 0)
+
+                        yield page_json['results']
+                    else:
+                        break    
+        finally:
+            reporter.close(end_point)
     
     def _is_multipage_query(self, PARAM, RAW_JSON):
         if 'page' in PARAM:
@@ -333,6 +716,15 @@ class MindatApi:
         # get the json data
         json_data = self.get_mindat_json(QUERY_DICT, END_POINT, VERBOSE)
 
+        self.save_mindat_json(json_data, END_POINT, OUTDIR, FILE_NAME, VERBOSE)
+
+    def save_mindat_json(self, JSON_DATA, END_POINT, OUTDIR = '', FILE_NAME = '', VERBOSE = 2, INDENT = 4):
+        '''
+            Writes already retrieved json data to <OUTDIR>/<FILE_NAME>.json.
+            INDENT = None writes compact json, which is much smaller for coordinate heavy data.
+        '''
+        json_data = JSON_DATA
+
         # The default output name is same as the endpoint
         file_name = FILE_NAME if FILE_NAME else END_POINT   
 
@@ -340,8 +732,14 @@ class MindatApi:
         file_path = self.get_file_path(OUTDIR, file_name)
 
         # Create and write the json data to the file
-        with open(file_path, 'w') as f:
-            json.dump(json_data, f, indent=4)   
+        write_start = time.perf_counter()
+        with tracing.start_span('write', end_point=END_POINT, path=str(file_path)):
+            with open(file_path, 'w') as f:
+                if INDENT is None:
+                    json.dump(json_data, f, separators=(',', ':'))
+                else:
+                    json.dump(json_data, f, indent=INDENT)
+        self._metrics.record_phase(END_POINT, 'write', time.perf_counter() - write_start)
 
         if VERBOSE > 0:
             print("Successfully saved " + str(len(json_data['results'])) + " entries to " + str(file_path.resolve()))
@@ -352,84 +750,34 @@ class MindatApi:
             Since this API has a limit of 1000 items per page,
             we need to loop through all pages and save them to a single json file
         '''
-        
-        ttl_endpoint = END_POINT
-        ttl_subendpoint = ''
-        
         # get the json data
-        json_data = self.get_mindat_json(QUERY_DICT, ttl_endpoint, VERBOSE)
+        json_data = self.get_mindat_json(QUERY_DICT, END_POINT, VERBOSE)
         if 'id' not in json_data['results'][0].keys():
             raise ValueError("Query error, Results must have 'id' field for ttl formatting")
-        
-        #I would like to abstract this to work for dana-8 as well, but thinking about how I would automate the shortening of names like 'strunz'
-        if 'nickel-strunz-10' in ttl_endpoint:
-            ttl_subendpoint = ttl_endpoint.split("/",1)[1] if '/' in ttl_endpoint else 'strunz'
-            ttl_endpoint = ttl_endpoint.split("/",1)[0]
-
-
-        #defines a custome namespace for the graph
-        mindatNamespace = Namespace(f"https://www.mindat.org/{ttl_endpoint}/")
-        
-        #creates graph and initial URI
-        g = Graph()
-        g.bind(ttl_endpoint, mindatNamespace)
-
-        #Defines the proper property based on the namespace            
-        uriDict = {'geomaterials': URIRef(f'https://www.mindat.org/geomaterials/geo'),
-                'localities': URIRef(f'https://www.mindat.org/localities/loc'),
-                'nickel-strunz-10': URIRef(f'https://www.mindat.org/nickel-strunz-10/{ttl_subendpoint}'),
-                'minerals_ima': URIRef(f'https://www.mindat.org/ima_minerals/min')}
-        
-        #initialized class info for endpoint, look into ways of adding more info here?
-        g.add((uriDict[ttl_endpoint], RDF.type, RDFS.Class))
-        g.add((uriDict[ttl_endpoint], RDFS.label, Literal(ttl_endpoint)))
-
-        #Preps the file to have minerals and IMA approved items.
-        if 'geomaterials' in ttl_endpoint or 'minerals_ima' in ttl_endpoint:
-            g.add((URIRef(f'https://www.mindat.org/geomaterials/Mineral'), RDF.type, RDFS.Class))
-            g.add((URIRef(f'https://www.mindat.org/geomaterials/Mineral'), RDFS.label, Literal("Mineral Species")))
-            
-        
-
-
-        #loop for creating the rdf graph
-        for dict in json_data['results']:
-            #parses the empty values out of the data, may be too harsh since it 
-            #removes values of 0 from ints, which could be intentional or a placeholder value
-            parseddict = {k: v for k, v in dict.items() if v}
-            
-            itemName = getattr(mindatNamespace, str(parseddict['id']))
-            #itemname is based on id
-            
-            if "ima_status" in parseddict and ("APPROVED" in parseddict["ima_status"]):
-                g.add((itemName, RDF.type, RDFS.Class))
-                g.add((itemName, RDFS.subClassOf, URIRef(f'https://www.mindat.org/geomaterials/Mineral')))
-            else:
-                #creates the first entry by defining itemname as it's type, ex: 1023 a mineral:min
-                g.add((itemName, RDF.type, uriDict[ttl_endpoint]))
-
-            #iterates through the rest of the attributes and assigns them
-            for keys in parseddict:
-                if keys != 'id':
-                    #creates the object value to be assigned
-                    rdfObject = Literal(parseddict[keys])
-                    #creates the predicate for the rdf statement
-                    rdfPredicate = URIRef(f'https://www.mindat.org/{ttl_endpoint}/{keys}')
-                    g.add((itemName, rdfPredicate, rdfObject))
 
         # saves the graph to a file
-        return g
-            
-    def download_mindat_ttl(self, QUERY_DICT, END_POINT, OUTDIR = '', FILE_NAME = '', VERBOSE = 2):
-        g = self.get_mindat_ttl(QUERY_DICT, END_POINT, VERBOSE)
-        
+        return build_ttl_graph(json_data['results'], END_POINT)
+
+    def download_mindat_ttl(self, QUERY_DICT, END_POINT, OUTDIR = '', FILE_NAME = '', VERBOSE = 2, WORKERS = 0):
         # The default output name is same as the endpoint
         file_name = FILE_NAME if FILE_NAME else END_POINT   
 
         # Getting the directory for the output file
         file_path = self.get_ttl_file_path(OUTDIR, file_name)
+
+        if WORKERS:
+            # the pages are converted in worker processes while the next ones download
+            from .pipeline import PagePipeline
+            with PagePipeline(WORKERS) as pipeline:
+                pipeline.saveto_ttl(QUERY_DICT, END_POINT, file_path, VERBOSE)
+            return
+
+        g = self.get_mindat_ttl(QUERY_DICT, END_POINT, VERBOSE)
         
-        g.serialize(destination = file_path,format='turtle')
+        write_start = time.perf_counter()
+        with tracing.start_span('write', end_point=END_POINT, path=str(file_path)):
+            g.serialize(destination = file_path,format='turtle')
+        self._metrics.record_phase(END_POINT, 'write', time.perf_counter() - write_start)
 
         if VERBOSE > 0:
             print("Successfully saved to " + str(file_path.resolve()))
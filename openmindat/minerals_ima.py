@@ -1,4 +1,5 @@
 from . import mindat_api
+from .tracing import traced
 from datetime import datetime
 
 class MineralsIMARetriever:
@@ -284,6 +285,7 @@ class MineralsIMARetriever:
         
         return self
     
+    @traced
     def saveto(self, OUTDIR='', FILE_NAME = ''):
         '''
             Executes the query to retrieve the geomaterials with keywords and saves the results to a specified directory.
@@ -330,13 +332,15 @@ class MineralsIMARetriever:
         
         self.saveto('', file_name)
         
-    def saveto_ttl(self, OUTDIR = '', FILE_NAME = ''):
+    @traced
+    def saveto_ttl(self, OUTDIR = '', FILE_NAME = '', WORKERS = 0):
         '''
             Executes the query to retrieve the ima minerals with keywords and saves the results to a specified directory as a ttl file.
 
             Args:
                 OUTDIR (str): The directory path where the retrieved minerals will be saved. If not provided, the current directory will be used.
                 FILE_NAME (str): An optional file name, if no input is given it uses the end point as a name
+                WORKERS (int): Worker processes converting the pages to RDF while the next ones download; 0 converts them in this process.
 
             Returns:
                 None
@@ -353,11 +357,12 @@ class MineralsIMARetriever:
         verbose = self.verbose_flag
 
         ma = mindat_api.MindatApi()
-        ma.download_mindat_ttl(params, end_point, outdir, file_name, verbose)
+        ma.download_mindat_ttl(params, end_point, outdir, file_name, verbose, WORKERS)
 
         # reset the query parameters in case the user wants to make another query
         self._init_params()
         
+    @traced
     def get_dict(self):
         '''
         Executes the query to retrieve the list of mineral data and returns the json object.
@@ -376,7 +381,7 @@ class MineralsIMARetriever:
         end_point = self.end_point
         
         ma = mindat_api.MindatApi()
-        results = ma.get_mindat_json(params, end_point, verbose)
+        results = ma.get_cached_mindat_json(params, end_point, verbose)
         
         self._init_params()
         return results
@@ -504,6 +509,7 @@ class MineralsIdRetriever:
         
         return self
     
+    @traced
     def saveto(self, OUTDIR = '', FILE_NAME = ''):
         '''
             Executes the query to retrieve the Minerals with keywords and saves the results to a specified directory.
@@ -550,6 +556,7 @@ class MineralsIdRetriever:
         
         self.saveto('', file_name)
         
+    @traced
     def get_dict(self):
         '''
         Executes the query to retrieve mineral IMA status with a corresponding id and returns a dictionary.
@@ -568,7 +575,7 @@ class MineralsIdRetriever:
         end_point = '/'.join([self.end_point, self.sub_endpoint])
         
         ma = mindat_api.MindatApi()
-        results = ma.get_mindat_json(params, end_point, verbose)
+        results = ma.get_cached_mindat_json(params, end_point, verbose)
         
         self._init_params()
         return results
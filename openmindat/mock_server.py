@@ -0,0 +1,349 @@
+import json
+import math
+import time
+import random
+import threading
+from urllib.parse import urlsplit, parse_qs, urlencode
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+# Number of records generated per table unless overridden with SIZES
+DEFAULT_SIZES = {
+    'geomaterials': 6000,
+    'localities': 20000,
+    'locgeoregion2': 300,
+    'minerals_ima': 3000,
+    'countries': 250,
+    'locality_type': 60,
+    'locality_status': 20,
+    'locality_age': 200,
+    'photocount': 500,
+}
+
+# Query parameters that control the response rather than filter records
+_RESERVED_PARAMS = {'format', 'page', 'page_size', 'fields', 'omit', 'expand', 'cursor', 'q', 'ordering'}
+
+_ELEMENTS = ['H', 'C', 'O', 'F', 'Na', 'Mg', 'Al', 'Si', 'P', 'S', 'Cl', 'K', 'Ca', 'Ti', 'Mn', 'Fe', 'Ni', 'Cu', 'Zn', 'As', 'Ag', 'Sb', 'Ba', 'Pb', 'Bi', 'U']
+_COLOURS = ['colourless', 'white', 'grey', 'black', 'green', 'blue', 'red', 'yellow', 'brown', 'pink', 'violet', 'orange']
+_CRYSTAL_SYSTEMS = ['Amorphous', 'Hexagonal', 'Icosahedral', 'Isometric', 'Monoclinic', 'Orthorhombic', 'Tetragonal', 'Triclinic', 'Trigonal']
+_WORDS = ['vein', 'crystal', 'prismatic', 'massive', 'granular', 'fibrous', 'tabular', 'acicular', 'botryoidal', 'druse', 'oxidised', 'pegmatite', 'skarn', 'hydrothermal', 'supergene']
+_COUNTRIES = ['USA', 'Canada', 'Mexico', 'Brazil', 'Chile', 'UK', 'France', 'Germany', 'Italy', 'Spain', 'Norway', 'Sweden', 'Russia', 'China', 'Japan', 'India', 'Australia', 'South Africa', 'Namibia', 'Morocco']
+
+
+def _formula(rng):
+    # e.g. "Cu<sub>2</sub>S", "(Fe,Mg)<sub>2</sub>SiO<sub>4</sub>" or "CaSO<sub>4</sub>·2H<sub>2</sub>O"
+    elements = rng.sample(_ELEMENTS, rng.randint(2, 4))
+    parts = []
+    if rng.random() < 0.25:
+        parts.append('(' + ','.join(elements[:2]) + ')<sub>' + str(rng.randint(2, 3)) + '</sub>')
+        elements = elements[2:]
+    for element in elements:
+        count = rng.randint(1, 6)
+        parts.append(element + ('<sub>' + str(count) + '</sub>' if count > 1 else ''))
+    formula = ''.join(parts)
+    if rng.random() < 0.15:
+        formula += '·' + str(rng.randint(1, 4)) + 'H<sub>2</sub>O'
+    return formula
+
+
+def _polygon(rng, lon, lat, radius, vertices):
+    ring = []
+    for i in range(vertices):
+        angle = 2 * math.pi * i / vertices
+        r = radius * (0.8 + 0.4 * rng.random())
+        ring.append([round(lon + r * math.cos(angle), 6), round(lat + r * math.sin(angle), 6)])
+    ring.append(ring[0])
+    return [ring]
+
+
+def build_fixtures(SIZES = None, SEED = 0):
+    '''
+    Generates deterministic stand-in tables for the Mindat endpoints.
+
+    Args:
+        SIZES (dict): Optional record counts per table, see DEFAULT_SIZES.
+        SEED (int): Random seed, the same seed always produces the same records.
+
+    Returns:
+        dict: endpoint path -> list of records ('locgeoregion2' holds GeoJSON features).
+    '''
+    sizes = dict(DEFAULT_SIZES)
+    sizes.update(SIZES or {})
+    rng = random.Random(SEED)
+    tables = {}
+
+    # classification tables, codes follow the same pattern as the geomaterial fields
+    strunz_classes, strunz_subclasses, strunz_families = [], [], []
+    for c in range(1, 11):
+        strunz_classes.append({'id': c, 'code': str(c), 'name': f'Strunz class {c}'})
+        for s in 'ABCD':
+            strunz_subclasses.append({'id': len(strunz_subclasses) + 1, 'code': f'{c}.{s}', 'name': f'Strunz subclass {c}.{s}'})
+            for f in 'ABC':
+                strunz_families.append({'id': len(strunz_families) + 1, 'code': f'{c}.{s}{f}', 'name': f'Strunz family {c}.{s}{f}'})
+    tables['nickel-strunz-10/classes'] = strunz_classes
+    tables['nickel-strunz-10/subclasses'] = strunz_subclasses
+    tables['nickel-strunz-10/families'] = strunz_families
+
+    dana_groups, dana_subgroups = [], []
+    for a in range(1, 21):
+        for b in range(1, 4):
+            dana_groups.append({'id': len(dana_groups) + 1, 'code': f'{a}.{b}', 'name': f'Dana group {a}.{b}'})
+            for c in range(1, 4):
+                dana_subgroups.append({'id': len(dana_subgroups) + 1, 'code': f'{a}.{b}.{c}', 'name': f'Dana subgroup {a}.{b}.{c}'})
+    tables['dana-8/groups'] = dana_groups
+    tables['dana-8/subgroups'] = dana_subgroups
+
+    geomaterials = []
+    for i in range(1, sizes['geomaterials'] + 1):
+        name = rng.choice(['Quartz', 'Calc', 'Chalco', 'Pyr', 'Gal', 'Sphal', 'Ortho', 'Clino', 'Fluor', 'Barit']) + ['ite', 'ene', 'ase', 'ine', 'ole'][i % 5] + str(i)
+        formula = _formula(rng)
+        geomaterials.append({
+            'id': i,
+            'name': name,
+            'mindat_formula': formula,
+            'ima_formula': formula if i % 3 else '',
+            'ima_status': ['APPROVED'] if i % 4 else [],
+            'entrytype': 0 if i % 10 else 7,
+            'colour': ', '.join(rng.sample(_COLOURS, 2)),
+            'streak': rng.choice(_COLOURS),
+            'csystem': rng.choice(_CRYSTAL_SYSTEMS),
+            'description_short': ' '.join(rng.sample(_WORDS, 4)),
+            'strunz10ed1': str(rng.randint(1, 10)),
+            'strunz10ed2': rng.choice('ABCD'),
+            'strunz10ed3': rng.choice('ABC'),
+            'strunz10ed4': f'{rng.randint(1, 40):02d}',
+            'dana8ed1': str(rng.randint(1, 20)),
+            'dana8ed2': str(rng.randint(1, 3)),
+            'dana8ed3': str(rng.randint(1, 3)),
+            'dana8ed4': str(rng.randint(1, 9)),
+            'synid': rng.randint(1, i - 1) if i > 1 and i % 17 == 0 else 0,
+            'varietyof': rng.randint(1, i - 1) if i > 1 and i % 11 == 0 else 0,
+            'polytypeof': rng.randint(1, i - 1) if i > 1 and i % 29 == 0 else 0,
+            'groupid': rng.randint(1, i - 1) if i > 1 and i % 7 == 0 else 0,
+        })
+    tables['geomaterials'] = geomaterials
+
+    tables['minerals_ima'] = [
+        {'id': i, 'name': geomaterials[i - 1]['name'] if i <= len(geomaterials) else f'Mineral{i}',
+         'ima_formula': _formula(rng), 'ima_year': rng.randint(1958, 2024), 'ima_status': ['APPROVED']}
+        for i in range(1, sizes['minerals_ima'] + 1)
+    ]
+
+    tables['locality_type'] = [{'id': i, 'description': f'Locality type {i}'} for i in range(1, sizes['locality_type'] + 1)]
+    tables['locality_status'] = [{'id': i, 'description': f'Locality status {i}'} for i in range(1, sizes['locality_status'] + 1)]
+    tables['locality_age'] = [{'id': i, 'age': f'{rng.randint(1, 4000)} Ma'} for i in range(1, sizes['locality_age'] + 1)]
+    tables['countries'] = [{'id': i, 'text': _COUNTRIES[i - 1] if i <= len(_COUNTRIES) else f'Country {i}', 'iso': f'C{i:02d}'}
+                           for i in range(1, sizes['countries'] + 1)]
+
+    tables['localities'] = [{
+        'id': i,
+        'txt': f'{rng.choice(_WORDS).title()} Mine {i}',
+        'country': rng.choice(_COUNTRIES),
+        'latitude': round(rng.uniform(-60, 75), 6),
+        'longitude': round(rng.uniform(-180, 180), 6),
+        'description_short': ' '.join(rng.sample(_WORDS, 3)),
+        'elements': '-'.join(rng.sample(_ELEMENTS, 3)),
+        'loc_status': rng.randint(1, sizes['locality_status']),
+        'loctype': rng.randint(1, sizes['locality_type']),
+        'age': rng.randint(1, sizes['locality_age']),
+    } for i in range(1, sizes['localities'] + 1)]
+
+    tables['locgeoregion2'] = [{
+        'type': 'Feature',
+        'id': i,
+        'properties': {'id': i, 'name': f'Region {i}'},
+        'geometry': {'type': 'Polygon', 'coordinates': _polygon(rng, rng.uniform(-170, 170), rng.uniform(-60, 70), rng.uniform(0.5, 5), 200)},
+    } for i in range(1, sizes['locgeoregion2'] + 1)]
+
+    tables['photocount'] = [{'id': i, 'count': rng.randint(0, 500)} for i in range(1, sizes['photocount'] + 1)]
+
+    return tables
+
+
+class MockMindatServer:
+    """
+    A local stand-in for api.mindat.org serving generated fixtures, for offline benchmarks and development.
+    List endpoints are paginated like the real API (count/next/previous/results with page and page_size),
+    records can be fetched by id, and the latency and error behaviour are configurable.
+
+    Args:
+        SIZES (dict): Optional record counts per table, see DEFAULT_SIZES.
+        SEED (int): Random seed for the fixtures and the error injection.
+        LATENCY (float): Seconds to sleep before answering each request.
+        ERROR_RATE (float): Probability that a follow-up page (page >= 2) answers with a non-JSON 502,
+            which exercises the client's retry path.
+        MAX_PAGE_SIZE (int): Larger page sizes get a non-JSON 500, like an overloaded server.
+        FIXTURES (dict): Prebuilt tables from build_fixtures(), to share them across servers.
+
+    Usage:
+        >>> with MockMindatServer(LATENCY=0.05) as server:
+        ...     os.environ["MINDAT_API_URL"] = server.url
+        ...     GeomaterialRetriever().page_size(500).get_dict()
+
+    Press q to quit.
+    """
+
+    def __init__(self, SIZES = None, SEED = 0, LATENCY = 0.0, ERROR_RATE = 0.0, MAX_PAGE_SIZE = 1500, FIXTURES = None):
+        self.tables = FIXTURES if FIXTURES is not None else build_fixtures(SIZES, SEED)
+        self.latency = LATENCY
+        self.error_rate = ERROR_RATE
+        self.max_page_size = MAX_PAGE_SIZE
+        self.request_count = 0
+        self._rng = random.Random(SEED)
+        self._lock = threading.Lock()
+        self._httpd = None
+        self._thread = None
+        self._index = {name: {record['id']: record for record in records} for name, records in self.tables.items()}
+        self._value_index = {}
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server._handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+    def _send(self, handler, status, body, content_type = 'application/json'):
+        payload = body.encode() if isinstance(body, str) else body
+        handler.send_response(status)
+        handler.send_header('Content-Type', content_type)
+        handler.send_header('Content-Length', str(len(payload)))
+        handler.end_headers()
+        handler.wfile.write(payload)
+
+    def _handle(self, handler):
+        with self._lock:
+            self.request_count += 1
+            fail_roll = self._rng.random()
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        if not handler.headers.get('Authorization', '').startswith('Token '):
+            return self._send(handler, 401, json.dumps({'detail': 'Authentication credentials were not provided.'}))
+
+        url = urlsplit(handler.path)
+        query = parse_qs(url.query)
+        params = {key: values[-1] for key, values in query.items()}
+        parts = [part for part in url.path.split('/') if part]
+        page = int(params.get('page', 1))
+
+        if page >= 2 and fail_roll < self.error_rate:
+            return self._send(handler, 502, '<html><body>Bad Gateway</body></html>', 'text/html')
+
+        page_size = int(params.get('page_size', 10))
+        if page_size > self.max_page_size:
+            return self._send(handler, 500, '<html><body>Server Error</body></html>', 'text/html')
+
+        path = '/'.join(parts)
+        if path == 'geomaterials_search':
+            # the search endpoint answers with a bare list
+            keywords = [k.strip().lower() for k in params.get('q', '').split(',') if k.strip()]
+            hits = [g for g in self.tables['geomaterials']
+                    if all(k in (g['name'] + ' ' + g['colour'] + ' ' + g['csystem']).lower() for k in keywords)]
+            return self._send(handler, 200, json.dumps(hits[:page_size]))
+
+        if path in self.tables:
+            records = self._filter(path, self.tables[path], params)
+            return self._send(handler, 200, self._paginate(path, records, query, page, page_size))
+
+        # <table>/<id>/ and geomaterials/<id>/varieties/
+        if len(parts) >= 2 and parts[-1].isdigit() or (len(parts) >= 3 and parts[-1] == 'varieties' and parts[-2].isdigit()):
+            varieties = parts[-1] == 'varieties'
+            record_id = int(parts[-2] if varieties else parts[-1])
+            table = '/'.join(parts[:-2] if varieties else parts[:-1])
+            record = self._index.get(table, {}).get(record_id)
+            if record is None:
+                return self._send(handler, 404, json.dumps({'detail': 'Not found.'}))
+            if varieties:
+                records = [g for g in self.tables[table] if g.get('varietyof') == record_id]
+                return self._send(handler, 200, self._paginate(path, records, query, page, page_size))
+            return self._send(handler, 200, json.dumps(self._project(record, params)))
+
+        return self._send(handler, 404, json.dumps({'detail': 'Not found.'}))
+
+    def _values(self, path, records, key):
+        # equality filters look up a per-column index instead of scanning the table on every request
+        with self._lock:
+            index = self._value_index.get((path, key))
+            if index is None:
+                index = {}
+                for r in records:
+                    index.setdefault(str(r.get(key)), []).append(r)
+                self._value_index[(path, key)] = index
+        return index
+
+    def _filter(self, path, records, params):
+        filters = {k: v for k, v in params.items() if k not in _RESERVED_PARAMS}
+        if not filters or not records:
+            return records
+        sample = records[0]
+        filters = {k: v for k, v in filters.items() if k in sample}
+        if not filters:
+            return records
+        first, value = next(iter(filters.items()))
+        candidates = self._values(path, records, first).get(value, [])
+        return [r for r in candidates if all(str(r.get(k)) == v for k, v in filters.items())]
+
+    def _project(self, record, params):
+        if 'fields' in params and params['fields'] != '*':
+            keep = set(params['fields'].split(','))
+            record = {k: v for k, v in record.items() if k in keep}
+        if 'omit' in params:
+            drop = set(params['omit'].split(','))
+            record = {k: v for k, v in record.items() if k not in drop}
+        return record
+
+    def _paginate(self, path, records, query, page, page_size):
+        start = (page - 1) * page_size
+        chunk = [self._project(r, {k: v[-1] for k, v in query.items()}) for r in records[start:start + page_size]]
+
+        def link(number):
+            link_query = dict(query)
+            link_query['page'] = [str(number)]
+            return f'{self.url}/{path}/?{urlencode(link_query, doseq=True)}'
+
+        next_url = link(page + 1) if start + page_size < len(records) else None
+        previous_url = link(page - 1) if page > 1 else None
+
+        if path == 'locgeoregion2':
+            chunk = {'type': 'FeatureCollection', 'features': chunk}
+
+        return json.dumps({'count': len(records), 'next': next_url, 'previous': previous_url, 'results': chunk})
+
+
+if __name__ == '__main__':
+    with MockMindatServer() as server:
+        print("Mock Mindat API running at " + server.url + ", press Ctrl+C to stop")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
@@ -1,4 +1,6 @@
 from . import mindat_api
+from .tracing import traced
+from . import classification
 
 #todo: Check back in when retrieve and id functions are implemented
 
@@ -15,6 +17,7 @@ class StrunzRetriever:
         families: returns family information
         classes: returns classes information
         subClasses: returns subClasses information
+        get_tree: returns the whole classification as a ClassificationTree
 
     Usage:
         >>> sr = StrunzRetriever()
@@ -182,6 +185,7 @@ class StrunzRetriever:
         
         return self
     
+    @traced
     def saveto(self, OUTDIR = '', FILE_NAME = ''):
         '''
             Executes the query to retrieve the nickel strunz data with keywords and saves the results to a specified directory.
@@ -232,6 +236,7 @@ class StrunzRetriever:
         
         self.saveto('', file_name)
         
+    @traced
     def get_dict(self):
         '''
         Executes the query to retrieve the nickel_strunz data as a list of dictionaries.
@@ -249,11 +254,34 @@ class StrunzRetriever:
         end_point = '/'.join([self.end_point, self.sub_endpoint])
         
         ma = mindat_api.MindatApi()
-        results = ma.get_mindat_json(params, end_point, verbose)
+        results = ma.get_cached_mindat_json(params, end_point, verbose)
             
         self._init_params()
         return results
 
+    @traced
+    def get_tree(self, REFRESH = False):
+        '''
+        Returns the whole nickel-strunz-10 classification as a ClassificationTree, with all levels downloaded
+        concurrently and cached under ./mindat_data/classification/ for later calls and sessions.
+        Codes can then be classified locally, e.g. tree.classify('1.AA.05') or tree.path('1.AA.05').
+
+        Args:
+            REFRESH (bool): Download the classification again even if the cached copy is still fresh.
+
+        Returns:
+            ClassificationTree: The classification tree.
+
+        Example:
+            >>> sr = StrunzRetriever()
+            >>> tree = sr.get_tree()
+            >>> tree.path('1.AA.05')
+        '''
+        tree = classification.ClassificationTree.build(self.end_point, REFRESH=REFRESH)
+
+        self._init_params()
+        return tree
+
     def available_methods(self):
         '''
         Prints the available methods of the class.
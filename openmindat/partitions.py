@@ -0,0 +1,310 @@
+import os
+import json
+import shutil
+import uuid
+from pathlib import Path
+
+from .spatial import _coordinate
+
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+_BASE32_INDEX = {c: i for i, c in enumerate(_BASE32)}
+
+MANIFEST_NAME = 'manifest.json'
+
+# records without usable coordinates are kept in their own partition
+UNLOCATED = 'unlocated'
+
+FORMATS = ('jsonl', 'parquet')
+
+
+def geohash_encode(LONGITUDE, LATITUDE, PRECISION = 5):
+    '''
+    Returns the geohash of a point with PRECISION characters.
+
+    Example:
+        >>> geohash_encode(-122.4194, 37.7749, 5)
+        '9q8yy'
+    '''
+    lon_range = [-180.0, 180.0]
+    lat_range = [-90.0, 90.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < PRECISION:
+        rng, coordinate = (lon_range, LONGITUDE) if even else (lat_range, LATITUDE)
+        mid = (rng[0] + rng[1]) / 2
+        value <<= 1
+        if coordinate >= mid:
+            value |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits = 0
+            value = 0
+    return ''.join(chars)
+
+
+def geohash_bbox(GEOHASH):
+    '''
+    Returns the (minx, miny, maxx, maxy) cell of a geohash.
+    '''
+    lon_range = [-180.0, 180.0]
+    lat_range = [-90.0, 90.0]
+    even = True
+    for char in GEOHASH:
+        try:
+            value = _BASE32_INDEX[char]
+        except KeyError:
+            raise ValueError(f"Invalid geohash: {GEOHASH}")
+        for shift in range(4, -1, -1):
+            rng = lon_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if (value >> shift) & 1:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+    return (lon_range[0], lat_range[0], lon_range[1], lat_range[1])
+
+
+def _intersects(a, b):
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+class GeohashPartitionWriter:
+    """
+    Writes records into one compact file per geohash prefix of their latitude/longitude, plus a
+    manifest.json listing every partition with its cell and row count. Records are buffered per
+    partition and appended to JSON lines files as the buffers fill, so any number of records can be
+    written with few open files. With FORMAT='parquet' the partitions are converted at close(),
+    which requires the optional pyarrow package.
+
+    The export is written to a temporary sibling directory and only moved into DIRECTORY at close(),
+    so a failed or interrupted export leaves the previous one untouched; abort() removes the temporary
+    directory. In DIRECTORY, only the manifest and the partitions the previous manifest lists are replaced.
+
+    Args:
+        DIRECTORY (str or Path): The output directory.
+        PRECISION (int): Geohash prefix length; 3 gives cells of about 156 x 156 km.
+        FORMAT (str): 'jsonl' or 'parquet'.
+        END_POINT (str): Recorded in the manifest.
+        BUFFER_ROWS (int): Rows buffered per partition before they are appended to its file.
+
+    Usage:
+        >>> with GeohashPartitionWriter("./mindat_data/localities_geohash", 3) as writer:
+        ...     writer.write_records(page)
+    """
+
+    def __init__(self, DIRECTORY, PRECISION = 3, FORMAT = 'jsonl', END_POINT = 'localities', BUFFER_ROWS = 1000):
+        if not isinstance(PRECISION, int) or not 1 <= PRECISION <= 12:
+            raise ValueError(f"Invalid PRECISION: {PRECISION}\nThe geohash precision must be between 1 and 12.")
+        if FORMAT not in FORMATS:
+            raise ValueError(f"Invalid FORMAT: {FORMAT}\nPossible options: {FORMATS}")
+        if FORMAT == 'parquet':
+            try:
+                import pyarrow
+            except ImportError:
+                raise ImportError("Parquet partitions require the pyarrow package: pip install pyarrow")
+
+        self.directory = Path(DIRECTORY)
+        self.precision = PRECISION
+        self.format = FORMAT
+        self.end_point = END_POINT
+        self.buffer_rows = BUFFER_ROWS
+        self.count = 0
+        self._buffers = {}
+        self._counts = {}
+        self._work = None
+
+    def _jsonl_path(self, key):
+        return self._work / (key + '.jsonl')
+
+    def open(self):
+        self.directory.parent.mkdir(parents=True, exist_ok=True)
+        # a hidden sibling, so the export can be renamed into place; created with the usual permissions, unlike mkdtemp
+        self._work = self.directory.parent / ('.' + self.directory.name + '.' + uuid.uuid4().hex + '.part')
+        self._work.mkdir()
+        return self
+
+    def _flush(self, key):
+        rows = self._buffers.pop(key, None)
+        if rows:
+            with open(self._jsonl_path(key), 'a') as f:
+                f.write(''.join(rows))
+
+    def write_record(self, RECORD):
+        lon = _coordinate(RECORD.get('longitude'))
+        lat = _coordinate(RECORD.get('latitude'))
+        if lon is None or lat is None or not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            key = UNLOCATED
+        else:
+            key = geohash_encode(lon, lat, self.precision)
+
+        buffer = self._buffers.setdefault(key, [])
+        buffer.append(json.dumps(RECORD, separators=(',', ':')) + '\n')
+        if len(buffer) >= self.buffer_rows:
+            self._flush(key)
+
+        self._counts[key] = self._counts.get(key, 0) + 1
+        self.count += 1
+
+    def write_records(self, RECORDS):
+        for record in RECORDS:
+            self.write_record(record)
+
+    def _to_parquet(self, key):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        jsonl_path = self._jsonl_path(key)
+        with open(jsonl_path, 'r') as f:
+            rows = [json.loads(line) for line in f]
+        pq.write_table(pa.Table.from_pylist(rows), self._work / (key + '.parquet'))
+        jsonl_path.unlink()
+
+    def close(self):
+        '''
+        Flushes the buffers, converts the partitions if needed, writes the manifest and moves the export into DIRECTORY.
+        '''
+        for key in list(self._buffers):
+            self._flush(key)
+
+        partitions = []
+        for key in sorted(self._counts):
+            if self.format == 'parquet':
+                self._to_parquet(key)
+            entry = {'geohash': None if key == UNLOCATED else key,
+                     'file': key + '.' + self.format,
+                     'count': self._counts[key]}
+            if key != UNLOCATED:
+                entry['bbox'] = list(geohash_bbox(key))
+            partitions.append(entry)
+
+        manifest = {'end_point': self.end_point, 'precision': self.precision, 'format': self.format,
+                    'count': self.count, 'partitions': partitions}
+        with open(self._work / MANIFEST_NAME, 'w') as f:
+            json.dump(manifest, f, indent=4)
+        self._swap([entry['file'] for entry in partitions])
+        return manifest
+
+    def _previous_files(self):
+        # the partitions listed by the manifest of an earlier export, the only files of DIRECTORY it owns
+        try:
+            with open(self.directory / MANIFEST_NAME, 'r') as f:
+                old = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return []
+        return [entry['file'] for entry in old.get('partitions', []) if isinstance(entry, dict) and 'file' in entry]
+
+    def _swap(self, FILES):
+        work = self._work
+        self._work = None
+        try:
+            # a new directory is moved into place at once
+            os.rename(work, self.directory)
+            return
+        except OSError:
+            pass
+        previous = self._previous_files()
+        for name in FILES:
+            os.replace(work / name, self.directory / name)
+        # the manifest goes last: until then readers still see the previous export's manifest
+        os.replace(work / MANIFEST_NAME, self.directory / MANIFEST_NAME)
+        for name in set(previous) - set(FILES):
+            path = self.directory / name
+            if path.exists() and path.parent == self.directory:
+                path.unlink()
+        shutil.rmtree(work, ignore_errors=True)
+
+    def __enter__(self):
+        return self.open()
+
+    def abort(self):
+        '''
+        Drops the buffers and removes the temporary directory of the export, e.g. after a failed download.
+        DIRECTORY is not touched.
+        '''
+        self._buffers = {}
+        self._counts = {}
+        self.count = 0
+        if self._work is not None:
+            shutil.rmtree(self._work, ignore_errors=True)
+            self._work = None
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+class GeohashPartitions:
+    """
+    Reads a directory written by GeohashPartitionWriter. A viewport query only opens the partitions
+    whose geohash cell overlaps the box.
+
+    Usage:
+        >>> parts = GeohashPartitions("./mindat_data/localities_geohash")
+        >>> parts.bbox(-117.1, 46.6, -116.9, 46.8)
+
+    Press q to quit.
+    """
+
+    def __init__(self, DIRECTORY):
+        self.directory = Path(DIRECTORY)
+        with open(self.directory / MANIFEST_NAME, 'r') as f:
+            self.manifest = json.load(f)
+        self.precision = self.manifest['precision']
+        self.format = self.manifest['format']
+
+    def __len__(self):
+        return self.manifest['count']
+
+    def partitions_for_bbox(self, MIN_LONGITUDE, MIN_LATITUDE, MAX_LONGITUDE, MAX_LATITUDE):
+        '''
+        Returns the manifest entries whose cell overlaps the box.
+        A box with MIN_LONGITUDE > MAX_LONGITUDE crosses the antimeridian.
+        '''
+        if MIN_LONGITUDE > MAX_LONGITUDE:
+            boxes = [(MIN_LONGITUDE, MIN_LATITUDE, 180.0, MAX_LATITUDE), (-180.0, MIN_LATITUDE, MAX_LONGITUDE, MAX_LATITUDE)]
+        else:
+            boxes = [(MIN_LONGITUDE, MIN_LATITUDE, MAX_LONGITUDE, MAX_LATITUDE)]
+        return [entry for entry in self.manifest['partitions']
+                if entry.get('bbox') and any(_intersects(entry['bbox'], box) for box in boxes)]
+
+    def read_partition(self, ENTRY):
+        '''
+        Returns the records of one manifest entry.
+        '''
+        path = self.directory / ENTRY['file']
+        if self.format == 'parquet':
+            try:
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise ImportError("Parquet partitions require the pyarrow package: pip install pyarrow")
+            return pq.read_table(path).to_pylist()
+        with open(path, 'r') as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def bbox(self, MIN_LONGITUDE, MIN_LATITUDE, MAX_LONGITUDE, MAX_LATITUDE):
+        '''
+        Returns the records inside the box, reading only the overlapping partitions.
+        '''
+        wrapped = MIN_LONGITUDE > MAX_LONGITUDE
+        results = []
+        for entry in self.partitions_for_bbox(MIN_LONGITUDE, MIN_LATITUDE, MAX_LONGITUDE, MAX_LATITUDE):
+            for record in self.read_partition(entry):
+                lon = _coordinate(record.get('longitude'))
+                lat = _coordinate(record.get('latitude'))
+                if lon is None or lat is None or not MIN_LATITUDE <= lat <= MAX_LATITUDE:
+                    continue
+                if (MIN_LONGITUDE <= lon or lon <= MAX_LONGITUDE) if wrapped else (MIN_LONGITUDE <= lon <= MAX_LONGITUDE):
+                    results.append(record)
+        return results
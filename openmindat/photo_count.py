@@ -1,4 +1,5 @@
 from . import mindat_api
+from .tracing import traced
 
 class PhotoCountRetriever:
     """
@@ -77,6 +78,7 @@ class PhotoCountRetriever:
         return self
     
     #when fixed check if this needs get item or get list
+    @traced
     def saveto(self, OUTDIR = '', FILE_NAME = ''):
         '''
             Executes the query to retrieve the photo count with keywords and saves the results to a specified directory.
@@ -123,6 +125,7 @@ class PhotoCountRetriever:
         
         self.saveto('', file_name)
         
+    @traced
     def get_dict(self):
         '''
         Executes the query to retrieve photo counts and returns a dictionary.
@@ -141,7 +144,7 @@ class PhotoCountRetriever:
         end_point = self.end_point
         
         ma = mindat_api.MindatApi()
-        results = ma.get_mindat_json(params, end_point, verbose)
+        results = ma.get_cached_mindat_json(params, end_point, verbose)
         
         self._init_params()
         return results
@@ -0,0 +1,236 @@
+import os
+import json
+import queue
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from . import mindat_api
+from . import credentials
+from . import tracing
+
+
+def drop_empty(RECORDS):
+    '''
+    Removes the empty values (None, '', [], {}, 0) of every record, as the ttl export does.
+    '''
+    return [{k: v for k, v in record.items() if v} for record in RECORDS]
+
+
+def _flatten(record, prefix, SEPARATOR, out):
+    for key, value in record.items():
+        name = prefix + SEPARATOR + str(key) if prefix else str(key)
+        if isinstance(value, dict):
+            _flatten(value, name, SEPARATOR, out)
+        else:
+            out[name] = value
+    return out
+
+
+def flatten(RECORDS, SEPARATOR = '.'):
+    '''
+    Flattens nested dictionaries into dotted keys, e.g. {'age': {'min': 1}} becomes {'age.min': 1}.
+    '''
+    return [_flatten(record, '', SEPARATOR, {}) for record in RECORDS]
+
+
+def to_columns(RECORDS):
+    '''
+    Converts a page of records into columns: field -> list of values, None where a record lacks the field.
+    '''
+    fields = {}
+    for record in RECORDS:
+        for key in record:
+            fields.setdefault(key, None)
+    return {field: [record.get(field) for record in RECORDS] for field in fields}
+
+
+def to_jsonl(RECORDS, DROP_EMPTY = False, FLATTEN = False):
+    '''
+    Serializes a page of records as JSON lines, optionally without empty values and flattened.
+    '''
+    if DROP_EMPTY:
+        RECORDS = drop_empty(RECORDS)
+    if FLATTEN:
+        RECORDS = flatten(RECORDS)
+    return ''.join(json.dumps(record, separators=(',', ':')) + '\n' for record in RECORDS)
+
+
+def to_ntriples(RECORDS, END_POINT, HEADER = False):
+    '''
+    Converts a page of records into the N-Triples of the ttl export. N-Triples are valid Turtle and can be
+    concatenated, so the pages of a query can be converted separately and written one after the other.
+    '''
+    graph = mindat_api.build_ttl_graph(RECORDS, END_POINT, HEADER)
+    return graph.serialize(format='nt')
+
+
+def _page_records(PAGE):
+    if isinstance(PAGE, list):
+        return PAGE
+    if isinstance(PAGE, dict) and 'features' in PAGE:
+        return PAGE['features']
+    return [PAGE]
+
+
+def _ntriples_page(RECORDS, END_POINT, INDEX):
+    # the endpoint's class definitions are written once, with the first page
+    return to_ntriples(RECORDS, END_POINT, INDEX == 0)
+
+
+_END = object()
+
+
+class PagePipeline:
+    """
+    Downloads the pages of a query in an I/O thread and runs a CPU-heavy transform of every page
+    (dropping empty values, flattening, conversion to RDF or columns, ...) in a pool of worker processes,
+    so large exports are limited by the network instead of the GIL. The stages are connected by a bounded
+    queue: at most QUEUE_SIZE pages are downloaded but not yet consumed, so a slow consumer holds back the
+    download instead of filling memory. Results come back in page order.
+
+    The workers get the parent's API key through credentials.worker_init_args(), so they start without
+    reading files, validating the key or prompting. JSON decoding stays in the I/O thread, since the next
+    page's URL is only known once a page is decoded.
+
+    Transforms must be picklable, i.e. module-level functions; they are called as TRANSFORM(RECORDS, *ARGS).
+
+    Args:
+        WORKERS (int): Worker processes, defaults to the number of CPUs.
+        QUEUE_SIZE (int): Pages downloaded ahead of the consumer, defaults to twice WORKERS.
+        MP_CONTEXT (str): 'spawn', 'fork' or 'forkserver'; the platform default if None.
+
+    Usage:
+        >>> with PagePipeline(WORKERS=4) as pipeline:
+        ...     pipeline.saveto_ttl({'format': 'json', 'page_size': 1500}, 'geomaterials', './mindat_data/geomaterials.ttl')
+        ...     for columns in pipeline.map_pages(params, 'localities', to_columns):
+        ...         ...
+
+    Press q to quit.
+    """
+
+    def __init__(self, WORKERS = None, QUEUE_SIZE = None, MP_CONTEXT = None):
+        workers = WORKERS if WORKERS is not None else (os.cpu_count() or 1)
+        if not isinstance(workers, int) or workers < 1:
+            raise ValueError(f"Invalid WORKERS: {WORKERS}\nPlease retry.")
+        self.workers = workers
+        self.queue_size = QUEUE_SIZE if QUEUE_SIZE is not None else 2 * workers
+        if self.queue_size < 1:
+            raise ValueError(f"Invalid QUEUE_SIZE: {QUEUE_SIZE}\nPlease retry.")
+        self.mp_context = MP_CONTEXT
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                initializer, initargs = credentials.worker_init_args(self.workers)
+                context = multiprocessing.get_context(self.mp_context) if self.mp_context else None
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=context,
+                                                     initializer=initializer, initargs=initargs)
+            return self._executor
+
+    def _fetch(self, PARAMS, END_POINT, VERBOSE, TRANSFORM, ARGS, PAGE_INDEX, slots, futures, stop):
+        # I/O thread: downloads the pages and hands each one to the process pool as soon as it arrives
+        try:
+            pool = self._pool()
+            ma = mindat_api.MindatApi()
+            for index, page in enumerate(ma.iter_mindat_pages(dict(PARAMS), END_POINT, VERBOSE)):
+                slots.acquire()
+                if stop.is_set():
+                    slots.release()
+                    break
+                args = tuple(ARGS) + ((index,) if PAGE_INDEX else ())
+                futures.put(pool.submit(TRANSFORM, _page_records(page), *args))
+        except BaseException as e:
+            futures.put(e)
+        finally:
+            futures.put(_END)
+
+    def map_pages(self, PARAMS, END_POINT, TRANSFORM, ARGS = (), VERBOSE = 0, PAGE_INDEX = False):
+        '''
+        Yields TRANSFORM(page records, *ARGS) for every page of a query, in page order.
+
+        Args:
+            PARAMS (dict): The query parameters, e.g. a retriever's _params.
+            END_POINT (str): The endpoint.
+            TRANSFORM (callable): A module-level function run in the worker processes.
+            ARGS (tuple): Extra arguments of TRANSFORM.
+            VERBOSE (int): Progress output of the download.
+            PAGE_INDEX (bool): Pass the page number (from 0) as the last argument of TRANSFORM.
+
+        Example:
+            >>> for text in pipeline.map_pages(params, 'geomaterials', to_jsonl, ARGS=(True, True)):
+            ...     f.write(text)
+        '''
+        slots = threading.BoundedSemaphore(self.queue_size)
+        futures = queue.Queue()
+        stop = threading.Event()
+        fetcher = threading.Thread(target=self._fetch, name='mindat-pipeline-fetch', daemon=True,
+                                   args=(PARAMS, END_POINT, VERBOSE, TRANSFORM, ARGS, PAGE_INDEX, slots, futures, stop))
+        with tracing.start_span('PagePipeline.map_pages', end_point=END_POINT, workers=self.workers):
+            fetcher.start()
+            try:
+                while True:
+                    item = futures.get()
+                    if item is _END:
+                        break
+                    if isinstance(item, BaseException):
+                        raise item
+                    try:
+                        result = item.result()
+                    finally:
+                        slots.release()
+                    yield result
+            finally:
+                # an early exit or error: let the fetcher stop at its next page instead of downloading the rest
+                stop.set()
+                while fetcher.is_alive():
+                    try:
+                        item = futures.get(timeout=0.1)
+                    except queue.Empty:
+                        continue
+                    if item is not _END and not isinstance(item, BaseException):
+                        item.cancel()
+                        slots.release()
+
+    def _write(self, PATH, PARAMS, END_POINT, TRANSFORM, ARGS, VERBOSE, PAGE_INDEX = False):
+        # written under a temporary name first, so a failed export never leaves a truncated file behind
+        part_path = str(PATH) + '.part'
+        try:
+            with open(part_path, 'w') as f:
+                for text in self.map_pages(PARAMS, END_POINT, TRANSFORM, ARGS, VERBOSE, PAGE_INDEX):
+                    f.write(text)
+        except BaseException:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            raise
+        os.replace(part_path, PATH)
+        if VERBOSE > 0:
+            print("Successfully saved to " + os.path.abspath(PATH))
+
+    def saveto_jsonl(self, PARAMS, END_POINT, PATH, DROP_EMPTY = False, FLATTEN = False, VERBOSE = 2):
+        '''
+        Exports a query to a JSON lines file, serializing the pages in the worker processes.
+        '''
+        self._write(PATH, PARAMS, END_POINT, to_jsonl, (DROP_EMPTY, FLATTEN), VERBOSE)
+
+    def saveto_ttl(self, PARAMS, END_POINT, PATH, VERBOSE = 2):
+        '''
+        Exports a query as RDF like MindatApi.download_mindat_ttl, with the pages converted in the worker
+        processes. The file holds N-Triples, which any Turtle parser reads.
+        '''
+        self._write(PATH, PARAMS, END_POINT, _ntriples_page, (END_POINT,), VERBOSE, PAGE_INDEX=True)
+
+    def close(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
@@ -0,0 +1,134 @@
+import time
+
+
+class ProgressReporter:
+    """
+    Receives download events from MindatApi while a query is being fetched.
+    Every hook is a no-op, so subclasses only need to override the events they care about.
+
+    Events:
+        start(END_POINT, TOTAL, MULTIPAGE): the first page has arrived, TOTAL is the server item count or None.
+        page(END_POINT, ROWS, BYTES, LATENCY): a page was fetched with ROWS items, BYTES of body, in LATENCY seconds.
+        retry(END_POINT, ATTEMPT, REASON): a request failed and is about to be retried.
+        close(END_POINT): the query finished.
+
+    Usage:
+        >>> class RowLogger(ProgressReporter):
+        ...     def page(self, END_POINT, ROWS, BYTES, LATENCY):
+        ...         print(END_POINT, ROWS)
+        >>> set_default_reporter(RowLogger())
+
+    Press q to quit.
+    """
+
+    def start(self, END_POINT, TOTAL, MULTIPAGE):
+        pass
+
+    def page(self, END_POINT, ROWS, BYTES, LATENCY):
+        pass
+
+    def retry(self, END_POINT, ATTEMPT, REASON):
+        pass
+
+    def close(self, END_POINT):
+        pass
+
+
+# Shared no-op instance used for silent queries
+NULL_REPORTER = ProgressReporter()
+
+
+class TqdmProgressReporter(ProgressReporter):
+    """
+    Draws a tqdm progress bar for multi-page queries. This is the reporter used for verbose mode 2.
+    """
+
+    def __init__(self):
+        self._pbar = None
+
+    def start(self, END_POINT, TOTAL, MULTIPAGE):
+        if not MULTIPAGE:
+            return
+
+        from .mindat_api import get_tqdm
+        tqdm = get_tqdm()
+        self._pbar = tqdm(total=TOTAL, desc="Fetching data") if TOTAL is not None else tqdm(desc="Fetching data")
+
+    def page(self, END_POINT, ROWS, BYTES, LATENCY):
+        if self._pbar is not None:
+            self._pbar.update(ROWS)
+            self._pbar.set_postfix()
+
+    def retry(self, END_POINT, ATTEMPT, REASON):
+        if self._pbar is not None:
+            self._pbar.set_postfix({'retry attempt': ATTEMPT})
+
+    def close(self, END_POINT):
+        if self._pbar is not None:
+            self._pbar.close()
+            self._pbar = None
+
+
+class CallbackProgressReporter(ProgressReporter):
+    """
+    Forwards every event to a single callable as a dictionary, e.g. to feed a logger or a metrics client.
+
+    Args:
+        CALLBACK (callable): Called with one dict per event. The dict always holds 'event', 'end_point' and 'time',
+            plus the event fields ('total', 'multipage', 'rows', 'bytes', 'latency', 'attempt', 'reason').
+
+    Usage:
+        >>> import logging
+        >>> set_default_reporter(CallbackProgressReporter(logging.getLogger("mindat").info))
+
+    Press q to quit.
+    """
+
+    def __init__(self, CALLBACK):
+        if not callable(CALLBACK):
+            raise TypeError("CALLBACK must be callable.")
+        self._callback = CALLBACK
+
+    def _emit(self, EVENT, END_POINT, **FIELDS):
+        FIELDS.update({'event': EVENT, 'end_point': END_POINT, 'time': time.time()})
+        self._callback(FIELDS)
+
+    def start(self, END_POINT, TOTAL, MULTIPAGE):
+        self._emit('start', END_POINT, total=TOTAL, multipage=MULTIPAGE)
+
+    def page(self, END_POINT, ROWS, BYTES, LATENCY):
+        self._emit('page', END_POINT, rows=ROWS, bytes=BYTES, latency=LATENCY)
+
+    def retry(self, END_POINT, ATTEMPT, REASON):
+        self._emit('retry', END_POINT, attempt=ATTEMPT, reason=REASON)
+
+    def close(self, END_POINT):
+        self._emit('close', END_POINT)
+
+
+_default_reporter = None
+
+def set_default_reporter(REPORTER):
+    '''
+    Sets the reporter used by every MindatApi instance that has no reporter of its own.
+    A custom reporter receives events regardless of the retriever's verbose mode.
+
+    Args:
+        REPORTER (ProgressReporter or None): The reporter, or None to restore the verbose based default.
+    '''
+    global _default_reporter
+    if REPORTER is not None and not isinstance(REPORTER, ProgressReporter):
+        raise TypeError("REPORTER must be a ProgressReporter instance.")
+    _default_reporter = REPORTER
+
+
+def get_reporter(VERBOSE = 2):
+    '''
+    Returns the reporter for a query: the default reporter if one was set,
+    otherwise a tqdm bar for verbose mode 2 and the no-op reporter for anything else.
+    '''
+    if _default_reporter is not None:
+        return _default_reporter
+    if VERBOSE == 2:
+        return TqdmProgressReporter()
+    return NULL_REPORTER
@@ -0,0 +1,123 @@
+import copy
+from types import MappingProxyType
+
+from .mindat_api import query_key
+
+
+class FrozenQuery:
+    """
+    An immutable query built from any retriever class. Every chained filter call returns a new
+    FrozenQuery and leaves the original untouched, so a query can be built once and shared between
+    threads, and since equal queries compare and hash equal it can be used as a dictionary or cache key.
+    Queries that differ only in the order of a multiple choice list (e.g. crystal_system) or in their
+    verbosity are equal, since they return the same result (see mindat_api.query_key).
+
+    The retriever's own methods do the work: a call copies the frozen state into a private retriever,
+    runs the method there, and either freezes the result (filter methods, which return the retriever)
+    or returns it (get_dict(), saveto(), ...). The reset a retriever does after executing only touches
+    that private copy.
+
+    Args:
+        RETRIEVER: A retriever class, e.g. GeomaterialRetriever, or a retriever instance whose current
+            filters are frozen.
+
+    Usage:
+        >>> base = FrozenQuery(GeomaterialRetriever).ima(True).verbose(0)
+        >>> dense = base.density_min(4)
+        >>> with ThreadPoolExecutor(8) as pool:
+        ...     results = list(pool.map(lambda q: q.get_dict(), [base.crystal_system(s) for s in systems]))
+        >>> cache[dense] = dense.get_dict()
+        >>> base.crystal_system(['Trigonal', 'Hexagonal']) == base.crystal_system(['Hexagonal', 'Trigonal']).verbose(2)
+        True
+
+    Press q to quit.
+    """
+
+    __slots__ = ('_retriever_class', '_state', '_key', '_hash')
+
+    def __init__(self, RETRIEVER):
+        retriever = RETRIEVER() if isinstance(RETRIEVER, type) else RETRIEVER
+        self._set(type(retriever), vars(retriever))
+
+    def _set(self, RETRIEVER_CLASS, STATE):
+        state = copy.deepcopy(STATE)
+        params = state.get('_params', {})
+        # verbose_flag only changes how a query reports progress, not what it returns
+        others = tuple(sorted((name, repr(value)) for name, value in state.items() if name not in ('_params', 'verbose_flag')))
+        key = (RETRIEVER_CLASS.__module__ + '.' + RETRIEVER_CLASS.__qualname__, others) + query_key(params, state.get('end_point', ''))
+        object.__setattr__(self, '_retriever_class', RETRIEVER_CLASS)
+        object.__setattr__(self, '_state', state)
+        object.__setattr__(self, '_key', key)
+        object.__setattr__(self, '_hash', hash(key))
+
+    @classmethod
+    def _from_retriever(cls, RETRIEVER):
+        query = cls.__new__(cls)
+        query._set(type(RETRIEVER), vars(RETRIEVER))
+        return query
+
+    def thaw(self):
+        '''
+        Returns a new, mutable retriever holding this query's filters.
+        '''
+        retriever = self._retriever_class.__new__(self._retriever_class)
+        retriever.__dict__.update(copy.deepcopy(self._state))
+        return retriever
+
+    def __getattr__(self, name):
+        method = getattr(self._retriever_class, name, None)
+        if name.startswith('_') or not callable(method):
+            raise AttributeError(f"'{self._retriever_class.__name__}' query has no method '{name}'")
+
+        def call(*args, **kwargs):
+            retriever = self.thaw()
+            result = getattr(retriever, name)(*args, **kwargs)
+            if result is retriever:
+                return FrozenQuery._from_retriever(retriever)
+            return result
+
+        call.__name__ = name
+        call.__doc__ = method.__doc__
+        return call
+
+    def __setattr__(self, name, value):
+        raise AttributeError("FrozenQuery is immutable, chained calls return a new query")
+
+    def __delattr__(self, name):
+        raise AttributeError("FrozenQuery is immutable")
+
+    @property
+    def params(self):
+        '''
+        A read-only copy of the query parameters.
+        '''
+        return MappingProxyType(copy.deepcopy(self._state.get('_params', {})))
+
+    @property
+    def end_point(self):
+        return self._state.get('end_point')
+
+    @property
+    def retriever_class(self):
+        return self._retriever_class
+
+    def __eq__(self, other):
+        if not isinstance(other, FrozenQuery):
+            return NotImplemented
+        return self._key == other._key
+
+    def __hash__(self):
+        return self._hash
+
+    def __reduce__(self):
+        # rebuilt from the retriever state, so queries can be sent to worker processes
+        return (_unpickle, (self._retriever_class, self._state))
+
+    def __repr__(self):
+        return f"FrozenQuery({self._retriever_class.__name__}, {self.end_point!r}, {dict(self.params)!r})"
+
+
+def _unpickle(RETRIEVER_CLASS, STATE):
+    query = FrozenQuery.__new__(FrozenQuery)
+    query._set(RETRIEVER_CLASS, STATE)
+    return query
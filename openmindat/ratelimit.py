@@ -0,0 +1,215 @@
+import time
+import threading
+import contextvars
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+
+# Request priority classes, most urgent first
+PRIORITIES = ('interactive', 'bulk')
+
+_priority = contextvars.ContextVar('mindat_request_priority', default=None)
+
+
+class RateLimiter:
+    """
+    A thread-safe token bucket: on average RATE acquisitions per second, with bursts of up to BURST.
+    acquire() blocks until a token is available and returns the seconds it waited.
+
+    Args:
+        RATE (float): Requests per second.
+        BURST (int): Bucket size, i.e. how many requests may be sent at once after a quiet period.
+
+    Usage:
+        >>> set_rate_limiter(RateLimiter(5))      # every MindatApi request in this process, at most 5/s
+        >>> set_rate_limiter(None)                # no limit
+    """
+
+    def __init__(self, RATE, BURST = None):
+        if RATE <= 0:
+            raise ValueError(f"Invalid RATE: {RATE}\nThe rate must be a positive number of requests per second.")
+        self.rate = float(RATE)
+        self.burst = float(BURST if BURST is not None else max(1.0, RATE))
+        if self.burst < 1:
+            raise ValueError(f"Invalid BURST: {BURST}\nThe burst must be at least 1.")
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def available(self):
+        '''
+        Returns the number of tokens that could be taken right now.
+        '''
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
+
+    def try_acquire(self, TOKENS = 1):
+        '''
+        Takes TOKENS without waiting; returns False if there are not enough.
+        '''
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= TOKENS:
+                self._tokens -= TOKENS
+                return True
+            return False
+
+    def acquire(self, TOKENS = 1, PRIORITY = None):
+        '''
+        Takes TOKENS, sleeping until they are available. Returns the seconds spent waiting.
+        PRIORITY is accepted for compatibility with RequestScheduler and ignored.
+        '''
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= TOKENS:
+                    self._tokens -= TOKENS
+                    return waited
+                delay = (TOKENS - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class RequestScheduler(RateLimiter):
+    """
+    A rate limiter that hands out its tokens by priority class, so interactive lookups are not stuck
+    behind the page fetches of bulk crawls sharing the same rate budget. Waiting requests of a more urgent
+    class always go first; within a class, the waiting threads take turns (round robin), so one crawl
+    cannot hold the budget while another waits. The total rate stays at RATE.
+
+    A request's class is, in this order: the PRIORITY passed to acquire(), the class set with the
+    priority() context manager, or 'interactive'. MindatApi passes 'bulk' for the follow-up pages of
+    multipage queries unless a class was set, so long crawls yield to lookups without any setup.
+
+    Args:
+        RATE (float): Requests per second.
+        BURST (int): Bucket size.
+
+    Usage:
+        >>> set_rate_limiter(RequestScheduler(5))
+        >>> with priority('bulk'):
+        ...     LocalitiesRetriever().saveto()      # waits whenever an interactive request is queued
+    """
+
+    def __init__(self, RATE, BURST = None):
+        super().__init__(RATE, BURST)
+        self.priorities = PRIORITIES
+        self._condition = threading.Condition(self._lock)
+        # per class: flow (thread) -> its waiting tickets, in round-robin order
+        self._queues = [OrderedDict() for _ in self.priorities]
+        self.granted = {name: 0 for name in self.priorities}
+
+    def _class(self, PRIORITY):
+        name = PRIORITY if PRIORITY is not None else (_priority.get() or self.priorities[0])
+        try:
+            return self.priorities.index(name)
+        except ValueError:
+            raise ValueError(f"Invalid PRIORITY: {name}\nPossible options: {self.priorities}") from None
+
+    def _head(self):
+        for queue in self._queues:
+            if queue:
+                return queue[next(iter(queue))][0]
+        return None
+
+    def _pop(self, level, flow):
+        queue = self._queues[level]
+        tickets = queue[flow]
+        tickets.popleft()
+        # the flow goes to the back of its class, so the other waiting threads get their turn first
+        del queue[flow]
+        if tickets:
+            queue[flow] = tickets
+
+    def acquire(self, TOKENS = 1, PRIORITY = None):
+        '''
+        Takes TOKENS once every more urgent request and the earlier turns of this class are served.
+        Returns the seconds spent waiting.
+        '''
+        level = self._class(PRIORITY)
+        flow = threading.get_ident()
+        ticket = object()
+        started = time.monotonic()
+        with self._condition:
+            self._queues[level].setdefault(flow, deque()).append(ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if self._head() is ticket:
+                        if self._tokens >= TOKENS:
+                            self._tokens -= TOKENS
+                            self._pop(level, flow)
+                            self.granted[self.priorities[level]] += 1
+                            # the next head has to work out how long it waits
+                            self._condition.notify_all()
+                            return time.monotonic() - started
+                        self._condition.wait((TOKENS - self._tokens) / self.rate)
+                    else:
+                        self._condition.wait()
+            except BaseException:
+                # e.g. KeyboardInterrupt while waiting: leave the queue so the others are not blocked
+                tickets = self._queues[level].get(flow)
+                if tickets is not None and ticket in tickets:
+                    tickets.remove(ticket)
+                    if not tickets:
+                        del self._queues[level][flow]
+                self._condition.notify_all()
+                raise
+
+    def waiting(self):
+        '''
+        Returns the number of queued requests per class.
+        '''
+        with self._lock:
+            return {name: sum(len(t) for t in queue.values()) for name, queue in zip(self.priorities, self._queues)}
+
+
+@contextmanager
+def priority(PRIORITY):
+    '''
+    Sets the priority class of the Mindat requests made by this thread inside the block, e.g. 'bulk'
+    around a background crawl. Only a RequestScheduler uses it.
+
+    Example:
+        >>> with priority('bulk'):
+        ...     LocalitiesRetriever().saveto()
+    '''
+    token = _priority.set(PRIORITY)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority():
+    '''
+    Returns the priority class set with priority() for this thread, or None.
+    '''
+    return _priority.get()
+
+
+_limiter = None
+
+def get_rate_limiter():
+    '''
+    Returns the process-wide RateLimiter every MindatApi request waits on, or None when requests are not limited.
+    '''
+    return _limiter
+
+
+def set_rate_limiter(LIMITER):
+    '''
+    Replaces the process-wide rate limiter and returns the previous one. Pass None to remove the limit.
+    '''
+    global _limiter
+    previous = _limiter
+    _limiter = LIMITER
+    return previous
@@ -0,0 +1,303 @@
+import os
+import json
+import time
+import threading
+from pathlib import Path
+
+from . import mindat_api
+from . import tracing
+
+
+# Small, slow-changing lookup tables that locality records refer to by id
+REFERENCE_TABLES = ('locality_type', 'locality_status', 'locality_age', 'countries')
+
+# Default time to live of a cached table, in seconds
+DEFAULT_TTL = 7 * 24 * 3600
+
+DEFAULT_CACHE_DIR = './mindat_data/reference/'
+
+# Locality field -> (reference table, field of the table it matches). Localities name their country
+# instead of giving its id, so countries are joined on 'text'.
+DEFAULT_JOINS = {
+    'loc_status': ('locality_status', 'id'),
+    'loctype': ('locality_type', 'id'),
+    'age': ('locality_age', 'id'),
+    'country': ('countries', 'text'),
+}
+
+
+def _key(ID):
+    # ids arrive as ints from the API but often as strings from files and user input
+    try:
+        return int(ID)
+    except (TypeError, ValueError):
+        return ID
+
+
+class ReferenceTable:
+    """
+    One reference table held as an id -> record dictionary.
+
+    Attributes:
+        name (str): The endpoint the table was loaded from, e.g. 'locality_type'.
+        fetched_at (float): time.time() when the table was downloaded.
+    """
+
+    def __init__(self, NAME, RECORDS, FETCHED_AT):
+        self.name = NAME
+        self.fetched_at = FETCHED_AT
+        self._records = {_key(record.get('id')): record for record in RECORDS}
+        self._indexes = {}
+
+    def get(self, ID, DEFAULT = None):
+        return self._records.get(_key(ID), DEFAULT)
+
+    def __getitem__(self, ID):
+        return self._records[_key(ID)]
+
+    def __contains__(self, ID):
+        return _key(ID) in self._records
+
+    def __len__(self):
+        return len(self._records)
+
+    def __iter__(self):
+        return iter(self._records.values())
+
+    def index_by(self, FIELD):
+        '''
+        Returns a FIELD value -> record dictionary, built on first use. index_by('id') is the main index.
+        '''
+        if FIELD == 'id':
+            return self._records
+        index = self._indexes.get(FIELD)
+        if index is None:
+            index = {}
+            for record in self._records.values():
+                index.setdefault(record.get(FIELD), record)
+            self._indexes[FIELD] = index
+        return index
+
+    def age(self):
+        return time.time() - self.fetched_at
+
+    def __repr__(self):
+        return f"ReferenceTable({self.name!r}, {len(self)} records)"
+
+
+class ReferenceRegistry:
+    """
+    Loads the locality reference tables (locality_type, locality_status, locality_age and countries) once,
+    keeps them in memory for O(1) id lookups and persists them to CACHE_DIR, so later processes start from
+    disk. A table older than TTL seconds is downloaded again on next use; if that download fails the stale
+    copy is kept and a warning is printed. Lookups never make a request per record.
+
+    Args:
+        CACHE_DIR (str): Directory of the cached tables. None keeps them in memory only.
+        TTL (float): Seconds before a cached table is refreshed.
+        TABLES (tuple of str): The endpoints the registry may load.
+
+    Usage:
+        >>> registry = ReferenceRegistry()
+        >>> registry.lookup('locality_type', 12)
+        {'id': 12, 'description': 'Mine'}
+        >>> registry.preload()
+
+    Press q to quit.
+    """
+
+    def __init__(self, CACHE_DIR = DEFAULT_CACHE_DIR, TTL = DEFAULT_TTL, TABLES = REFERENCE_TABLES):
+        self.cache_dir = Path(CACHE_DIR) if CACHE_DIR is not None else None
+        self.ttl = TTL
+        self.tables = tuple(TABLES)
+        self._tables = {}
+        self._lock = threading.Lock()
+        self._table_locks = {name: threading.Lock() for name in self.tables}
+
+    def _check_name(self, NAME):
+        if NAME not in self._table_locks:
+            raise ValueError(f"Unknown reference table: {NAME}\nPossible options: {self.tables}")
+
+    def _cache_path(self, NAME):
+        return self.cache_dir / (NAME + '.json')
+
+    def _fresh(self, TABLE):
+        return TABLE is not None and (self.ttl is None or TABLE.age() < self.ttl)
+
+    def _read_cache(self, NAME):
+        if self.cache_dir is None:
+            return None
+        try:
+            with open(self._cache_path(NAME), 'r') as f:
+                data = json.load(f)
+            return ReferenceTable(NAME, data['results'], data['fetched_at'])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _write_cache(self, NAME, RESULTS, FETCHED_AT):
+        if self.cache_dir is None:
+            return
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self._cache_path(NAME)
+        part_path = path.with_name(path.name + '.part')
+        with open(part_path, 'w') as f:
+            json.dump({'end_point': NAME, 'fetched_at': FETCHED_AT, 'results': RESULTS}, f, separators=(',', ':'))
+        os.replace(part_path, path)
+
+    def _download(self, NAME):
+        with tracing.start_span('ReferenceRegistry.download', end_point=NAME):
+            ma = mindat_api.MindatApi()
+            json_data = ma.get_mindat_json({'format': 'json', 'page_size': 1500}, NAME, 0)
+        results = json_data.get('results', [])
+        fetched_at = time.time()
+        self._write_cache(NAME, results, fetched_at)
+        return ReferenceTable(NAME, results, fetched_at)
+
+    def table(self, NAME):
+        '''
+        Returns the ReferenceTable for an endpoint, loading it from memory, disk or the API in that order.
+        '''
+        self._check_name(NAME)
+        table = self._tables.get(NAME)
+        if self._fresh(table):
+            return table
+
+        # one lock per table, so concurrent callers wait for a single download instead of each starting one
+        with self._table_locks[NAME]:
+            table = self._tables.get(NAME)
+            if self._fresh(table):
+                return table
+
+            stale = table
+            cached = self._read_cache(NAME)
+            if self._fresh(cached):
+                table = cached
+            else:
+                stale = stale or cached
+                try:
+                    table = self._download(NAME)
+                except Exception as e:
+                    if stale is None:
+                        raise
+                    print(f"Could not refresh the {NAME} reference table, using the copy from "
+                          f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(stale.fetched_at))}: {e!r}")
+                    table = stale
+
+            with self._lock:
+                self._tables[NAME] = table
+            return table
+
+    def lookup(self, NAME, ID, DEFAULT = None):
+        '''
+        Returns the record with the given id from a reference table, or DEFAULT.
+
+        Example:
+            >>> get_registry().lookup('locality_status', 3)
+        '''
+        return self.table(NAME).get(ID, DEFAULT)
+
+    def preload(self, NAMES = None):
+        '''
+        Loads several tables up front, e.g. before handing the registry to worker threads.
+        '''
+        for name in (NAMES if NAMES is not None else self.tables):
+            self.table(name)
+        return self
+
+    def refresh(self, NAME = None):
+        '''
+        Downloads one table, or every table already loaded, again regardless of its age.
+        '''
+        names = [NAME] if NAME is not None else list(self._tables)
+        for name in names:
+            self._check_name(name)
+            with self._table_locks[name]:
+                table = self._download(name)
+                with self._lock:
+                    self._tables[name] = table
+
+    def clear(self):
+        '''
+        Drops the in-memory tables; the disk cache is kept.
+        '''
+        with self._lock:
+            self._tables.clear()
+
+
+class Enricher:
+    """
+    Denormalizes locality records with their reference records: a hash join of each record against the
+    cached tables of a ReferenceRegistry, one record at a time, so it can sit between a page stream and
+    an output file. For every joined FIELD the matching reference record is added as '<FIELD>_detail'
+    (a list when the field holds several values, None when nothing matches).
+
+    Args:
+        REGISTRY (ReferenceRegistry): Defaults to get_registry().
+        JOINS (dict): FIELD -> (table, table field), see DEFAULT_JOINS.
+
+    Usage:
+        >>> enricher = Enricher()
+        >>> enricher.enrich({'id': 1, 'loc_status': 3, 'country': 'France'})
+        {'id': 1, 'loc_status': 3, 'country': 'France', 'loc_status_detail': {...}, 'country_detail': {...}}
+    """
+
+    def __init__(self, REGISTRY = None, JOINS = None):
+        self.registry = REGISTRY if REGISTRY is not None else get_registry()
+        self.joins = dict(JOINS if JOINS is not None else DEFAULT_JOINS)
+        self._lookups = None
+
+    def _prepare(self):
+        # resolves every table once, so the per-record work is only dictionary lookups
+        lookups = []
+        for field, (name, key) in self.joins.items():
+            index = self.registry.table(name).index_by(key)
+            lookups.append((field, field + '_detail', index, key == 'id'))
+        self._lookups = lookups
+        return lookups
+
+    def enrich(self, RECORD):
+        '''
+        Returns a copy of RECORD with the '<FIELD>_detail' entries added.
+        '''
+        lookups = self._lookups if self._lookups is not None else self._prepare()
+        enriched = dict(RECORD)
+        for field, target, index, by_id in lookups:
+            if field not in RECORD:
+                continue
+            value = RECORD[field]
+            if isinstance(value, list):
+                enriched[target] = [index.get(_key(v) if by_id else v) for v in value]
+            else:
+                enriched[target] = index.get(_key(value) if by_id else value)
+        return enriched
+
+    def enrich_many(self, RECORDS):
+        '''
+        Lazily enriches an iterable of records.
+        '''
+        self._prepare()
+        for record in RECORDS:
+            yield self.enrich(record)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_registry():
+    '''
+    Returns the process-wide ReferenceRegistry, created on first use with the default cache directory and TTL.
+    '''
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ReferenceRegistry()
+    return _registry
+
+
+def set_registry(REGISTRY):
+    '''
+    Replaces the process-wide registry, e.g. with one using another cache directory or TTL. Pass None to reset it.
+    '''
+    global _registry
+    _registry = REGISTRY
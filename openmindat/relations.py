@@ -0,0 +1,272 @@
+import pickle
+from array import array
+from collections import deque
+
+
+# Geomaterial fields that point at another geomaterial id, in the order canonical() follows them
+RELATIONS = ('synid', 'varietyof', 'polytypeof', 'groupid')
+
+# Relations that name the same mineral species; groupid links a member to its group instead
+SPECIES_RELATIONS = ('synid', 'varietyof', 'polytypeof')
+
+
+def _relation_mask(RELATIONS_ARG):
+    names = (RELATIONS_ARG,) if isinstance(RELATIONS_ARG, str) else tuple(RELATIONS_ARG)
+    mask = 0
+    for name in names:
+        if name not in RELATIONS:
+            raise ValueError(f"Unknown relation: {name}\nPossible options: {RELATIONS}")
+        mask |= 1 << RELATIONS.index(name)
+    return mask
+
+
+def _csr(count, sources, targets, labels):
+    # counting sort of the edges by source into offsets/targets/labels arrays
+    offsets = array('i', [0]) * (count + 1)
+    for s in sources:
+        offsets[s + 1] += 1
+    for i in range(count):
+        offsets[i + 1] += offsets[i]
+
+    position = array('i', offsets[:-1])
+    out_targets = array('i', [0]) * len(sources)
+    out_labels = array('b', [0]) * len(sources)
+    for s, t, l in zip(sources, targets, labels):
+        p = position[s]
+        out_targets[p] = t
+        out_labels[p] = l
+        position[s] = p + 1
+    return offsets, out_targets, out_labels
+
+
+class GeomaterialGraph:
+    """
+    An in-process index of the synonym, variety, polytype and group relations between geomaterials.
+    Geomaterial ids are mapped to dense integers and the edges are stored CSR-style in compact integer
+    arrays, once per direction, so neighbours and transitive closures are walked without a request per
+    mineral. canonical() resolves a name or id to its species and is memoized, for resolving large
+    numbers of sample labels.
+
+    Args:
+        RECORDS (iterable of dict): Geomaterial records with 'id', 'name' and any of the relation fields.
+
+    Usage:
+        >>> graph = GeomaterialRetriever().get_graph()
+        >>> graph.closure('Quartz')
+        [3337, 3338, ...]
+        >>> graph.canonical('Amethyst')
+        3337
+
+    Press q to quit.
+    """
+
+    def __init__(self, RECORDS = ()):
+        self._ids = array('q')
+        self._names = []
+        self._index = {}
+        self._by_name = {}
+        self._sources = array('i')
+        self._targets = array('i')
+        self._labels = array('b')
+        self._built = None
+        self._canonical = {}
+        self.add_records(RECORDS)
+
+    def _node(self, ID):
+        node = self._index.get(ID)
+        if node is None:
+            node = self._index[ID] = len(self._ids)
+            self._ids.append(ID)
+            self._names.append(None)
+        return node
+
+    def add_records(self, RECORDS):
+        '''
+        Adds geomaterial records; the arrays are rebuilt on the next query.
+        '''
+        for record in RECORDS:
+            try:
+                record_id = int(record['id'])
+            except (KeyError, TypeError, ValueError):
+                continue
+            node = self._node(record_id)
+            name = record.get('name')
+            if name:
+                self._names[node] = name
+                self._by_name.setdefault(name.lower(), record_id)
+            for label, relation in enumerate(RELATIONS):
+                try:
+                    target = int(record.get(relation) or 0)
+                except (TypeError, ValueError):
+                    continue
+                # 0 means "no relation" in the Mindat fields
+                if target and target != record_id:
+                    self._sources.append(node)
+                    self._targets.append(self._node(target))
+                    self._labels.append(label)
+        self._built = None
+        self._canonical.clear()
+        return self
+
+    def _arrays(self):
+        if self._built is None:
+            count = len(self._ids)
+            # out: record -> the geomaterial its field points at; in: the reverse
+            self._built = (_csr(count, self._sources, self._targets, self._labels),
+                           _csr(count, self._targets, self._sources, self._labels))
+        return self._built
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, ID_OR_NAME):
+        return self._resolve(ID_OR_NAME, False) is not None
+
+    def _resolve(self, ID_OR_NAME, STRICT = True):
+        if isinstance(ID_OR_NAME, str) and not ID_OR_NAME.strip().isdigit():
+            record_id = self._by_name.get(ID_OR_NAME.strip().lower())
+        else:
+            record_id = int(ID_OR_NAME)
+        node = self._index.get(record_id) if record_id is not None else None
+        if node is None and STRICT:
+            raise KeyError(f"Unknown geomaterial: {ID_OR_NAME}")
+        return node
+
+    def id_for(self, NAME):
+        '''
+        Returns the id of a geomaterial name (case-insensitive), or None.
+        '''
+        return self._by_name.get(NAME.strip().lower())
+
+    def name(self, ID):
+        node = self._index.get(int(ID))
+        return self._names[node] if node is not None else None
+
+    def _walk(self, starts, mask, directions, transitive):
+        built = self._arrays()
+        seen = set(starts)
+        queue = deque(starts)
+        found = []
+        while queue:
+            node = queue.popleft()
+            for offsets, targets, labels in directions(built):
+                for p in range(offsets[node], offsets[node + 1]):
+                    neighbour = targets[p]
+                    if (mask >> labels[p]) & 1 and neighbour not in seen:
+                        seen.add(neighbour)
+                        found.append(neighbour)
+                        if transitive:
+                            queue.append(neighbour)
+        return found
+
+    def neighbours(self, ID_OR_NAME, RELATIONS = RELATIONS, DIRECTION = 'both'):
+        '''
+        Returns the ids directly linked to a geomaterial.
+
+        Args:
+            ID_OR_NAME (int or str): A geomaterial id or name.
+            RELATIONS (tuple of str): The relation fields to follow.
+            DIRECTION (str): 'out' (the geomaterials this one points at), 'in' (those pointing at it) or 'both'.
+        '''
+        return self._query(ID_OR_NAME, RELATIONS, DIRECTION, False)
+
+    def closure(self, ID_OR_NAME, RELATIONS = SPECIES_RELATIONS, DIRECTION = 'both', INCLUDE_SELF = True):
+        '''
+        Returns the ids reachable from a geomaterial over the given relations, e.g. all varieties,
+        synonyms and polytypes of quartz with the defaults.
+        '''
+        ids = self._query(ID_OR_NAME, RELATIONS, DIRECTION, True)
+        if INCLUDE_SELF:
+            ids.insert(0, self._ids[self._resolve(ID_OR_NAME)])
+        return ids
+
+    def _query(self, ID_OR_NAME, RELATIONS_ARG, DIRECTION, TRANSITIVE):
+        if DIRECTION == 'out':
+            directions = lambda built: (built[0],)
+        elif DIRECTION == 'in':
+            directions = lambda built: (built[1],)
+        elif DIRECTION == 'both':
+            directions = lambda built: built
+        else:
+            raise ValueError(f"Invalid DIRECTION: {DIRECTION}\nPossible options: ('out', 'in', 'both')")
+        node = self._resolve(ID_OR_NAME)
+        return [self._ids[n] for n in self._walk([node], _relation_mask(RELATIONS_ARG), directions, TRANSITIVE)]
+
+    def varieties(self, ID_OR_NAME, TRANSITIVE = True):
+        '''
+        Returns the ids of the varieties of a geomaterial (without a request per mineral).
+        '''
+        return self._query(ID_OR_NAME, 'varietyof', 'in', TRANSITIVE)
+
+    def synonyms(self, ID_OR_NAME):
+        '''
+        Returns the ids of every name linked to a geomaterial by synid, in either direction.
+        '''
+        return self._query(ID_OR_NAME, 'synid', 'both', True)
+
+    def group_members(self, ID_OR_NAME, TRANSITIVE = True):
+        '''
+        Returns the ids of the members of a group, including members of its subgroups when TRANSITIVE.
+        '''
+        return self._query(ID_OR_NAME, 'groupid', 'in', TRANSITIVE)
+
+    def canonical(self, ID_OR_NAME):
+        '''
+        Resolves a name or id to its species by following synid, varietyof and polytypeof until none is set,
+        e.g. a synonym of a variety of quartz resolves to quartz. Results are memoized. Returns None for
+        unknown names.
+        '''
+        node = self._resolve(ID_OR_NAME, False)
+        if node is None:
+            return None
+        cached = self._canonical.get(node)
+        if cached is not None:
+            return self._ids[cached]
+
+        offsets, targets, labels = self._arrays()[0]
+        species_labels = len(SPECIES_RELATIONS)
+        path = [node]
+        seen = {node}
+        current = node
+        while True:
+            best = None
+            for p in range(offsets[current], offsets[current + 1]):
+                label = labels[p]
+                if label < species_labels and (best is None or label < labels[best]):
+                    best = p
+            if best is None or targets[best] in seen:
+                break
+            current = targets[best]
+            if current in self._canonical:
+                current = self._canonical[current]
+                break
+            seen.add(current)
+            path.append(current)
+
+        for n in path:
+            self._canonical[n] = current
+        return self._ids[current]
+
+    def save(self, PATH):
+        with open(PATH, 'wb') as f:
+            pickle.dump({'ids': self._ids, 'names': self._names, 'sources': self._sources,
+                         'targets': self._targets, 'labels': self._labels}, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, PATH):
+        '''
+        Loads a graph written by save(). Only load files you created, pickle can run arbitrary code.
+        '''
+        with open(PATH, 'rb') as f:
+            state = pickle.load(f)
+        graph = cls()
+        graph._ids = state['ids']
+        graph._names = state['names']
+        graph._sources = state['sources']
+        graph._targets = state['targets']
+        graph._labels = state['labels']
+        graph._index = {record_id: node for node, record_id in enumerate(graph._ids)}
+        for record_id, name in zip(graph._ids, graph._names):
+            if name:
+                graph._by_name.setdefault(name.lower(), record_id)
+        return graph
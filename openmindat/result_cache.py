@@ -0,0 +1,189 @@
+import time
+import pickle
+import threading
+from collections import OrderedDict
+
+
+# Default memory budget of the cached results, in bytes
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Default time to live of a cached result, in seconds
+DEFAULT_TTL = 300
+
+# Rows pickled to estimate the size of a result before the whole result is pickled
+SAMPLE_ROWS = 16
+
+# Endpoint (first path segment) -> time to live; reference data and classifications change rarely
+DEFAULT_TTLS = {
+    'countries': 24 * 3600,
+    'locality_age': 24 * 3600,
+    'locality_status': 24 * 3600,
+    'locality_type': 24 * 3600,
+    'nickel-strunz-10': 24 * 3600,
+    'dana-8': 24 * 3600,
+    'geomaterials_dict': 24 * 3600,
+}
+
+
+def _rows(RESULT):
+    # the record list of a get_mindat_json result; locgeoregion2 results hold a feature collection
+    rows = RESULT.get('results') if isinstance(RESULT, dict) else None
+    if isinstance(rows, dict):
+        rows = rows.get('features')
+    return rows if isinstance(rows, list) else None
+
+
+def _estimate_bytes(RESULT):
+    '''
+    Estimates the pickled size of a result from SAMPLE_ROWS evenly spaced rows, or returns None for
+    small or unrecognized results, which are cheap to pickle outright.
+    '''
+    rows = _rows(RESULT)
+    if rows is None or len(rows) <= SAMPLE_ROWS:
+        return None
+    step = len(rows) / SAMPLE_ROWS
+    sample = [rows[int(i * step)] for i in range(SAMPLE_ROWS)]
+    return len(pickle.dumps(sample, protocol=pickle.HIGHEST_PROTOCOL)) * len(rows) // SAMPLE_ROWS
+
+
+class QueryCache:
+    """
+    A memory-bounded LRU cache of parsed query results, keyed by the canonical form of a query
+    (mindat_api.query_key), so repeated get_dict() calls skip both the request and the JSON decoding.
+    Results are stored pickled: the size of an entry is known exactly, and every hit returns a fresh
+    copy the caller may modify. The size of a large result is estimated from a sample of its rows first,
+    so results that would not fit are not pickled at all. Least recently used entries are evicted once
+    MAX_BYTES is exceeded, and entries expire after the TTL of their endpoint.
+
+    The cache is off unless installed with set_cache(). While it is on, get_dict() may return a result
+    up to its endpoint's TTL old (5 minutes by default) instead of the current data; use invalidate()
+    after changes that must be seen at once.
+
+    Args:
+        MAX_BYTES (int): Memory budget of the pickled results. Larger results are not cached.
+        TTL (float): Default seconds an entry stays valid.
+        TTLS (dict): Endpoint -> seconds, matched on the full endpoint first and then on its first
+            path segment, e.g. 'countries' covers 'countries/12'. 0 disables caching of an endpoint.
+
+    Keys ignore the order of the parameters and of multiple choice list values, so reordered
+    filters are answered from the same entry:
+
+        >>> set_cache(QueryCache())
+        >>> GeomaterialRetriever().crystal_system(['Trigonal', 'Hexagonal']).get_dict()      # request
+        >>> GeomaterialRetriever().crystal_system(['Hexagonal', 'Trigonal']).get_dict()      # cache hit
+        >>> get_cache().stats()['hits']
+        1
+
+    Usage:
+        >>> set_cache(QueryCache(MAX_BYTES=256 * 1024 * 1024, TTLS={'geomaterials': 3600}))
+        >>> get_cache().stats()
+        {'entries': 12, 'bytes': 1830455, 'hits': 40, 'misses': 12, 'evictions': 0, 'expired': 0, 'skipped': 1}
+
+    Press q to quit.
+    """
+
+    def __init__(self, MAX_BYTES = DEFAULT_MAX_BYTES, TTL = DEFAULT_TTL, TTLS = None):
+        self.max_bytes = MAX_BYTES
+        self.ttl = TTL
+        self.ttls = dict(DEFAULT_TTLS if TTLS is None else TTLS)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expired': 0, 'skipped': 0}
+
+    def ttl_for(self, END_POINT):
+        end_point = str(END_POINT).strip('/')
+        if end_point in self.ttls:
+            return self.ttls[end_point]
+        return self.ttls.get(end_point.split('/', 1)[0], self.ttl)
+
+    def _remove(self, key):
+        data, expires = self._entries.pop(key)
+        self._bytes -= len(data)
+
+    def get(self, KEY, DEFAULT = None):
+        '''
+        Returns a copy of the cached result for KEY, or DEFAULT when it is missing or expired.
+        '''
+        with self._lock:
+            entry = self._entries.get(KEY)
+            if entry is None:
+                self._stats['misses'] += 1
+                return DEFAULT
+            data, expires = entry
+            if expires <= time.monotonic():
+                self._remove(KEY)
+                self._stats['expired'] += 1
+                self._stats['misses'] += 1
+                return DEFAULT
+            self._entries.move_to_end(KEY)
+            self._stats['hits'] += 1
+        # unpickled outside the lock, so large hits don't block other threads
+        return pickle.loads(data)
+
+    def put(self, KEY, END_POINT, RESULT):
+        '''
+        Stores RESULT under KEY with the TTL of END_POINT, evicting least recently used entries as needed.
+        '''
+        ttl = self.ttl_for(END_POINT)
+        if not ttl or self.max_bytes <= 0:
+            return
+        estimate = _estimate_bytes(RESULT)
+        if estimate is not None and estimate > self.max_bytes:
+            with self._lock:
+                self._stats['skipped'] += 1
+            return
+        data = pickle.dumps(RESULT, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.max_bytes:
+            with self._lock:
+                self._stats['skipped'] += 1
+            return
+        with self._lock:
+            if KEY in self._entries:
+                self._remove(KEY)
+            self._entries[KEY] = (data, time.monotonic() + ttl)
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._stats['evictions'] += 1
+
+    def invalidate(self, END_POINT = None):
+        '''
+        Drops every entry, or only the entries of one endpoint (and its sub paths, e.g. 'geomaterials/12').
+        '''
+        with self._lock:
+            if END_POINT is None:
+                self._entries.clear()
+                self._bytes = 0
+                return
+            end_point = str(END_POINT).strip('/')
+            for key in [k for k in self._entries if k[2] == end_point or k[2].startswith(end_point + '/')]:
+                self._remove(key)
+
+    def clear(self):
+        self.invalidate()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries), bytes=self._bytes)
+
+
+_cache = None
+
+def get_cache():
+    '''
+    Returns the process-wide QueryCache used by the retrievers' get_dict(), or None while caching is off (the default).
+    '''
+    return _cache
+
+
+def set_cache(CACHE):
+    '''
+    Installs the process-wide cache, e.g. set_cache(QueryCache()) to turn caching on with the defaults.
+    Pass None to turn it off again.
+    '''
+    global _cache
+    _cache = CACHE
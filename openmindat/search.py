@@ -0,0 +1,287 @@
+import re
+import math
+import heapq
+import pickle
+import threading
+from bisect import bisect_left
+from operator import itemgetter
+
+
+# Geomaterial field -> weight of a match in that field
+SEARCH_FIELDS = {
+    'name': 3.0,
+    'mindat_formula': 1.5,
+    'ima_formula': 1.5,
+    'colour': 1.0,
+    'streak': 1.0,
+    'csystem': 1.0,
+    'description_short': 0.5,
+}
+
+_TAG = re.compile(r'<[^>]+>')
+_WORD = re.compile(r'[^\W_]+')
+
+# Most frequent terms a short prefix expands to, so a one-letter prefix stays fast
+PREFIX_EXPANSIONS = 50
+
+# Number of memoized prefix expansions
+PREFIX_CACHE_SIZE = 4096
+
+# Score multipliers for terms that only match a prefix or a misspelling of the query
+PREFIX_WEIGHT = 0.8
+FUZZY_WEIGHT = 0.5
+
+
+def tokenize(TEXT):
+    '''
+    Lowercase word tokens of a text, with HTML tags such as the <sub> of Mindat formulas removed.
+
+    Example:
+        >>> tokenize('Cu<sub>2</sub>S, dark grey')
+        ['cu2s', 'dark', 'grey']
+    '''
+    if not TEXT:
+        return []
+    if not isinstance(TEXT, str):
+        TEXT = ' '.join(str(t) for t in TEXT) if isinstance(TEXT, (list, tuple)) else str(TEXT)
+    return _WORD.findall(_TAG.sub('', TEXT).lower())
+
+
+def _deletions(term):
+    return {term[:i] + term[i + 1:] for i in range(len(term))}
+
+
+class GeomaterialSearchIndex:
+    """
+    An offline full-text index over geomaterial records with BM25 ranking, prefix matching of the last
+    word (for typeahead) and one-edit fuzzy matching of misspelt words. Terms of every field in FIELDS
+    are indexed with the field's weight; the per-term BM25 scores are computed once when the index is
+    finalized, so a query only merges a few posting dictionaries. Searching is thread-safe, so one index
+    can serve a multi-threaded typeahead service; add_records() must not run while other threads search.
+
+    Query syntax follows geomaterials_search(): comma or space separated keywords, all of which must match.
+
+    Args:
+        RECORDS (iterable of dict): Geomaterial records.
+        FIELDS (dict): Field -> weight, see SEARCH_FIELDS.
+        K1 (float), B (float): BM25 parameters.
+
+    Usage:
+        >>> index = GeomaterialRetriever().get_search_index()
+        >>> index.search("quartz, green, hexa")
+        [(8.1, {'id': 3337, 'name': 'Quartz', ...}), ...]
+
+    Press q to quit.
+    """
+
+    def __init__(self, RECORDS = (), FIELDS = None, K1 = 1.2, B = 0.75):
+        self.fields = dict(FIELDS if FIELDS is not None else SEARCH_FIELDS)
+        self.k1 = K1
+        self.b = B
+        self._records = []
+        self._frequencies = {}
+        self._lengths = []
+        self._scores = None
+        self._terms = None
+        self._ranked = {}
+        self._prefixes = {}
+        self._deletion_index = None
+        # guards the lazily built scores and the memoized prefixes, rankings and deletion index
+        self._lock = threading.Lock()
+        self.add_records(RECORDS)
+
+    def add_records(self, RECORDS):
+        '''
+        Adds geomaterial records; the scores are recomputed on the next search.
+        '''
+        frequencies = self._frequencies
+        for record in RECORDS:
+            doc = len(self._records)
+            self._records.append(record)
+            counts = {}
+            length = 0.0
+            for field, weight in self.fields.items():
+                for token in tokenize(record.get(field)):
+                    counts[token] = counts.get(token, 0.0) + weight
+                    length += weight
+            self._lengths.append(length)
+            for token, count in counts.items():
+                frequencies.setdefault(token, {})[doc] = count
+        self._scores = None
+        self._terms = None
+        self._deletion_index = None
+        return self
+
+    def __len__(self):
+        return len(self._records)
+
+    def _finalize(self):
+        if self._scores is not None:
+            return
+        with self._lock:
+            if self._scores is None:
+                self._compute_scores()
+
+    def _compute_scores(self):
+        count = len(self._records)
+        average = (sum(self._lengths) / count) if count else 1.0
+        k1, b, lengths = self.k1, self.b, self._lengths
+        scores = {}
+        for term, postings in self._frequencies.items():
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            scores[term] = {doc: idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * lengths[doc] / (average or 1.0)))
+                            for doc, tf in postings.items()}
+        self._terms = sorted(scores)
+        self._ranked = {}
+        self._prefixes = {}
+        # set last: other threads take a non-None _scores as a finished index
+        self._scores = scores
+
+    def _fuzzy_terms(self, token):
+        # symmetric deletion: terms sharing a one-deletion variant with the token are one edit apart,
+        # counting substitutions and adjacent transpositions
+        if self._deletion_index is None:
+            with self._lock:
+                if self._deletion_index is None:
+                    index = {}
+                    for term in self._terms:
+                        if len(term) >= 4:
+                            for variant in _deletions(term) | {term}:
+                                index.setdefault(variant, []).append(term)
+                    self._deletion_index = index
+        found = set()
+        for variant in _deletions(token) | {token}:
+            found.update(self._deletion_index.get(variant, ()))
+        found.discard(token)
+        return found
+
+    def _prefix_terms(self, prefix):
+        # prefixes are typed over and over in a typeahead box, so their expansions are memoized
+        cached = self._prefixes.get(prefix)
+        if cached is not None:
+            return cached
+        terms = self._terms
+        matches = []
+        position = bisect_left(terms, prefix)
+        while position < len(terms) and terms[position].startswith(prefix):
+            matches.append(terms[position])
+            position += 1
+        if len(matches) > PREFIX_EXPANSIONS:
+            matches = heapq.nlargest(PREFIX_EXPANSIONS, matches, key=lambda t: len(self._scores[t]))
+        with self._lock:
+            if prefix not in self._prefixes:
+                if len(self._prefixes) >= PREFIX_CACHE_SIZE:
+                    del self._prefixes[next(iter(self._prefixes))]
+                self._prefixes[prefix] = matches
+        return matches
+
+    def _expansions(self, token, prefix, fuzzy):
+        expansions = {}
+        if token in self._scores:
+            expansions[token] = 1.0
+        if prefix:
+            for term in self._prefix_terms(token):
+                if term != token:
+                    expansions.setdefault(term, PREFIX_WEIGHT)
+        if fuzzy and not expansions and len(token) >= 4:
+            for term in self._fuzzy_terms(token):
+                expansions.setdefault(term, FUZZY_WEIGHT)
+        return expansions
+
+    def search(self, QUERY, LIMIT = 10, PREFIX = True, FUZZY = True):
+        '''
+        Returns up to LIMIT (score, record) pairs, best first.
+
+        Args:
+            QUERY (str): Keywords, e.g. "quartz, green, hexagonal".
+            LIMIT (int): Maximum number of results.
+            PREFIX (bool): Let the last word match as a prefix, e.g. "chalco" finds chalcopyrite.
+            FUZZY (bool): Let words without an exact or prefix match match a one-edit misspelling.
+        '''
+        self._finalize()
+        tokens = tokenize(QUERY)
+        if not tokens:
+            return []
+
+        expansions = [self._expansions(token, PREFIX and position == len(tokens) - 1, FUZZY)
+                      for position, token in enumerate(tokens)]
+        if not all(expansions):
+            return []
+
+        if len(expansions) == 1:
+            # a document's score is its best term's score, so the top results are among each term's top LIMIT
+            candidates = {}
+            for term, weight in expansions[0].items():
+                for doc, score in self._top_postings(term, LIMIT):
+                    score *= weight
+                    if score > candidates.get(doc, 0.0):
+                        candidates[doc] = score
+            top = heapq.nlargest(LIMIT, candidates.items(), key=itemgetter(1))
+            return [(score, self._records[doc]) for doc, score in top]
+
+        # intersect starting from the word with the fewest postings; once few candidates are left,
+        # the remaining words are scored by looking the candidates up instead of merging whole posting lists
+        expansions.sort(key=lambda e: sum(len(self._scores[term]) for term in e))
+        totals = None
+        for terms in expansions:
+            if totals is not None and len(terms) > 1 and len(totals) * len(terms) < sum(len(self._scores[term]) for term in terms):
+                scored = {}
+                for doc, total in totals.items():
+                    best = max((self._scores[term].get(doc, 0.0) * weight for term, weight in terms.items()), default=0.0)
+                    if best:
+                        scored[doc] = total + best
+                totals = scored
+            else:
+                if len(terms) == 1:
+                    # a single term's postings are used as they are, with its weight applied while intersecting
+                    (term, factor), = terms.items()
+                    best = self._scores[term]
+                else:
+                    factor = 1.0
+                    best = {}
+                    for term, weight in terms.items():
+                        for doc, score in self._scores[term].items():
+                            score *= weight
+                            if score > best.get(doc, 0.0):
+                                best[doc] = score
+                if totals is None:
+                    totals = {doc: score * factor for doc, score in best.items()} if factor != 1.0 or len(expansions) == 1 else best
+                elif len(best) < len(totals):
+                    totals = {doc: totals[doc] + score * factor for doc, score in best.items() if doc in totals}
+                else:
+                    totals = {doc: total + best[doc] * factor for doc, total in totals.items() if doc in best}
+            if not totals:
+                return []
+
+        top = heapq.nlargest(LIMIT, totals.items(), key=itemgetter(1))
+        return [(score, self._records[doc]) for doc, score in top]
+
+    def _top_postings(self, term, limit):
+        ranked = self._ranked.get(term)
+        if ranked is None or (len(ranked) < limit and len(ranked) < len(self._scores[term])):
+            ranked = heapq.nlargest(max(limit, 32), self._scores[term].items(), key=itemgetter(1))
+            with self._lock:
+                self._ranked[term] = ranked
+        return ranked[:limit]
+
+    def suggest(self, PREFIX, LIMIT = 10):
+        '''
+        Returns up to LIMIT geomaterial names for a typeahead box, best match first.
+        '''
+        return [record.get('name') for _, record in self.search(PREFIX, LIMIT)]
+
+    def save(self, PATH):
+        with open(PATH, 'wb') as f:
+            pickle.dump({'records': self._records, 'fields': self.fields, 'k1': self.k1, 'b': self.b}, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, PATH):
+        '''
+        Loads an index written by save(). Only load files you created, pickle can run arbitrary code.
+        '''
+        with open(PATH, 'rb') as f:
+            state = pickle.load(f)
+        index = cls(state['records'], state['fields'], state['k1'], state['b'])
+        # scored before it is shared, so the first searches don't wait on each other
+        index._finalize()
+        return index
@@ -0,0 +1,622 @@
+import os
+import json
+import math
+import pickle
+from array import array
+
+
+def _iter_positions(COORDINATES):
+    # yields every [x, y] position of a GeoJSON coordinates array, whatever its nesting
+    if COORDINATES and isinstance(COORDINATES[0], (int, float)):
+        yield COORDINATES
+        return
+    for item in COORDINATES:
+        yield from _iter_positions(item)
+
+
+def geometry_bbox(GEOMETRY):
+    '''
+    Returns the (minx, miny, maxx, maxy) bounding box of a GeoJSON geometry, or None if it has no coordinates.
+    '''
+    if GEOMETRY is None:
+        return None
+    if GEOMETRY.get('type') == 'GeometryCollection':
+        boxes = [geometry_bbox(g) for g in GEOMETRY.get('geometries', [])]
+        boxes = [b for b in boxes if b is not None]
+        if not boxes:
+            return None
+        return (min(b[0] for b in boxes), min(b[1] for b in boxes), max(b[2] for b in boxes), max(b[3] for b in boxes))
+
+    xs, ys = [], []
+    for position in _iter_positions(GEOMETRY.get('coordinates') or []):
+        xs.append(position[0])
+        ys.append(position[1])
+    if not xs:
+        return None
+    return (min(xs), min(ys), max(xs), max(ys))
+
+
+def point_in_rings(X, Y, RINGS):
+    '''
+    Even-odd ray casting over all rings of a polygon, so holes are excluded.
+    '''
+    inside = False
+    for ring in RINGS:
+        j = len(ring) - 1
+        for i in range(len(ring)):
+            xi, yi = ring[i][0], ring[i][1]
+            xj, yj = ring[j][0], ring[j][1]
+            if (yi > Y) != (yj > Y) and X < (xj - xi) * (Y - yi) / (yj - yi) + xi:
+                inside = not inside
+            j = i
+    return inside
+
+
+def point_in_geometry(X, Y, GEOMETRY):
+    '''
+    Tests whether the point (X=longitude, Y=latitude) lies inside a Polygon or MultiPolygon geometry.
+    '''
+    geometry_type = GEOMETRY.get('type')
+    if geometry_type == 'Polygon':
+        return point_in_rings(X, Y, GEOMETRY['coordinates'])
+    if geometry_type == 'MultiPolygon':
+        return any(point_in_rings(X, Y, polygon) for polygon in GEOMETRY['coordinates'])
+    if geometry_type == 'GeometryCollection':
+        return any(point_in_geometry(X, Y, g) for g in GEOMETRY.get('geometries', []))
+    return False
+
+
+def _segment_distance_sq(px, py, ax, ay, bx, by):
+    dx, dy = bx - ax, by - ay
+    if dx == 0 and dy == 0:
+        return (px - ax) ** 2 + (py - ay) ** 2
+    t = ((px - ax) * dx + (py - ay) * dy) / (dx * dx + dy * dy)
+    t = max(0.0, min(1.0, t))
+    cx, cy = ax + t * dx, ay + t * dy
+    return (px - cx) ** 2 + (py - cy) ** 2
+
+
+def simplify_line(POINTS, TOLERANCE):
+    '''
+    Douglas-Peucker simplification: drops every point closer than TOLERANCE (in coordinate units,
+    i.e. degrees for Mindat data) to the line through the points that are kept. The end points are always kept.
+    '''
+    count = len(POINTS)
+    if count < 3 or TOLERANCE <= 0:
+        return list(POINTS)
+
+    tolerance_sq = TOLERANCE * TOLERANCE
+    keep = [False] * count
+    keep[0] = keep[-1] = True
+    stack = [(0, count - 1)]
+    while stack:
+        first, last = stack.pop()
+        ax, ay = POINTS[first][0], POINTS[first][1]
+        bx, by = POINTS[last][0], POINTS[last][1]
+        max_sq, index = -1.0, None
+        for i in range(first + 1, last):
+            d = _segment_distance_sq(POINTS[i][0], POINTS[i][1], ax, ay, bx, by)
+            if d > max_sq:
+                max_sq, index = d, i
+        if index is not None and max_sq > tolerance_sq:
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+    return [p for p, k in zip(POINTS, keep) if k]
+
+
+def quantize_line(POINTS, PRECISION):
+    '''
+    Rounds coordinates to PRECISION decimals and drops points that become duplicates of their predecessor.
+    '''
+    rounded = []
+    for p in POINTS:
+        q = [round(p[0], PRECISION), round(p[1], PRECISION)] + list(p[2:])
+        if not rounded or q[:2] != rounded[-1][:2]:
+            rounded.append(q)
+    return rounded
+
+
+def _simplify_ring(ring, tolerance, precision):
+    ring = simplify_line(ring, tolerance)
+    if precision is not None:
+        ring = quantize_line(ring, precision)
+    # a closed ring needs at least 4 positions (first == last)
+    return ring if len(ring) >= 4 else None
+
+
+def _simplify_polygon(rings, tolerance, precision):
+    exterior = _simplify_ring(rings[0], tolerance, precision) if rings else None
+    if exterior is None:
+        return None
+    holes = [h for h in (_simplify_ring(r, tolerance, precision) for r in rings[1:]) if h is not None]
+    return [exterior] + holes
+
+
+def default_precision(TOLERANCE):
+    '''
+    Number of decimals that keeps rounding error well below TOLERANCE, e.g. 0.01 -> 3.
+    '''
+    if TOLERANCE <= 0:
+        return None
+    decimals = 0
+    while 10 ** -decimals > TOLERANCE and decimals < 12:
+        decimals += 1
+    return decimals + 1
+
+
+def simplify_geometry(GEOMETRY, TOLERANCE, PRECISION = None):
+    '''
+    Returns a simplified copy of a GeoJSON geometry: Douglas-Peucker with TOLERANCE, then coordinates rounded to PRECISION decimals.
+    Holes and parts that collapse below a valid ring are dropped; if every part of a polygon collapses, the
+    original parts are kept (only rounded) so that no region disappears from the output.
+    '''
+    if GEOMETRY is None:
+        return None
+    geometry_type = GEOMETRY.get('type')
+    coordinates = GEOMETRY.get('coordinates')
+
+    def rounded(points):
+        return quantize_line(points, PRECISION) if PRECISION is not None else [list(p) for p in points]
+
+    if geometry_type == 'Polygon':
+        polygon = _simplify_polygon(coordinates, TOLERANCE, PRECISION)
+        coordinates = polygon if polygon is not None else [rounded(r) for r in coordinates]
+    elif geometry_type == 'MultiPolygon':
+        polygons = [p for p in (_simplify_polygon(rings, TOLERANCE, PRECISION) for rings in coordinates) if p is not None]
+        coordinates = polygons if polygons else [[rounded(r) for r in rings] for rings in coordinates]
+    elif geometry_type == 'LineString':
+        coordinates = rounded(simplify_line(coordinates, TOLERANCE))
+    elif geometry_type == 'MultiLineString':
+        coordinates = [rounded(simplify_line(line, TOLERANCE)) for line in coordinates]
+    elif geometry_type == 'Point' and PRECISION is not None:
+        coordinates = [round(coordinates[0], PRECISION), round(coordinates[1], PRECISION)] + list(coordinates[2:])
+    elif geometry_type == 'MultiPoint' and PRECISION is not None:
+        coordinates = rounded(coordinates)
+    elif geometry_type == 'GeometryCollection':
+        return dict(GEOMETRY, geometries=[simplify_geometry(g, TOLERANCE, PRECISION) for g in GEOMETRY.get('geometries', [])])
+
+    return dict(GEOMETRY, coordinates=coordinates)
+
+
+def simplify_feature(FEATURE, TOLERANCE, PRECISION = None):
+    '''
+    Returns a copy of a GeoJSON feature with its geometry passed through simplify_geometry().
+    '''
+    return dict(FEATURE, geometry=simplify_geometry(FEATURE.get('geometry'), TOLERANCE, PRECISION))
+
+
+class RTree:
+    """
+    A static R-tree over bounding boxes, bulk loaded with the Sort-Tile-Recursive algorithm.
+    Built once from all entries, it answers point and box queries in O(log n) node visits.
+
+    Args:
+        ENTRIES (list): (minx, miny, maxx, maxy, item) tuples.
+        NODE_CAPACITY (int): Maximum number of children per node.
+
+    Usage:
+        >>> tree = RTree([(0, 0, 1, 1, 'a'), (5, 5, 6, 6, 'b')])
+        >>> tree.search_point(0.5, 0.5)
+        ['a']
+    """
+
+    def __init__(self, ENTRIES, NODE_CAPACITY = 16):
+        if NODE_CAPACITY < 2:
+            raise ValueError("NODE_CAPACITY must be at least 2.")
+        self.node_capacity = NODE_CAPACITY
+        self.size = len(ENTRIES)
+
+        # a node is [minx, miny, maxx, maxy, children, is_leaf]
+        level = self._pack([(e[0], e[1], e[2], e[3], e[4]) for e in ENTRIES], True)
+        while len(level) > 1:
+            level = self._pack(level, False)
+        self._root = level[0] if level else None
+
+    def _pack(self, items, is_leaf):
+        capacity = self.node_capacity
+        count = len(items)
+        if count == 0:
+            return []
+
+        node_count = -(-count // capacity)
+        slice_count = max(1, int(node_count ** 0.5 + 0.999999))
+        slice_size = -(-count // slice_count)
+
+        items = sorted(items, key=lambda i: i[0] + i[2])
+        nodes = []
+        for start in range(0, count, slice_size):
+            vertical = sorted(items[start:start + slice_size], key=lambda i: i[1] + i[3])
+            for group_start in range(0, len(vertical), capacity):
+                group = vertical[group_start:group_start + capacity]
+                nodes.append([min(i[0] for i in group), min(i[1] for i in group),
+                              max(i[2] for i in group), max(i[3] for i in group), group, is_leaf])
+        return nodes
+
+    def __len__(self):
+        return self.size
+
+    def search_bbox(self, MINX, MINY, MAXX, MAXY):
+        '''
+        Returns the items whose boxes intersect the query box.
+        '''
+        found = []
+        if self._root is None:
+            return found
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            for child in node[4]:
+                if child[0] <= MAXX and child[2] >= MINX and child[1] <= MAXY and child[3] >= MINY:
+                    if node[5]:
+                        found.append(child[4])
+                    else:
+                        stack.append(child)
+        return found
+
+    def search_point(self, X, Y):
+        '''
+        Returns the items whose boxes contain the point.
+        '''
+        return self.search_bbox(X, Y, X, Y)
+
+
+class GeoRegionIndex:
+    """
+    An in-process index over georegion polygons (locgeoregion2 features) for point-in-region lookups.
+    An R-tree over the region bounding boxes narrows each lookup to a few candidates, which are then
+    tested exactly against their polygons. The index can be pickled to disk and reloaded, so the feature
+    collection only needs to be downloaded and parsed once.
+
+    Usage:
+        >>> index = GeoRegionRetriever().get_index()
+        >>> index.save("./mindat_data/georegions.idx")
+        >>> index = GeoRegionIndex.load("./mindat_data/georegions.idx")
+        >>> index.lookup(-116.99, 46.73)
+        [{'id': 12, 'name': 'Region 12'}]
+
+    Press q to quit.
+    """
+
+    def __init__(self, FEATURES = (), NODE_CAPACITY = 16):
+        self._geometries = []
+        self._properties = []
+        self._entries = []
+        self._node_capacity = NODE_CAPACITY
+        self._tree = None
+        self.add_features(FEATURES)
+
+    def add_features(self, FEATURES):
+        '''
+        Adds GeoJSON features; the R-tree is rebuilt on the next lookup.
+        '''
+        for feature in FEATURES:
+            geometry = feature.get('geometry')
+            bbox = geometry_bbox(geometry)
+            if bbox is None:
+                continue
+            properties = dict(feature.get('properties') or {})
+            if 'id' not in properties and 'id' in feature:
+                properties['id'] = feature['id']
+
+            self._entries.append(bbox + (len(self._geometries),))
+            self._geometries.append(geometry)
+            self._properties.append(properties)
+        self._tree = None
+        return self
+
+    def __len__(self):
+        return len(self._geometries)
+
+    def _get_tree(self):
+        if self._tree is None:
+            self._tree = RTree(self._entries, self._node_capacity)
+        return self._tree
+
+    def lookup(self, LONGITUDE, LATITUDE):
+        '''
+        Returns the properties of every region containing the point.
+        '''
+        return [self._properties[i] for i in self._get_tree().search_point(LONGITUDE, LATITUDE)
+                if point_in_geometry(LONGITUDE, LATITUDE, self._geometries[i])]
+
+    def lookup_ids(self, LONGITUDE, LATITUDE):
+        '''
+        Returns the ids of every region containing the point.
+        '''
+        return [self._properties[i].get('id') for i in self._get_tree().search_point(LONGITUDE, LATITUDE)
+                if point_in_geometry(LONGITUDE, LATITUDE, self._geometries[i])]
+
+    def lookup_many(self, POINTS):
+        '''
+        Resolves an iterable of (longitude, latitude) pairs, returning one list of region ids per point.
+        '''
+        tree = self._get_tree()
+        geometries = self._geometries
+        properties = self._properties
+        return [[properties[i].get('id') for i in tree.search_point(x, y) if point_in_geometry(x, y, geometries[i])]
+                for x, y in POINTS]
+
+    def save(self, PATH):
+        with open(PATH, 'wb') as f:
+            pickle.dump({'geometries': self._geometries, 'properties': self._properties,
+                         'entries': self._entries, 'node_capacity': self._node_capacity}, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, PATH):
+        '''
+        Loads an index written by save(). Only load files you created, pickle can run arbitrary code.
+        '''
+        with open(PATH, 'rb') as f:
+            state = pickle.load(f)
+        index = cls(NODE_CAPACITY=state['node_capacity'])
+        index._geometries = state['geometries']
+        index._properties = state['properties']
+        index._entries = state['entries']
+        return index
+
+    @classmethod
+    def from_file(cls, PATH):
+        '''
+        Builds an index from a saved locgeoregion2 download: the JSON written by GeoRegionRetriever.saveto(),
+        a GeoJSON feature collection, or a newline-delimited GeoJSON sequence.
+        '''
+        with open(PATH, 'r') as f:
+            first = f.read(1)
+            f.seek(0)
+            if first == '{' and not str(PATH).endswith('.geojsonl'):
+                data = json.load(f)
+                collection = data.get('results', data)
+                return cls(collection.get('features', []))
+            return cls(json.loads(line) for line in f if line.strip())
+
+
+EARTH_RADIUS_KM = 6371.0088
+_KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def haversine_km(LON1, LAT1, LON2, LAT2):
+    '''
+    Great-circle distance in kilometres between two (longitude, latitude) points.
+    '''
+    phi1, phi2 = math.radians(LAT1), math.radians(LAT2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(LON2 - LON1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _coordinate(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) else None
+
+
+class LocalityIndex:
+    """
+    An in-process grid index over locality coordinates for bounding-box, radius and k-nearest queries.
+    Localities are bucketed into CELL_SIZE degree cells by latitude/longitude, so a query only visits
+    the cells it overlaps instead of scanning the whole locality table. Like GeoRegionIndex it can be
+    pickled to disk and reloaded, so a locality mirror only needs to be downloaded once.
+
+    Args:
+        RECORDS (iterable of dict): Locality records with 'latitude' and 'longitude' keys. Records without
+            usable coordinates are skipped.
+        CELL_SIZE (float): Grid cell size in degrees.
+
+    Usage:
+        >>> index = LocalitiesRetriever().get_spatial_index()
+        >>> index.bbox(-117.1, 46.6, -116.9, 46.8)
+        >>> index.radius(-116.99, 46.73, 25)
+        >>> index.nearest(-116.99, 46.73, 5)
+
+    Press q to quit.
+    """
+
+    def __init__(self, RECORDS = (), CELL_SIZE = 0.25):
+        if not isinstance(CELL_SIZE, (int, float)) or CELL_SIZE <= 0:
+            raise ValueError(f"Invalid CELL_SIZE: {CELL_SIZE}\nPlease retry.")
+        self.cell_size = CELL_SIZE
+        self._records = []
+        self._lons = array('d')
+        self._lats = array('d')
+        self._cells = {}
+        self.add_records(RECORDS)
+
+    def _cell(self, lon, lat):
+        return (math.floor(lon / self.cell_size), math.floor(lat / self.cell_size))
+
+    def add_records(self, RECORDS):
+        '''
+        Adds locality records to the index.
+        '''
+        for record in RECORDS:
+            lon = _coordinate(record.get('longitude'))
+            lat = _coordinate(record.get('latitude'))
+            if lon is None or lat is None or not (-90 <= lat <= 90 and -180 <= lon <= 180):
+                continue
+            position = len(self._records)
+            self._records.append(record)
+            self._lons.append(lon)
+            self._lats.append(lat)
+            self._cells.setdefault(self._cell(lon, lat), []).append(position)
+        return self
+
+    def __len__(self):
+        return len(self._records)
+
+    def _bbox_positions(self, min_lon, min_lat, max_lon, max_lat):
+        lons, lats = self._lons, self._lats
+        cx0, cy0 = self._cell(min_lon, min_lat)
+        cx1, cy1 = self._cell(max_lon, max_lat)
+
+        # a wide box covers more empty cells than there are occupied ones, so walk the occupied cells instead
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > len(self._cells):
+            cells = (positions for (cx, cy), positions in self._cells.items() if cx0 <= cx <= cx1 and cy0 <= cy <= cy1)
+        else:
+            cells = (self._cells[(cx, cy)] for cx in range(cx0, cx1 + 1) for cy in range(cy0, cy1 + 1) if (cx, cy) in self._cells)
+
+        for positions in cells:
+            for i in positions:
+                if min_lon <= lons[i] <= max_lon and min_lat <= lats[i] <= max_lat:
+                    yield i
+
+    def _bbox_positions_wrapped(self, min_lon, min_lat, max_lon, max_lat):
+        # a box with MIN_LONGITUDE > MAX_LONGITUDE crosses the antimeridian
+        if min_lon > max_lon:
+            yield from self._bbox_positions(min_lon, min_lat, 180.0, max_lat)
+            yield from self._bbox_positions(-180.0, min_lat, max_lon, max_lat)
+        else:
+            yield from self._bbox_positions(min_lon, min_lat, max_lon, max_lat)
+
+    def bbox(self, MIN_LONGITUDE, MIN_LATITUDE, MAX_LONGITUDE, MAX_LATITUDE):
+        '''
+        Returns the localities inside the box. A box with MIN_LONGITUDE > MAX_LONGITUDE crosses the antimeridian.
+        '''
+        return [self._records[i] for i in self._bbox_positions_wrapped(MIN_LONGITUDE, MIN_LATITUDE, MAX_LONGITUDE, MAX_LATITUDE)]
+
+    def _radius_hits(self, lon, lat, radius_km):
+        lat_span = radius_km / _KM_PER_DEGREE
+        min_lat, max_lat = max(-90.0, lat - lat_span), min(90.0, lat + lat_span)
+
+        # the box is widened in longitude by the latitude furthest from the equator it reaches
+        cos_lat = math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+        if cos_lat <= 1e-9 or lat_span / cos_lat >= 180:
+            boxes = [(-180.0, min_lat, 180.0, max_lat)]
+        else:
+            lon_span = lat_span / cos_lat
+            min_lon, max_lon = lon - lon_span, lon + lon_span
+            if min_lon < -180:
+                boxes = [(min_lon + 360, min_lat, 180.0, max_lat), (-180.0, min_lat, max_lon, max_lat)]
+            elif max_lon > 180:
+                boxes = [(min_lon, min_lat, 180.0, max_lat), (-180.0, min_lat, max_lon - 360, max_lat)]
+            else:
+                boxes = [(min_lon, min_lat, max_lon, max_lat)]
+
+        lons, lats = self._lons, self._lats
+        hits = []
+        for box in boxes:
+            for i in self._bbox_positions(*box):
+                distance = haversine_km(lon, lat, lons[i], lats[i])
+                if distance <= radius_km:
+                    hits.append((distance, i))
+        hits.sort()
+        return hits
+
+    def radius(self, LONGITUDE, LATITUDE, RADIUS_KM):
+        '''
+        Returns (distance_km, locality) pairs within RADIUS_KM of the point, nearest first.
+        '''
+        return [(distance, self._records[i]) for distance, i in self._radius_hits(LONGITUDE, LATITUDE, RADIUS_KM)]
+
+    def nearest(self, LONGITUDE, LATITUDE, K = 10):
+        '''
+        Returns the K nearest (distance_km, locality) pairs, nearest first.
+        The search radius starts at one grid cell and doubles until K localities are found.
+        '''
+        if K <= 0 or not self._records:
+            return []
+
+        radius_km = self.cell_size * _KM_PER_DEGREE
+        half_circumference = math.pi * EARTH_RADIUS_KM
+        while True:
+            hits = self._radius_hits(LONGITUDE, LATITUDE, radius_km)
+            if len(hits) >= K or radius_km >= half_circumference:
+                return [(distance, self._records[i]) for distance, i in hits[:K]]
+            radius_km *= 2
+
+    def save(self, PATH):
+        with open(PATH, 'wb') as f:
+            pickle.dump({'records': self._records, 'cell_size': self.cell_size}, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, PATH):
+        '''
+        Loads an index written by save(). Only load files you created, pickle can run arbitrary code.
+        '''
+        with open(PATH, 'rb') as f:
+            state = pickle.load(f)
+        return cls(state['records'], state['cell_size'])
+
+    @classmethod
+    def from_file(cls, PATH, CELL_SIZE = 0.25):
+        '''
+        Builds an index from a saved localities download: the JSON written by LocalitiesRetriever.saveto()
+        or a JSON lines file with one locality per line.
+        '''
+        with open(PATH, 'r') as f:
+            first = f.read(1)
+            f.seek(0)
+            if first == '{' and not str(PATH).endswith('.jsonl'):
+                data = json.load(f)
+                return cls(data.get('results', []), CELL_SIZE)
+            return cls((json.loads(line) for line in f if line.strip()), CELL_SIZE)
+
+
+class GeoJSONWriter:
+    """
+    Writes GeoJSON features to a file one at a time, so a download never has to be held in memory.
+    By default a FeatureCollection document is written; with SEQUENCE=True one feature per line
+    (newline-delimited GeoJSON), which can be read back line by line. The features go to a temporary
+    .part file that only replaces PATH at close(), so an interrupted download never leaves a truncated
+    file that still parses; abort() removes it instead.
+
+    Usage:
+        >>> with GeoJSONWriter("regions.geojson") as writer:
+        ...     writer.write_features(page["features"])
+    """
+
+    def __init__(self, PATH, SEQUENCE = False):
+        self.path = PATH
+        self.part_path = str(PATH) + '.part'
+        self.sequence = SEQUENCE
+        self.count = 0
+        self._file = None
+
+    def open(self):
+        self._file = open(self.part_path, 'w')
+        if not self.sequence:
+            self._file.write('{"type": "FeatureCollection", "features": [\n')
+        return self
+
+    def write_feature(self, FEATURE):
+        if self.sequence:
+            self._file.write(json.dumps(FEATURE, separators=(',', ':')) + '\n')
+        else:
+            if self.count:
+                self._file.write(',\n')
+            self._file.write(json.dumps(FEATURE, separators=(',', ':')))
+        self.count += 1
+
+    def write_features(self, FEATURES):
+        for feature in FEATURES:
+            self.write_feature(feature)
+
+    def close(self):
+        if self._file is not None:
+            if not self.sequence:
+                self._file.write('\n]}\n')
+            self._file.close()
+            self._file = None
+            os.replace(self.part_path, self.path)
+
+    def abort(self):
+        '''
+        Discards the features written so far; PATH is left as it was.
+        '''
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            os.remove(self.part_path)
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
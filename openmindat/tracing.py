@@ -0,0 +1,208 @@
+import os
+import time
+import functools
+import threading
+import contextvars
+
+
+class Span:
+    """
+    A timed operation recorded by RecordingTracer. Spans opened while another span is active become its children.
+
+    Attributes:
+        name (str): The operation name, e.g. 'GeomaterialRetriever.get_dict' or 'page'.
+        attributes (dict): Key/value details such as the endpoint or row count.
+        trace_id (str): Shared by all spans of one top-level operation.
+        span_id (str): Unique id of this span.
+        parent_id (str or None): span_id of the parent span.
+        start_time (float): perf_counter() value when the span started.
+        end_time (float or None): perf_counter() value when the span ended.
+        error (str or None): repr of the exception that ended the span, if any.
+    """
+
+    def __init__(self, NAME, ATTRIBUTES, TRACE_ID, PARENT_ID):
+        self.name = NAME
+        self.attributes = dict(ATTRIBUTES or {})
+        self.trace_id = TRACE_ID
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = PARENT_ID
+        self.start_time = time.perf_counter()
+        self.end_time = None
+        self.error = None
+
+    @property
+    def duration(self):
+        if self.end_time is None:
+            return None
+        return self.end_time - self.start_time
+
+    def set_attribute(self, KEY, VALUE):
+        self.attributes[KEY] = VALUE
+
+    def record_exception(self, EXCEPTION):
+        self.error = repr(EXCEPTION)
+
+    def __repr__(self):
+        return f"Span({self.name!r}, duration={self.duration}, attributes={self.attributes})"
+
+
+class _NoOpSpan:
+    # Shared by the default tracer: entering, exiting and setting attributes do nothing
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set_attribute(self, KEY, VALUE):
+        pass
+
+    def record_exception(self, EXCEPTION):
+        pass
+
+
+_NOOP_SPAN = _NoOpSpan()
+
+
+class Tracer:
+    """
+    The default tracer. start_span() returns a shared no-op span, so instrumented code costs next to nothing
+    until a recording tracer is installed with set_tracer().
+    """
+
+    def start_span(self, NAME, ATTRIBUTES = None):
+        return _NOOP_SPAN
+
+
+class InMemorySpanExporter:
+    """
+    Keeps finished spans in a list, mainly for tests and ad-hoc profiling.
+
+    Usage:
+        >>> exporter = InMemorySpanExporter()
+        >>> set_tracer(RecordingTracer(exporter))
+        >>> GeomaterialIdRetriever().id(5).get_dict()
+        >>> for span in exporter.get_finished_spans():
+        ...     print(span.name, span.duration)
+    """
+
+    def __init__(self):
+        self._spans = []
+        self._lock = threading.Lock()
+
+    def export(self, SPAN):
+        with self._lock:
+            self._spans.append(SPAN)
+
+    def get_finished_spans(self):
+        with self._lock:
+            return list(self._spans)
+
+    def clear(self):
+        with self._lock:
+            self._spans.clear()
+
+
+_current_span = contextvars.ContextVar('openmindat_current_span', default=None)
+
+
+class _SpanContext:
+
+    def __init__(self, tracer, name, attributes):
+        self._tracer = tracer
+        self._name = name
+        self._attributes = attributes
+        self._span = None
+        self._token = None
+
+    def __enter__(self):
+        parent = _current_span.get()
+        trace_id = parent.trace_id if parent is not None else os.urandom(16).hex()
+        parent_id = parent.span_id if parent is not None else None
+
+        self._span = Span(self._name, self._attributes, trace_id, parent_id)
+        self._token = _current_span.set(self._span)
+        return self._span
+
+    def __exit__(self, exc_type, exc, tb):
+        self._span.end_time = time.perf_counter()
+        if exc is not None:
+            self._span.record_exception(exc)
+        _current_span.reset(self._token)
+        self._tracer.exporter.export(self._span)
+        return False
+
+
+class RecordingTracer(Tracer):
+    """
+    Records every span and hands it to an exporter when it ends.
+
+    Args:
+        EXPORTER: Any object with an export(span) method. Defaults to a new InMemorySpanExporter.
+    """
+
+    def __init__(self, EXPORTER = None):
+        self.exporter = EXPORTER if EXPORTER is not None else InMemorySpanExporter()
+
+    def start_span(self, NAME, ATTRIBUTES = None):
+        return _SpanContext(self, NAME, ATTRIBUTES)
+
+
+class OpenTelemetryTracer(Tracer):
+    """
+    Forwards spans to OpenTelemetry. Requires the optional opentelemetry-api package.
+
+    Args:
+        TRACER: An opentelemetry tracer. Defaults to opentelemetry.trace.get_tracer('openmindat').
+    """
+
+    def __init__(self, TRACER = None):
+        if TRACER is None:
+            try:
+                from opentelemetry import trace
+            except ImportError:
+                raise ImportError("OpenTelemetryTracer requires the opentelemetry-api package: pip install opentelemetry-api")
+            TRACER = trace.get_tracer('openmindat')
+        self._tracer = TRACER
+
+    def start_span(self, NAME, ATTRIBUTES = None):
+        return self._tracer.start_as_current_span(NAME, attributes=ATTRIBUTES)
+
+
+_tracer = Tracer()
+
+def set_tracer(TRACER):
+    '''
+    Installs the tracer used by all retrievers and MindatApi. Pass None to restore the no-op default.
+    '''
+    global _tracer
+    _tracer = TRACER if TRACER is not None else Tracer()
+
+
+def get_tracer():
+    return _tracer
+
+
+def start_span(NAME, **ATTRIBUTES):
+    '''
+    Opens a span on the installed tracer; use it as a context manager.
+
+    Example:
+        >>> with start_span('page', end_point='geomaterials') as span:
+        ...     span.set_attribute('rows', 1500)
+    '''
+    return _tracer.start_span(NAME, ATTRIBUTES)
+
+
+def traced(func):
+    '''
+    Decorator for retriever methods: wraps each call in a span named '<ClassName>.<method>'
+    with the retriever's end_point as an attribute.
+    '''
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        name = type(self).__name__ + '.' + func.__name__
+        with _tracer.start_span(name, {'end_point': getattr(self, 'end_point', '')}):
+            return func(self, *args, **kwargs)
+    return wrapper